@@ -0,0 +1,544 @@
+"""
+Performance benchmarks for the Boz Concept Home backend.
+
+Usage:
+    python benchmarks.py suggest [--products 50000] [--queries 20000]
+    python benchmarks.py checkout [--rounds 50]
+    python benchmarks.py stock-contention [--buyers 300] [--stock 25]
+    python benchmarks.py admin-stats [--orders 100000] [--rounds 5]
+    python benchmarks.py analytics-ingest [--events 20000] [--concurrency 200]
+    python benchmarks.py analytics-summary [--events 1000000] [--rounds 5]
+    python benchmarks.py login-load [--logins 200] [--concurrency 50]
+    python benchmarks.py product-import [--products 50000]
+    python benchmarks.py bulk-reprice [--products 50000]
+
+Scenarios other than `suggest` need the MongoDB from MONGO_URL; they write to
+DB_NAME (default boz_concept_benchmark) and remove what they created.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'boz_concept_benchmark')
+
+import server  # noqa: E402
+
+WORDS = [
+    "Metal", "Ahşap", "Paslanmaz", "Siyah", "Beyaz", "Gümüş", "Çam", "Meşe", "Tel", "Kıvrımlı",
+    "Yan", "Sehpa", "Zigon", "Dresuar", "Kitaplık", "Raf", "Banyo", "Mutfak", "Düzenleyici", "Askılık",
+    "Baharatlık", "Havluluk", "Fincanlık", "Sepet", "Dolap", "İçi", "Organizer", "Katlı", "Modern", "Dekoratif",
+    "Paris", "Berlin", "Milano", "Viyana", "Floransa", "Şık", "Güçlü", "Özel", "Uzun", "Kısa",
+]
+CATEGORIES = ["Yan Sehpa", "Zigon Sehpa", "Dresuar", "Kitaplık", "Mutfak Rafı", "Banyo Düzenleyici", "Baharatlık", "Sepet"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name, samples_ms):
+    print(
+        f"{name}: n={len(samples_ms)} "
+        f"p50={percentile(samples_ms, 50):.3f}ms p95={percentile(samples_ms, 95):.3f}ms "
+        f"p99={percentile(samples_ms, 99):.3f}ms max={max(samples_ms):.3f}ms "
+        f"mean={statistics.mean(samples_ms):.3f}ms"
+    )
+
+
+def synthetic_products(count):
+    rng = random.Random(42)
+    return [
+        {
+            "id": f"bench-{i}",
+            "product_name": " ".join(rng.sample(WORDS, rng.randint(3, 7))),
+            "category": rng.choice(CATEGORIES),
+            "price": round(rng.uniform(100, 5000), 2),
+            "sales_count": rng.randint(0, 500),
+            "image_urls": [f"https://cdn.example.com/{i}.jpg"],
+        }
+        for i in range(count)
+    ]
+
+
+def bench_suggest(args):
+    """Suggest index over a synthetic catalog: build time and per-query latency (target p99 < 1 ms)"""
+    products = synthetic_products(args.products)
+
+    started = time.perf_counter()
+    index = server.ProductSuggestIndex()
+    index.rebuild(products)
+    print(f"built suggest index for {len(products)} products in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    rng = random.Random(7)
+    queries = []
+    for _ in range(args.queries):
+        word = server.normalize_search_text(rng.choice(WORDS))
+        partial = word[:rng.randint(1, len(word))]
+        # One in five queries has already typed a full first word
+        if rng.random() < 0.2:
+            partial = f"{server.normalize_search_text(rng.choice(WORDS))} {partial}"
+        queries.append(partial)
+
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        index.suggest(query, server.SUGGEST_MAX_RESULTS)
+        samples.append((time.perf_counter() - started) * 1000)
+    report("suggest", samples)
+
+
+async def timed(samples, coro):
+    started = time.perf_counter()
+    result = await coro
+    samples.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+async def bench_checkout(args):
+    """Order pricing: one find_one per cart line (old) vs a single $in lookup (new), by cart size"""
+    db = server.db
+    products = synthetic_products(50)
+    await db.products.delete_many({"id": {"$regex": "^bench-"}})
+    await db.products.insert_many([dict(p) for p in products])
+
+    async def price_one_by_one(items):
+        total = 0.0
+        for item in items:
+            product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
+            if product:
+                total += server.unit_price(product, False) * item["quantity"]
+        return total
+
+    try:
+        for size in (1, 5, 10, 20, 50):
+            items = [{"product_id": p["id"], "quantity": 2} for p in products[:size]]
+            old_samples, new_samples = [], []
+            for _ in range(args.rounds):
+                old_total = await timed(old_samples, price_one_by_one(items))
+                lines, _ = await timed(new_samples, server.price_cart_items(items, False))
+                new_total = sum(line["subtotal"] for line in lines)
+                assert abs(old_total - new_total) < 1e-6
+            report(f"checkout pricing, {size} items, per-item find_one", old_samples)
+            report(f"checkout pricing, {size} items, single $in", new_samples)
+    finally:
+        await db.products.delete_many({"id": {"$regex": "^bench-"}})
+
+
+async def bench_stock_contention(args):
+    """Hundreds of concurrent checkouts for one low-stock product: no overselling, no retries"""
+    db = server.db
+    product = {**synthetic_products(1)[0], "id": "bench-stock", "stock_amount": args.stock}
+    buyers = [
+        server.User(id=f"bench-buyer-{i}", email=f"buyer{i}@bench.example.com", full_name="Bench", hashed_password="-")
+        for i in range(args.buyers)
+    ]
+    await db.products.delete_many({"id": product["id"]})
+    await db.products.insert_one(dict(product))
+    await db.carts.delete_many({"user_id": {"$regex": "^bench-buyer-"}})
+    await db.carts.insert_many([
+        {"user_id": buyer.id, "items": [{"product_id": product["id"], "quantity": 1}]} for buyer in buyers
+    ])
+
+    async def checkout(buyer):
+        started = time.perf_counter()
+        try:
+            await server.create_order(server.OrderCreate(shipping_address="Bench"), current_user=buyer)
+            outcome = "ordered"
+        except server.HTTPException as e:
+            outcome = f"rejected {e.status_code}"
+        return outcome, (time.perf_counter() - started) * 1000
+
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(checkout(buyer) for buyer in buyers))
+        elapsed = time.perf_counter() - started
+
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        remaining = (await db.products.find_one({"id": product["id"]}))["stock_amount"]
+        orders = await db.orders.count_documents({"user_id": {"$regex": "^bench-buyer-"}})
+
+        print(f"{args.buyers} concurrent checkouts in {elapsed * 1000:.0f}ms "
+              f"({args.buyers / elapsed:.0f}/s): {outcomes}")
+        report("checkout latency", [latency for _, latency in results])
+        print(f"stock {args.stock} -> {remaining}, orders placed: {orders}")
+        assert remaining == 0 and orders == args.stock, "stock was oversold or left unsold"
+        print("OK: no overselling")
+    finally:
+        await db.products.delete_many({"id": product["id"]})
+        await db.carts.delete_many({"user_id": {"$regex": "^bench-buyer-"}})
+        await db.orders.delete_many({"user_id": {"$regex": "^bench-buyer-"}})
+
+
+async def old_dashboard_stats(db):
+    """The dashboard stats as computed before: whole collections pulled into Python, N+1 product lookups"""
+    total_users = await db.users.count_documents({})
+    total_products = await db.products.count_documents({})
+    total_orders = await db.orders.count_documents({})
+    orders = await db.orders.find({}, {"_id": 0, "total": 1, "created_at": 1}).to_list(None)
+    total_sales = sum(order.get("total", 0) for order in orders)
+    users_with_orders = await db.orders.distinct("user_id")
+    all_orders = await db.orders.find({}, {"_id": 0, "items": 1}).to_list(None)
+    product_sales = {}
+    for order in all_orders:
+        for item in order.get("items", []):
+            pid = item.get("product_id")
+            if pid:
+                product_sales[pid] = product_sales.get(pid, 0) + item.get("quantity", 1)
+    top_products = []
+    for pid, qty in sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:5]:
+        product = await db.products.find_one({"id": pid}, {"_id": 0, "product_name": 1, "price": 1})
+        if product:
+            top_products.append({"product_id": pid, "total_sold": qty})
+    return {
+        "total_users": total_users,
+        "total_products": total_products,
+        "total_orders": total_orders,
+        "total_sales": total_sales,
+        "users_with_orders": len(users_with_orders),
+        "top_products": top_products,
+    }
+
+
+async def bench_admin_stats(args):
+    """Admin dashboard stats over a large orders collection: client-side scans vs $facet aggregations vs store counters"""
+    import reconcile_stats
+    db = server.db
+    rng = random.Random(11)
+    products = synthetic_products(200)
+    now = server.datetime.now(server.timezone.utc)
+    await db.products.delete_many({"id": {"$regex": "^bench-"}})
+    await db.products.insert_many([dict(p) for p in products])
+    await db.orders.delete_many({"user_id": {"$regex": "^bench-customer-"}})
+
+    started = time.perf_counter()
+    batch = []
+    for i in range(args.orders):
+        items = [
+            {"product_id": rng.choice(products)["id"], "quantity": rng.randint(1, 3)}
+            for _ in range(rng.randint(1, 4))
+        ]
+        batch.append({
+            "id": f"bench-order-{i}",
+            "user_id": f"bench-customer-{rng.randint(0, args.orders // 10)}",
+            "items": items,
+            "total": round(rng.uniform(100, 10000), 2),
+            "status": rng.choice(server.ORDER_STATUSES),
+            "created_at": now - server.timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+        })
+        if len(batch) == 5000:
+            await db.orders.insert_many(batch)
+            batch = []
+    if batch:
+        await db.orders.insert_many(batch)
+    print(f"seeded {args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+    try:
+        await reconcile_stats.reconcile(apply=True)
+        old_samples, new_samples, counter_samples = [], [], []
+        for _ in range(args.rounds):
+            old = await timed(old_samples, old_dashboard_stats(db))
+            new = await timed(new_samples, server.compute_store_stats())
+            counted = await timed(counter_samples, server.read_store_stats())
+            assert counted["total_orders"] == new["total_orders"]
+            assert old["total_orders"] == new["total_orders"]
+            assert abs(old["total_sales"] - new["total_sales"]) < 1e-3 * max(1.0, old["total_sales"])
+            assert old["users_with_orders"] == new["users_with_orders"]
+            assert [p["total_sold"] for p in old["top_products"]] == [p["total_sold"] for p in new["top_products"]]
+        report(f"dashboard stats, {args.orders} orders, client-side scans", old_samples)
+        report(f"dashboard stats, {args.orders} orders, $facet aggregations", new_samples)
+        report(f"dashboard stats, {args.orders} orders, store counters", counter_samples)
+    finally:
+        await db.products.delete_many({"id": {"$regex": "^bench-"}})
+        await db.orders.delete_many({"user_id": {"$regex": "^bench-customer-"}})
+        await reconcile_stats.reconcile(apply=True)
+
+
+def synthetic_events(count):
+    rng = random.Random(5)
+    event_types = ["page_view", "product_click", "category_click", "add_to_cart"]
+    return [
+        server.AnalyticsEventCreate(
+            event_type=rng.choice(event_types),
+            event_data={"product_id": f"bench-{rng.randint(0, 999)}", "category": rng.choice(CATEGORIES), "page": "/"},
+            session_id=f"bench-session-{rng.randint(0, 999)}",
+        )
+        for _ in range(count)
+    ]
+
+
+async def bench_analytics_ingest(args):
+    """POST /analytics/event throughput: one insert_one per request (old) vs the buffered batch writer (new)"""
+    db = server.db
+    events = synthetic_events(args.events)
+
+    async def track_event_unbuffered(event):
+        await db.analytics_events.insert_one(server.AnalyticsEvent(**event.model_dump()).model_dump())
+
+    async def drive(handler):
+        samples = []
+        started = time.perf_counter()
+        for i in range(0, len(events), args.concurrency):
+            await asyncio.gather(*(timed(samples, handler(event)) for event in events[i:i + args.concurrency]))
+        accepted = time.perf_counter() - started
+        await server.analytics_ingest.stop()
+        return samples, accepted, time.perf_counter() - started
+
+    await db.analytics_events.delete_many({"session_id": {"$regex": "^bench-session-"}})
+    try:
+        for name, handler in (("insert_one per event", track_event_unbuffered), ("buffered insert_many", server.track_event)):
+            samples, accepted, written = await drive(handler)
+            stored = await db.analytics_events.count_documents({"session_id": {"$regex": "^bench-session-"}})
+            print(f"{name}: {len(events) / accepted:.0f} events/s accepted, "
+                  f"{len(events) / written:.0f} events/s written, {stored} stored")
+            report(f"{name} request latency", samples)
+            await db.analytics_events.delete_many({"session_id": {"$regex": "^bench-session-"}})
+        print(f"ingest metrics: {server.analytics_ingest.stats()}")
+    finally:
+        await db.analytics_events.delete_many({"session_id": {"$regex": "^bench-session-"}})
+
+
+async def old_analytics_summary(db):
+    """The analytics summary as computed before: five counts, then four capped scans counted in Python"""
+    totals = [await db.analytics_events.count_documents({})]
+    for event_type in ("page_view", "product_click", "category_click", "add_to_cart"):
+        totals.append(await db.analytics_events.count_documents({"event_type": event_type}))
+    product_clicks = {}
+    for event in await db.analytics_events.find({"event_type": "product_click"}).to_list(10000):
+        product_id = event.get("event_data", {}).get("product_id")
+        if product_id:
+            product_clicks[product_id] = product_clicks.get(product_id, 0) + 1
+    for event_type in ("category_click", "add_to_cart", "page_view"):
+        for event in await db.analytics_events.find({"event_type": event_type}).to_list(10000):
+            event.get("event_data", {})
+    return totals, sorted(product_clicks.values(), reverse=True)[:10]
+
+
+async def bench_analytics_summary(args):
+    """Analytics summary over a large event history: capped client-side counting (old) vs one $facet (new)"""
+    db = server.db
+    admin = server.Admin(email="bench@bench.example.com", full_name="Bench", hashed_password="-")
+    await db.analytics_events.delete_many({"session_id": {"$regex": "^bench-session-"}})
+
+    started = time.perf_counter()
+    now = server.datetime.now(server.timezone.utc)
+    rng = random.Random(3)
+    for i in range(0, args.events, 10000):
+        batch = []
+        for event in synthetic_events(min(10000, args.events - i)):
+            document = server.AnalyticsEvent(**event.model_dump()).model_dump()
+            document["created_at"] = now - server.timedelta(seconds=rng.randint(0, 86400 * 60))
+            batch.append(document)
+        await db.analytics_events.insert_many(batch, ordered=False)
+    print(f"seeded {args.events} events in {time.perf_counter() - started:.1f}s")
+
+    try:
+        old_samples, new_samples = [], []
+        for _ in range(args.rounds):
+            old_totals, old_top = await timed(old_samples, old_analytics_summary(db))
+            new = await timed(new_samples, server.admin_analytics_summary(days=None, current_admin=admin))
+        new_top = [row["count"] for row in new["top_products"]]
+        print(f"total events: old {old_totals[0]}, new {new['summary']['total_events']}")
+        print(f"top product clicks: old {old_top[:3]} (capped at 10000 events), new {new_top[:3]}")
+        report(f"analytics summary, {args.events} events, capped scans", old_samples)
+        report(f"analytics summary, {args.events} events, $facet", new_samples)
+    finally:
+        await db.analytics_events.delete_many({"session_id": {"$regex": "^bench-session-"}})
+
+
+class InlinePasswordHasher:
+    """The pre-pool behaviour: bcrypt called directly on the event loop"""
+
+    async def hash(self, password):
+        return server.pwd_context.hash(password)
+
+    async def verify(self, plain_password, hashed_password):
+        return server.pwd_context.verify(plain_password, hashed_password)
+
+
+async def bench_login_load(args):
+    """Bursts of logins mixed with catalog reads: catalog latency with bcrypt on the event loop (old) vs the hashing pool (new)"""
+    import httpx
+    db = server.db
+    products = synthetic_products(500)
+    await db.products.delete_many({"id": {"$regex": "^bench-"}})
+    await db.products.insert_many([dict(p) for p in products])
+    await db.users.delete_many({"email": {"$regex": "@bench.example.com$"}})
+    await db.users.insert_one(server.User(
+        id="bench-login-user", email="login@bench.example.com", full_name="Bench",
+        hashed_password=server.pwd_context.hash("bench-password"),
+    ).model_dump())
+    server.product_catalog.invalidate()
+
+    transport = httpx.ASGITransport(app=server.app)
+    pool_hasher = server.password_hasher
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            await http.get("/api/products", params={"limit": 24})
+
+            async def login():
+                response = await http.post("/api/auth/login", json={"email": "login@bench.example.com", "password": "bench-password"})
+                assert response.status_code == 200, response.text
+
+            async def catalog_reads(samples, done):
+                # Reads are issued on a fixed schedule and timed from when they were due, so time spent
+                # waiting for a blocked event loop counts against them
+                rng = random.Random(3)
+                due = time.perf_counter()
+                while not done.is_set():
+                    await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                    await http.get("/api/products", params={"category": rng.choice(CATEGORIES), "limit": 24})
+                    samples.append((time.perf_counter() - due) * 1000)
+                    due += 0.05
+
+            for name, hasher in (("bcrypt on the event loop", InlinePasswordHasher()), ("bcrypt on the hashing pool", pool_hasher)):
+                server.password_hasher = hasher
+                login_samples, catalog_samples = [], []
+                done = asyncio.Event()
+                readers = [asyncio.create_task(catalog_reads(catalog_samples, done)) for _ in range(4)]
+                started = time.perf_counter()
+                for i in range(0, args.logins, args.concurrency):
+                    await asyncio.gather(*(timed(login_samples, login()) for _ in range(min(args.concurrency, args.logins - i))))
+                elapsed = time.perf_counter() - started
+                done.set()
+                await asyncio.gather(*readers)
+                print(f"{name}: {args.logins / elapsed:.1f} logins/s")
+                report(f"{name}, login latency", login_samples)
+                report(f"{name}, catalog read latency", catalog_samples)
+            print(f"hashing pool metrics: {pool_hasher.stats()}")
+    finally:
+        server.password_hasher = pool_hasher
+        await db.products.delete_many({"id": {"$regex": "^bench-"}})
+        await db.users.delete_many({"email": {"$regex": "@bench.example.com$"}})
+        server.product_catalog.invalidate()
+
+
+async def bench_product_import(args):
+    """Loading a large catalog: one insert_one per product (old seed scripts) vs the chunked bulk import, from CSV"""
+    db = server.db
+    products = [
+        {**product, "barcode": f"bench-{i:08d}", "image_urls": "|".join(product["image_urls"])}
+        for i, product in enumerate(synthetic_products(args.products))
+    ]
+    columns = ["product_name", "category", "price", "barcode", "image_urls"]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(products)
+    data = buffer.getvalue().encode("utf-8")
+    print(f"generated a {len(data) / 1024 / 1024:.1f} MiB CSV with {len(products)} products")
+
+    await db.products.delete_many({"barcode": {"$regex": "^bench-"}})
+    try:
+        started = time.perf_counter()
+        for product in products:
+            await db.products.insert_one({**product, "image_urls": product["image_urls"].split("|")})
+        print(f"insert_one per product: {time.perf_counter() - started:.1f}s")
+        await db.products.delete_many({"barcode": {"$regex": "^bench-"}})
+
+        for label in ("bulk import, new products", "bulk import, re-import (all updates)"):
+            started = time.perf_counter()
+            report = await server.import_products(io.BytesIO(data), "csv")
+            print(f"{label}: {time.perf_counter() - started:.1f}s "
+                  f"(created {report['created']}, updated {report['updated']}, rejected {report['failed']})")
+    finally:
+        await db.products.delete_many({"barcode": {"$regex": "^bench-"}})
+        server.product_catalog.invalidate()
+
+
+async def old_reprice(db, products, multiply):
+    """What PUT /admin/products/{id} does, once per product"""
+    for product in products:
+        existing = await db.products.find_one({"id": product["id"]}, {"_id": 0})
+        update = {"discounted_price": round(existing["price"] * multiply, 2)}
+        update["effective_price"] = server.effective_price({**existing, **update})
+        await db.products.update_one({"id": product["id"]}, {"$set": update})
+        await db.products.find_one({"id": product["id"]}, {"_id": 0})
+
+
+async def bench_bulk_reprice(args):
+    """10% off the whole catalog: one PUT per product vs per-product bulk updates vs one filter + operation"""
+    db = server.db
+    products = synthetic_products(args.products)
+    await db.products.delete_many({"id": {"$regex": "^bench-"}})
+    await db.products.insert_many([dict(p) for p in products])
+    bench_ids = {"ids": [p["id"] for p in products]}
+
+    try:
+        started = time.perf_counter()
+        await old_reprice(db, products, 0.9)
+        print(f"one PUT per product: {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        summary = {"matched": 0, "modified": 0}
+        for i in range(0, len(products), server.PRODUCT_BULK_MAX_UPDATES):
+            batch = products[i:i + server.PRODUCT_BULK_MAX_UPDATES]
+            result = await server.bulk_update_products(server.ProductBulkUpdate(
+                updates=[{"id": p["id"], "discounted_price": round(p["price"] * 0.8, 2)} for p in batch]
+            ))
+            summary["matched"] += result["matched"]
+            summary["modified"] += result["modified"]
+        print(f"bulk updates, {server.PRODUCT_BULK_MAX_UPDATES} per request: {time.perf_counter() - started:.1f}s {summary}")
+
+        started = time.perf_counter()
+        summary = await server.bulk_update_products(server.ProductBulkUpdate(
+            filter=bench_ids,
+            operation={"field": "discounted_price", "source": "price", "multiply": 0.9}
+        ))
+        print(f"filter + operation, one update_many: {time.perf_counter() - started:.1f}s {summary}")
+        sample = await db.products.find_one({"id": products[0]["id"]}, {"_id": 0})
+        assert sample["effective_price"] == round(products[0]["price"] * 0.9, 2)
+    finally:
+        await db.products.delete_many({"id": {"$regex": "^bench-"}})
+        server.product_catalog.invalidate()
+
+
+SCENARIOS = {
+    "suggest": bench_suggest,
+    "checkout": bench_checkout,
+    "stock-contention": bench_stock_contention,
+    "admin-stats": bench_admin_stats,
+    "analytics-ingest": bench_analytics_ingest,
+    "analytics-summary": bench_analytics_summary,
+    "login-load": bench_login_load,
+    "product-import": bench_product_import,
+    "bulk-reprice": bench_bulk_reprice,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--buyers", type=int, default=300)
+    parser.add_argument("--stock", type=int, default=25)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    result = SCENARIOS[args.scenario](args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
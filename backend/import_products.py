@@ -0,0 +1,74 @@
+"""
+Bulk import products from a CSV, XLSX or JSON (array or JSON Lines) file, upserting by barcode.
+
+Usage:
+    python import_products.py products_data.json
+    python import_products.py catalog.xlsx --dry-run
+    python import_products.py catalog.csv --report import_errors.json
+
+Columns/keys are ProductCreate fields (product_name, category, price, barcode, ...); unknown
+columns are ignored. Columns present in the file overwrite the stored values, the rest are kept.
+Products are matched by barcode; variants sharing one barcode (in the file or in the store) are
+matched by barcode + product_name. Lines that are not valid UTF-8 are rejected and listed in the
+report by row, the rows around them are still imported.
+Running servers reload their catalog within PRODUCT_CATALOG_SYNC_SECONDS of the import finishing;
+the admin endpoint POST /api/admin/products/import does the same import and refreshes its worker at once.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+import server  # noqa: E402
+
+
+async def run_import(path, dry_run):
+    started = time.perf_counter()
+    with open(path, "rb") as stream:
+        report = await server.import_products(stream, server.product_import_format(path.name), dry_run)
+    elapsed = time.perf_counter() - started
+
+    print(f"{'Validated' if dry_run else 'Imported'} {path.name} in {elapsed:.1f}s")
+    print(f"  rows: {report['rows']}, valid: {report['valid']}, rejected: {report['failed']}")
+    if not dry_run:
+        print(f"  created: {report['created']}, updated: {report['updated']}")
+    for error in report["errors"][:20]:
+        print(f"  row {error['row']}: {'; '.join(error['errors'])}")
+    if report["failed"] > 20:
+        print(f"  ... {report['failed'] - 20} more rejected rows")
+    if report["aborted"]:
+        print("⚠️  The file could not be read to the end; only the rows before the last error were imported")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="CSV, XLSX, JSON or JSON Lines file")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    parser.add_argument("--report", type=Path, help="write the full report (counts and rejected rows) as JSON")
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(run_import(args.path, args.dry_run))
+    except (ValueError, csv.Error) as e:
+        print(f"❌ {e}")
+        return 2
+    finally:
+        server.client.close()
+
+    if args.report:
+        args.report.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Report written to {args.report}")
+    return 1 if report["failed"] or report["aborted"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+import os
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Load environment
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# MongoDB connection
+mongo_url = os.environ['MONGO_URL']
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+db = client[os.environ['DB_NAME']]
+
+def merge_items(existing: list, legacy: list) -> list:
+    """Lines from both carts; quantities of a product present in both are added up"""
+    merged = {}
+    for item in existing + legacy:
+        product_id = item.get("product_id")
+        if not product_id:
+            continue
+        if product_id in merged:
+            merged[product_id]["quantity"] += item.get("quantity", 1)
+        else:
+            merged[product_id] = {"product_id": product_id, "quantity": item.get("quantity", 1)}
+    return list(merged.values())
+
+async def migrate_carts():
+    """Move users.cart arrays into the carts collection (one document per user)"""
+
+    print("Starting cart migration...")
+
+    # The server creates this index too; it has to exist before carts are upserted by user_id
+    await db.carts.create_index("user_id", unique=True)
+
+    migrated = emptied = 0
+    cursor = db.users.find({"cart": {"$exists": True}}, {"_id": 0, "id": 1, "cart": 1})
+    async for user in cursor:
+        legacy = user.get("cart") or []
+        if legacy:
+            # Carts written by the new routes since the deploy are kept and merged with the old array
+            existing = await db.carts.find_one({"user_id": user["id"]}, {"_id": 0, "items": 1})
+            await db.carts.update_one(
+                {"user_id": user["id"]},
+                {
+                    "$set": {
+                        "items": merge_items((existing or {}).get("items", []), legacy),
+                        "updated_at": datetime.now(timezone.utc)
+                    },
+                    "$inc": {"version": 1},
+                    "$setOnInsert": {"checkout": None}
+                },
+                upsert=True
+            )
+            migrated += 1
+        else:
+            emptied += 1
+        await db.users.update_one({"id": user["id"]}, {"$unset": {"cart": ""}})
+
+    print(f"  moved {migrated} carts, dropped {emptied} empty cart fields")
+    print("✅ Cart migration complete!")
+
+if __name__ == "__main__":
+    asyncio.run(migrate_carts())
@@ -0,0 +1,75 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+import os
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Load environment
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# MongoDB connection
+mongo_url = os.environ['MONGO_URL']
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+db = client[os.environ['DB_NAME']]
+
+BATCH_SIZE = 1000
+
+# (collection, field) pairs written as ISO strings before the switch to native dates
+FIELDS = [
+    ("orders", "created_at"),
+    ("users", "created_at"),
+    ("analytics_events", "created_at"),
+    ("carts", "checkout.started_at"),
+    ("carts", "updated_at"),
+]
+
+def parse_timestamp(value: str) -> datetime:
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def get_field(document: dict, path: str):
+    for part in path.split("."):
+        document = document.get(part) if isinstance(document, dict) else None
+    return document
+
+async def convert_field(collection: str, field: str):
+    """Rewrite string timestamps in one field as BSON dates, in batches"""
+    converted = skipped = 0
+    batch = []
+    cursor = db[collection].find({field: {"$type": "string"}}, {field: 1})
+    async for document in cursor:
+        try:
+            value = parse_timestamp(get_field(document, field))
+        except ValueError:
+            skipped += 1
+            continue
+        # Match on the old value too so a document rewritten meanwhile is left alone
+        batch.append(UpdateOne({"_id": document["_id"], field: get_field(document, field)}, {"$set": {field: value}}))
+        if len(batch) == BATCH_SIZE:
+            converted += (await db[collection].bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        converted += (await db[collection].bulk_write(batch, ordered=False)).modified_count
+
+    print(f"  {collection}.{field}: converted {converted}" + (f", skipped {skipped} unparseable" if skipped else ""))
+
+async def migrate_datetimes():
+    """Store created_at (and checkout timestamps) as native dates instead of ISO strings"""
+
+    print("Starting datetime migration...")
+
+    for collection, field in FIELDS:
+        await convert_field(collection, field)
+
+    # Rollups were keyed on string timestamps; drop them so the compactor rebuilds them from the converted events
+    await db.analytics_rollups.delete_many({})
+    await db.analytics_rollup_state.delete_many({})
+    print("  analytics rollups cleared; they are rebuilt by the server's compactor")
+
+    print("✅ Datetime migration complete!")
+
+if __name__ == "__main__":
+    asyncio.run(migrate_datetimes())
@@ -0,0 +1,200 @@
+"""
+Rebuild the dashboard store counters from the raw collections and report drift.
+
+Usage:
+    python reconcile_stats.py           # report drift only
+    python reconcile_stats.py --apply   # report, then correct the counters to the rebuilt values
+
+Run --apply once after deploying the counters so existing history is counted (the dashboard
+recomputes from the raw collections until then); afterwards the writers keep them current and
+this only needs to run if drift is reported.
+
+Corrections are applied as $inc of (rebuilt - stored), so increments the live writers make
+while this runs are kept. The counters are read before and after the rebuild, and the rebuild
+is retried when they moved in between.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+import server  # noqa: E402
+from server import db, STORE_COUNTERS_ID  # noqa: E402
+from pymongo import UpdateOne  # noqa: E402
+
+STORE_FIELDS = ("orders", "sales", "users", "boz_plus_members", "customers")
+DAILY_FIELDS = ("orders", "sales", "registrations")
+# Rebuilds attempted before applying against counters that kept moving
+TALLY_ATTEMPTS = 5
+
+
+async def tally():
+    """Counters, day buckets, units sold per product and customer ids, recomputed from scratch"""
+    orders, daily_orders, registrations, product_sales, customers, users = await asyncio.gather(
+        db.orders.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}, "sales": {"$sum": "$total"}}}
+        ]).to_list(None),
+        db.orders.aggregate([
+            {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "orders": {"$sum": 1}, "sales": {"$sum": "$total"}}}
+        ]).to_list(None),
+        db.users.aggregate([
+            {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "registrations": {"$sum": 1}}}
+        ]).to_list(None),
+        db.orders.aggregate([
+            {"$unwind": "$items"},
+            {"$group": {"_id": "$items.product_id", "sold": {"$sum": {"$ifNull": ["$items.quantity", 1]}}}}
+        ]).to_list(None),
+        db.orders.aggregate([{"$group": {"_id": "$user_id"}}]).to_list(None),
+        db.users.aggregate([
+            {"$group": {"_id": None, "users": {"$sum": 1}, "boz_plus_members": {"$sum": {"$cond": ["$is_boz_plus", 1, 0]}}}}
+        ]).to_list(1),
+    )
+
+    counters = {
+        "_id": STORE_COUNTERS_ID,
+        "orders": sum(row["count"] for row in orders),
+        "sales": sum(row["sales"] for row in orders),
+        "users": users[0]["users"] if users else 0,
+        "boz_plus_members": users[0]["boz_plus_members"] if users else 0,
+        "customers": len(customers),
+        "status": {row["_id"]: row["count"] for row in orders if row["_id"]},
+    }
+
+    daily = {}
+    for row in daily_orders:
+        daily.setdefault(row["_id"], {"_id": row["_id"]}).update(orders=row["orders"], sales=row["sales"])
+    for row in registrations:
+        daily.setdefault(row["_id"], {"_id": row["_id"]})["registrations"] = row["registrations"]
+
+    return counters, daily, {row["_id"]: row["sold"] for row in product_sales if row["_id"]}, customers
+
+
+async def stored_counters():
+    """The counters as the writers left them"""
+    stored, stored_daily, stored_sold, stored_customers = await asyncio.gather(
+        db.stats_counters.find_one({"_id": STORE_COUNTERS_ID}),
+        db.stats_daily.find({}).to_list(None),
+        db.stats_product_sales.find({}).to_list(None),
+        db.stats_customers.find({}, {"_id": 1}).to_list(None),
+    )
+    return (
+        stored or {},
+        {doc["_id"]: doc for doc in stored_daily},
+        {doc["_id"]: doc.get("sold", 0) for doc in stored_sold},
+        {doc["_id"] for doc in stored_customers},
+    )
+
+
+def numbers_differ(stored, expected):
+    return abs((stored or 0) - (expected or 0)) > 1e-6
+
+
+def correction(stored: dict, expected: dict, fields) -> dict:
+    """$inc moving the stored fields to the expected values"""
+    return {
+        field: (expected.get(field) or 0) - (stored.get(field) or 0)
+        for field in fields if numbers_differ(stored.get(field), expected.get(field))
+    }
+
+
+async def apply_corrections(stored, expected, stored_daily, daily, stored_sold, sold, stored_customers, customers):
+    inc = correction(stored, expected, STORE_FIELDS)
+    stored_status = stored.get("status", {})
+    for status, delta in correction(stored_status, expected["status"], set(stored_status) | set(expected["status"])).items():
+        inc[f"status.{status}"] = delta
+    # The first --apply creates the store document; writers never do
+    await db.stats_counters.update_one({"_id": STORE_COUNTERS_ID}, {"$inc": inc}, upsert=True)
+
+    day_writes = [
+        UpdateOne({"_id": day}, {"$inc": delta}, upsert=True)
+        for day in set(stored_daily) | set(daily)
+        if (delta := correction(stored_daily.get(day, {}), daily.get(day, {}), DAILY_FIELDS))
+    ]
+    if day_writes:
+        await db.stats_daily.bulk_write(day_writes, ordered=False)
+    sold_writes = [
+        UpdateOne({"_id": pid}, {"$inc": {"sold": sold.get(pid, 0) - stored_sold.get(pid, 0)}}, upsert=True)
+        for pid in set(stored_sold) | set(sold) if numbers_differ(stored_sold.get(pid), sold.get(pid))
+    ]
+    if sold_writes:
+        await db.stats_product_sales.bulk_write(sold_writes, ordered=False)
+
+    expected_customers = {row["_id"] for row in customers if row["_id"]}
+    missing = expected_customers - stored_customers
+    if missing:
+        await db.stats_customers.bulk_write(
+            [UpdateOne({"_id": uid}, {"$setOnInsert": {"first_order_id": None}}, upsert=True) for uid in missing],
+            ordered=False
+        )
+    extra = stored_customers - expected_customers
+    if extra:
+        await db.stats_customers.delete_many({"_id": {"$in": list(extra)}})
+
+
+async def reconcile(apply):
+    for attempt in range(1, TALLY_ATTEMPTS + 1):
+        before = await stored_counters()
+        expected, daily, sold, customers = await tally()
+        after = await stored_counters()
+        if before == after:
+            break
+        print(f"Counters changed during the rebuild (attempt {attempt}/{TALLY_ATTEMPTS}), rebuilding again")
+    else:
+        print("⚠️  Counters kept changing; corrections may be off by the writes made during the last rebuild")
+    stored, stored_daily, stored_sold, stored_customers = after
+
+    drift = 0
+    print("Store counters (stored -> rebuilt):")
+    for field in STORE_FIELDS:
+        marker = "  DRIFT" if numbers_differ(stored.get(field), expected[field]) else ""
+        drift += bool(marker)
+        print(f"  {field}: {stored.get(field, 0)} -> {expected[field]}{marker}")
+    stored_status = stored.get("status", {})
+    for status in sorted(set(stored_status) | set(expected["status"])):
+        marker = "  DRIFT" if numbers_differ(stored_status.get(status), expected["status"].get(status)) else ""
+        drift += bool(marker)
+        print(f"  status.{status}: {stored_status.get(status, 0)} -> {expected['status'].get(status, 0)}{marker}")
+
+    days_off = [
+        day for day in sorted(set(stored_daily) | set(daily))
+        if any(
+            numbers_differ(stored_daily.get(day, {}).get(field), daily.get(day, {}).get(field))
+            for field in DAILY_FIELDS
+        )
+    ]
+    products_off = [pid for pid in set(stored_sold) | set(sold) if numbers_differ(stored_sold.get(pid), sold.get(pid))]
+    drift += len(days_off) + len(products_off)
+    print(f"Day buckets with drift: {len(days_off)}" + (f" ({', '.join(days_off[:10])}{' ...' if len(days_off) > 10 else ''})" if days_off else ""))
+    print(f"Products with drifting units sold: {len(products_off)}")
+
+    if not drift:
+        print("✅ Counters match the raw collections")
+    elif not apply:
+        print(f"⚠️  {drift} drifting counters; run with --apply to correct them")
+
+    if apply:
+        await apply_corrections(stored, expected, stored_daily, daily, stored_sold, sold, stored_customers, customers)
+        print("✅ Counters corrected")
+
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="correct the counters to the rebuilt values")
+    args = parser.parse_args()
+
+    try:
+        drift = asyncio.run(reconcile(args.apply))
+    finally:
+        server.client.close()
+    return 1 if drift and not args.apply else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,37 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Body, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from bson import Binary
 import os
+import re
+import csv
+import json
+import math
+import base64
+import bisect
+import unicodedata
+import time
+import heapq
+import asyncio
+import itertools
+import collections
+import zlib
+import gzip
+import array
+import hashlib
+import operator
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError
+from typing import List, Literal, Optional, Union
 import uuid
 from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 import jwt
 import shutil
@@ -22,16 +43,97 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs on a dedicated thread pool so it never blocks the event loop; callers beyond the queue limit get a 503
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '256'))
+
 # JWT settings
 SECRET_KEY = os.environ.get('JWT_SECRET', 'boz-concept-home-secret-key-2025')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
+# Access tokens are short-lived and checked against the revocation list only; refresh tokens rotate on every use
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', '30'))
+# A refresh token presented again within this window (e.g. two tabs refreshing at once) is refused without ending the session
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = 30
+# How often each worker pulls revocations made by other workers
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.environ.get('TOKEN_REVOCATION_SYNC_SECONDS', '5'))
+
+# Authenticated principals (user/admin documents) are cached per worker for this long after being read
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', '30'))
+AUTH_CACHE_MAX_ENTRIES = 10000
+# How often each worker drops cached principals whose BOZ PLUS membership another worker changed
+AUTH_CACHE_SYNC_SECONDS = float(os.environ.get('AUTH_CACHE_SYNC_SECONDS', '5'))
+
+# Product catalog cache - bounds staleness for writes made outside the API (seed scripts, manual edits)
+PRODUCT_CACHE_TTL_SECONDS = int(os.environ.get('PRODUCT_CACHE_TTL_SECONDS', '300'))
+# How often each worker checks the shared catalog version for product writes made by other workers
+PRODUCT_CATALOG_SYNC_SECONDS = float(os.environ.get('PRODUCT_CATALOG_SYNC_SECONDS', '5'))
+# Slim product snapshots used to render carts and admin views
+PRODUCT_SNAPSHOT_CACHE_SIZE = 5000
+# Rendered carts kept per worker so a cart mutation only re-prices the line it changed
+CART_VIEW_CACHE_SIZE = 10000
+
+# Bulk product import: rows validated and written per chunk; at most this many rejected rows are listed in the report
+PRODUCT_IMPORT_CHUNK_SIZE = 1000
+PRODUCT_IMPORT_MAX_REPORTED_ERRORS = 1000
+# Per-product changes accepted by one PATCH /admin/products:bulk request
+PRODUCT_BULK_MAX_UPDATES = 5000
+# Set to "false" to serve /api/products straight from MongoDB (e.g. when workers must never serve stale data).
+# Search and suggestions still use the in-memory index, but then check the shared catalog version on every request.
+PRODUCT_CACHE_ENABLED = os.environ.get('PRODUCT_CACHE_ENABLED', 'true').lower() == 'true'
+
+# Keyset pagination
+MAX_PAGE_SIZE = 200
+
+# Checkout - a cart claimed by a checkout that never finished (crashed worker) can be claimed again after this
+CHECKOUT_CLAIM_TIMEOUT_SECONDS = 300
+
+# Product search - per-field term weights
+SEARCH_FIELD_WEIGHTS = {"product_name": 3.0, "materials": 2.0, "colors": 2.0, "description": 1.0}
+
+# Search-as-you-type suggestions - top results are precomputed for prefixes up to this length
+SUGGEST_MAX_RESULTS = 10
+SUGGEST_PRECOMPUTED_PREFIX_LENGTH = 3
+SUGGEST_RANGE_SCAN_LIMIT = 512
+
+# Analytics ingest - events are buffered in memory and written in batches; beyond the buffer cap new events are dropped
+ANALYTICS_FLUSH_BATCH_SIZE = int(os.environ.get('ANALYTICS_FLUSH_BATCH_SIZE', '500'))
+ANALYTICS_FLUSH_INTERVAL_SECONDS = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL_SECONDS', '1.0'))
+ANALYTICS_BUFFER_MAX_EVENTS = int(os.environ.get('ANALYTICS_BUFFER_MAX_EVENTS', '50000'))
+# Batch event endpoint limits - events per request and request body size after decompression
+ANALYTICS_BATCH_MAX_EVENTS = 500
+ANALYTICS_BATCH_MAX_BYTES = 1024 * 1024
+
+# Analytics rollups - how often the compactor runs, how long after an hour ends it is closed, hours compacted per pass
+ANALYTICS_ROLLUP_INTERVAL_SECONDS = float(os.environ.get('ANALYTICS_ROLLUP_INTERVAL_SECONDS', '60'))
+ANALYTICS_ROLLUP_GRACE_SECONDS = 120
+ANALYTICS_ROLLUP_MAX_HOURS_PER_PASS = 168
+# Only the worker holding the compactor lease compacts; it renews the lease every pass
+ANALYTICS_ROLLUP_LEASE_SECONDS = max(300.0, 3 * ANALYTICS_ROLLUP_INTERVAL_SECONDS)
+
+# Analytics retention - raw events are deleted after this many days; 0 keeps them forever.
+# Rollups are kept indefinitely. With ANALYTICS_ARCHIVE_DIR set, each day of raw events is also
+# written there as gzipped JSON lines a day before it is due. Nothing is deleted before its day
+# has been rolled up and archived.
+ANALYTICS_RETENTION_DAYS = int(os.environ.get('ANALYTICS_RETENTION_DAYS', '90'))
+ANALYTICS_ARCHIVE_DIR = os.environ.get('ANALYTICS_ARCHIVE_DIR', '')
+
+# Analytics sketches - HyperLogLog precision (2^p registers), Count-Min error (eps) and failure probability (delta),
+# top-K candidates tracked per day, days of sketches kept and how often each worker persists its sketches
+ANALYTICS_HLL_PRECISION = 14
+ANALYTICS_CMS_EPSILON = 0.001
+ANALYTICS_CMS_DELTA = 0.01
+ANALYTICS_TOPK_CAPACITY = 100
+ANALYTICS_SKETCH_DAYS = 30
+ANALYTICS_SKETCH_PERSIST_SECONDS = float(os.environ.get('ANALYTICS_SKETCH_PERSIST_SECONDS', '60'))
+# A worker's claim on its sketch slot lapses when it has not persisted for this long
+ANALYTICS_SKETCH_SLOT_LEASE_SECONDS = max(300.0, 3 * ANALYTICS_SKETCH_PERSIST_SECONDS)
 
 security = HTTPBearer()
 
@@ -51,7 +153,7 @@ class User(BaseModel):
     is_boz_plus: bool = False
     boz_plus_expiry_date: Optional[str] = None
     boz_plus_requested: bool = False
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserRegister(BaseModel):
     email: EmailStr
@@ -66,6 +168,11 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class Product(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -87,6 +194,7 @@ class Product(BaseModel):
     best_seller: Optional[bool] = False  # Best seller flag
     sales_count: Optional[int] = 0  # Number of sales for sorting
     best_seller_rank: Optional[int] = None  # Rank among best sellers
+    effective_price: Optional[float] = None  # discounted_price or price, materialized for price range queries
 
 class CartItem(BaseModel):
     product_id: str
@@ -99,14 +207,22 @@ class Cart(BaseModel):
     items: List[CartItem] = []
     updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+class OrderItem(BaseModel):
+    product_id: str
+    quantity: int = 1
+    # Snapshot taken at checkout; missing on orders placed before line prices were stored
+    product_name: Optional[str] = None
+    unit_price: Optional[float] = None
+    subtotal: Optional[float] = None
+
 class Order(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
-    items: List[CartItem]
+    items: List[OrderItem]
     total: float
     shipping_address: str
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     status: str = "pending"
 
 class OrderCreate(BaseModel):
@@ -193,7 +309,7 @@ class AnalyticsEvent(BaseModel):
     session_id: Optional[str] = None
     ip_address: Optional[str] = None
     user_agent: Optional[str] = None
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class AnalyticsEventCreate(BaseModel):
     event_type: str
@@ -243,60 +359,479 @@ class ProductUpdate(BaseModel):
     stock_amount: Optional[int] = None
     image_urls: Optional[List[str]] = None
 
+class ProductBulkItem(ProductUpdate):
+    id: str
+
+class ProductBulkFilter(BaseModel):
+    ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    stock_status: Optional[str] = None
+    all_products: bool = False  # must be set explicitly to target the whole catalog
+
+class ProductBulkOperation(BaseModel):
+    """field = value, or field = round(source * multiply + add) for every matched product with a numeric source"""
+    field: Literal["price", "discounted_price", "boz_plus_price", "stock_amount", "stock_status"]
+    value: Optional[Union[float, str]] = None
+    source: Optional[Literal["price", "discounted_price", "boz_plus_price", "stock_amount"]] = None
+    multiply: float = 1
+    add: float = 0
+
+class ProductBulkUpdate(BaseModel):
+    # Either per-product partial updates, or a filter plus one operation
+    updates: Optional[List[ProductBulkItem]] = None
+    filter: Optional[ProductBulkFilter] = None
+    operation: Optional[ProductBulkOperation] = None
+
 class OrderStatusUpdate(BaseModel):
     status: str
 
 # ============ AUTH HELPERS ============
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool (bcrypt releases the GIL while hashing).
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    At most `workers` operations run at once; up to `max_queue` more wait for a slot
+    and anything beyond that is refused with a 503 instead of piling up.
+    """
+    
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+    
+    async def _run(self, fn, *args):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Sunucu yoğun, lütfen tekrar deneyin", headers={"Retry-After": "1"})
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        waited = started - queued_at
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.run_seconds_total += time.perf_counter() - started
+            self._slots.release()
+    
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_seconds_total / self.completed * 1000, 2) if self.completed else 0.0,
+            "max_wait_ms": round(self.wait_seconds_max * 1000, 2),
+            "avg_run_ms": round(self.run_seconds_total / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "typ": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class TokenDenylist:
+    """Token and session ids revoked before their tokens expire.
+
+    Lookups are in-memory only. Revocations are also written to revoked_tokens (TTL on
+    expires_at) and every worker pulls the ones made elsewhere every few seconds.
+    """
+    
+    def __init__(self, sync_interval: float):
+        self.sync_interval = sync_interval
+        self._entries = {}
+        self._synced_until = None
+        self._task = None
+    
+    def is_revoked(self, *keys) -> bool:
+        now = time.time()
+        return any(key is not None and self._entries.get(key, 0) > now for key in keys)
+    
+    async def revoke(self, key: str, expires_at: datetime):
+        self._entries[key] = max(self._entries.get(key, 0), expires_at.timestamp())
+        await db.revoked_tokens.update_one(
+            {"_id": key},
+            {"$max": {"expires_at": expires_at}, "$set": {"revoked_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    
+    async def sync(self):
+        now = datetime.now(timezone.utc)
+        query = {"expires_at": {"$gt": now}}
+        if self._synced_until is not None:
+            # Overlap the previous pass so revocations stamped by a slightly lagging clock are not missed
+            query["revoked_at"] = {"$gte": self._synced_until - timedelta(seconds=30)}
+        async for doc in db.revoked_tokens.find(query, {"expires_at": 1}):
+            self._entries[doc["_id"]] = max(self._entries.get(doc["_id"], 0), doc["expires_at"].timestamp())
+        self._synced_until = now
+        expired = [key for key, expires in self._entries.items() if expires <= now.timestamp()]
+        for key in expired:
+            del self._entries[key]
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Syncing revoked tokens failed")
+            await asyncio.sleep(self.sync_interval)
+
+token_denylist = TokenDenylist(TOKEN_REVOCATION_SYNC_SECONDS)
+
+def decode_access_token(token: str) -> dict:
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # Tokens issued before refresh tokens existed carry no typ/jti; they simply run out
+    if payload.get("typ", "access") != "access":
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if token_denylist.is_revoked(payload.get("jti"), payload.get("sid")):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+async def issue_tokens(subject: str, role: Optional[str] = None, session_id: Optional[str] = None) -> Token:
+    """Access token plus a single-use refresh token; session_id ties together every rotation of one login"""
+    session_id = session_id or uuid.uuid4().hex
+    claims = {"sub": subject, "sid": session_id}
+    if role:
+        claims["role"] = role
+    refresh_id = uuid.uuid4().hex
+    expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    await db.refresh_tokens.insert_one({
+        "_id": refresh_id,
+        "sid": session_id,
+        "sub": subject,
+        "role": role,
+        "expires_at": expires_at,
+        "used_at": None
+    })
+    refresh_token = jwt.encode(
+        {**claims, "jti": refresh_id, "typ": "refresh", "exp": expires_at},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+    return Token(
+        access_token=create_access_token(claims),
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
+
+def decode_refresh_token(refresh_token: str, role: Optional[str], verify_exp: bool = True) -> dict:
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": verify_exp})
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if payload.get("typ") != "refresh" or payload.get("role") != role or not payload.get("sid"):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return payload
+
+async def revoke_session(session_id: str):
+    """End one login: drop its refresh tokens and deny the access tokens still in circulation"""
+    await db.refresh_tokens.delete_many({"sid": session_id})
+    await token_denylist.revoke(
+        session_id, datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+async def revoke_sessions(subject: str, role: Optional[str] = None, keep: Optional[str] = None):
+    """End every login of a user/admin, optionally except the session making the request"""
+    for session_id in await db.refresh_tokens.distinct("sid", {"sub": subject, "role": role}):
+        if session_id != keep:
+            await revoke_session(session_id)
+
+async def rotate_refresh_token(refresh_token: str, role: Optional[str] = None) -> Token:
+    payload = decode_refresh_token(refresh_token, role)
+    now = datetime.now(timezone.utc)
+    record = await db.refresh_tokens.find_one_and_update(
+        {"_id": payload["jti"], "used_at": None},
+        {"$set": {"used_at": now}}
+    )
+    if record is None:
+        used = await db.refresh_tokens.find_one({"_id": payload["jti"]}, {"used_at": 1})
+        if used is None or used["used_at"] < now - timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+            # A refresh token replayed after rotation may have been stolen: end the whole session
+            await revoke_session(payload["sid"])
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    principal = await load_principal(*(("admin", "admins") if role == "admin" else ("user", "users")), payload["sub"])
+    if principal is None:
+        await revoke_session(payload["sid"])
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return await issue_tokens(payload["sub"], role, payload["sid"])
+
+def session_of(credentials: HTTPAuthorizationCredentials) -> Optional[str]:
+    """Session id of an access token that get_current_user/get_current_admin already validated"""
+    return jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM]).get("sid")
+
+class PrincipalCache:
+    """Short-lived LRU of user/admin documents keyed by ("user" | "admin", id).
+
+    Writes that change a principal call invalidate(); other workers pick the change up
+    once their copy expires. Changes that affect prices (BOZ PLUS membership) call publish()
+    instead, which also records them in principal_changes; every worker pulls those every
+    few seconds, so cart and checkout see the same membership everywhere. A read that
+    started before an invalidation is not cached.
+    """
+    
+    def __init__(self, ttl: float, max_entries: int, sync_interval: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self._entries = collections.OrderedDict()
+        self._generations = {}
+        self._synced_until = None
+        self._task = None
+    
+    def get(self, key: tuple) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, document = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return document
+    
+    def generation(self, key: tuple) -> int:
+        return self._generations.get(key, 0)
+    
+    def put(self, key: tuple, document: dict, generation: int):
+        if self._generations.get(key, 0) != generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, document)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, key: tuple):
+        self._entries.pop(key, None)
+        self._generations[key] = self._generations.get(key, 0) + 1
+    
+    async def publish(self, key: tuple):
+        """Invalidate here and on every other worker"""
+        self.invalidate(key)
+        now = datetime.now(timezone.utc)
+        # Kept until no worker can still hold a copy read before the change, plus the sync overlap
+        await db.principal_changes.update_one(
+            {"_id": "|".join(key)},
+            {"$set": {"key": list(key), "changed_at": now, "expires_at": now + timedelta(seconds=self.ttl + 60)}},
+            upsert=True
+        )
+    
+    async def sync(self):
+        now = datetime.now(timezone.utc)
+        query = {}
+        if self._synced_until is not None:
+            # Overlap the previous pass so changes stamped by a slightly lagging clock are not missed
+            query["changed_at"] = {"$gte": self._synced_until - timedelta(seconds=30)}
+        async for doc in db.principal_changes.find(query, {"key": 1}):
+            self.invalidate(tuple(doc["key"]))
+        self._synced_until = now
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Syncing principal changes failed")
+            await asyncio.sleep(self.sync_interval)
+
+principal_cache = PrincipalCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_SYNC_SECONDS)
+
+# Carts live in their own collection (a leftover pre-migration array is skipped); reset tokens are never needed for authentication
+PRINCIPAL_PROJECTION = {"_id": 0, "cart": 0, "reset_token": 0, "reset_token_expires": 0}
+
+def forget_user(user_id: str):
+    principal_cache.invalidate(("user", user_id))
+
+async def load_principal(kind: str, collection: str, principal_id: str) -> Optional[dict]:
+    key = (kind, principal_id)
+    document = principal_cache.get(key)
+    if document is None:
+        generation = principal_cache.generation(key)
+        document = await db[collection].find_one({"id": principal_id}, PRINCIPAL_PROJECTION)
+        if document is not None:
+            principal_cache.put(key, document, generation)
+    return document
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = await load_principal("user", "users", user_id)
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         return User(**user)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
+    except HTTPException as e:
+        if e.detail == "Token revoked":
+            raise
+        raise HTTPException(status_code=401, detail="Invalid authentication")
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid authentication")
 
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         admin_id: str = payload.get("sub")
         role: str = payload.get("role")
         
         if admin_id is None or role != "admin":
             raise HTTPException(status_code=403, detail="Admin access required")
         
-        admin = await db.admins.find_one({"id": admin_id}, {"_id": 0})
+        admin = await load_principal("admin", "admins", admin_id)
         if admin is None:
             raise HTTPException(status_code=403, detail="Admin not found")
         return Admin(**admin)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
+    except HTTPException as e:
+        if e.detail == "Token revoked":
+            raise
+        raise HTTPException(status_code=403, detail="Admin access required")
     except Exception as e:
         raise HTTPException(status_code=403, detail="Admin access required")
 
+# ============ STORE COUNTERS ============
+# Dashboard figures are kept as running totals instead of being recomputed from the raw collections:
+#   stats_counters       one document (_id "store") with store-wide totals and per-status order counts
+#   stats_daily          one document per UTC day (_id "YYYY-MM-DD") with orders, sales and registrations
+#   stats_product_sales  units sold per product (_id product id)
+#   stats_customers      one document per user that has ordered (_id user id)
+# Writers $inc them next to the change they describe; reconcile_stats.py corrects them and reports drift.
+# The store document is only created by reconcile_stats.py --apply: until it exists the dashboard
+# recomputes from the raw collections instead of reading partial totals.
+
+STORE_COUNTERS_ID = "store"
+ORDER_STATUSES = ["pending", "preparing", "shipped", "in_transit", "delivered"]
+
+def stats_day(moment: Optional[datetime] = None) -> str:
+    return (moment or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+async def bump_store_counters(totals: dict, daily: Optional[dict] = None, moment: Optional[datetime] = None):
+    """$inc the store-wide counters and, when given, the day bucket of `moment`.
+
+    The store document is not upserted, so counts made before the first reconciliation
+    never pass for totals. The change being counted has already been written, so a failed
+    counter update is logged rather than surfaced; the next reconciliation corrects the drift.
+    """
+    writes = [db.stats_counters.update_one({"_id": STORE_COUNTERS_ID}, {"$inc": totals})]
+    if daily:
+        writes.append(db.stats_daily.update_one({"_id": stats_day(moment)}, {"$inc": daily}, upsert=True))
+    try:
+        await asyncio.gather(*writes)
+    except Exception:
+        logger.exception("Failed to update store counters %s %s", totals, daily)
+
+async def record_order_placed(order: "Order"):
+    """Count a new order: totals, its day bucket, units sold per product and first-time customers"""
+    try:
+        customer = await db.stats_customers.update_one(
+            {"_id": order.user_id},
+            {"$setOnInsert": {"first_order_id": order.id}},
+            upsert=True
+        )
+        sold = {}
+        for item in order.items:
+            sold[item.product_id] = sold.get(item.product_id, 0) + item.quantity
+        await db.stats_product_sales.bulk_write(
+            [UpdateOne({"_id": pid}, {"$inc": {"sold": quantity}}, upsert=True) for pid, quantity in sold.items()],
+            ordered=False
+        )
+    except Exception:
+        logger.exception("Failed to update sales counters for order %s", order.id)
+        customer = None
+    
+    totals = {"orders": 1, "sales": order.total, f"status.{order.status}": 1}
+    if customer is not None and customer.upserted_id is not None:
+        totals["customers"] = 1
+    await bump_store_counters(totals, {"orders": 1, "sales": order.total}, order.created_at)
+
+async def set_boz_plus_fields(user_id: str, fields: dict) -> Optional[dict]:
+    """$set BOZ PLUS fields on a user, keeping the member counter in step with any is_boz_plus change.
+
+    Returns the user as it was before the update, or None when no user matched.
+    """
+    before = await db.users.find_one_and_update(
+        {"id": user_id},
+        {"$set": fields},
+        projection={"_id": 0, "hashed_password": 0}
+    )
+    # Cart and checkout price from the cached principal, so every worker has to drop it
+    await principal_cache.publish(("user", user_id))
+    if before is not None and "is_boz_plus" in fields:
+        delta = int(bool(fields["is_boz_plus"])) - int(bool(before.get("is_boz_plus")))
+        if delta:
+            await bump_store_counters({"boz_plus_members": delta})
+    return before
+
 # ============ AUTH ROUTES ============
 
 @api_router.post("/auth/register", response_model=Token)
@@ -311,23 +846,34 @@ async def register(user_data: UserRegister):
         email=user_data.email,
         full_name=user_data.full_name,
         phone_number=user_data.phone_number,
-        hashed_password=hash_password(user_data.password)
+        hashed_password=await hash_password(user_data.password)
     )
     
     await db.users.insert_one(user.model_dump())
+    await bump_store_counters({"users": 1}, {"registrations": 1}, user.created_at)
     
-    # Create token
-    access_token = create_access_token(data={"sub": user.id})
-    return Token(access_token=access_token, token_type="bearer")
+    # Create tokens
+    return await issue_tokens(user.id)
 
 @api_router.post("/auth/login", response_model=Token)
 async def login(user_data: UserLogin):
     user = await db.users.find_one({"email": user_data.email}, {"_id": 0})
-    if not user or not verify_password(user_data.password, user["hashed_password"]):
+    if not user or not await verify_password(user_data.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    access_token = create_access_token(data={"sub": user["id"]})
-    return Token(access_token=access_token, token_type="bearer")
+    return await issue_tokens(user["id"])
+
+@api_router.post("/auth/refresh", response_model=Token)
+async def refresh_tokens(body: RefreshTokenRequest):
+    """Exchange a refresh token for a new access/refresh pair; the old refresh token stops working"""
+    return await rotate_refresh_token(body.refresh_token)
+
+@api_router.post("/auth/logout")
+async def logout(body: RefreshTokenRequest):
+    """End the session the refresh token belongs to, including its outstanding access tokens"""
+    payload = decode_refresh_token(body.refresh_token, None, verify_exp=False)
+    await revoke_session(payload["sid"])
+    return {"message": "Logged out"}
 
 @api_router.get("/auth/me")
 async def get_me(current_user: User = Depends(get_current_user)):
@@ -347,7 +893,7 @@ async def update_email(
 ):
     """Update user email address"""
     # Verify current password
-    if not pwd_context.verify(password, current_user.hashed_password):
+    if not await verify_password(password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Mevcut şifre yanlış")
     
     # Check if new email already exists
@@ -360,6 +906,7 @@ async def update_email(
         {"id": current_user.id},
         {"$set": {"email": new_email}}
     )
+    forget_user(current_user.id)
     
     return {"message": "E-posta başarıyla güncellendi", "new_email": new_email}
 
@@ -367,21 +914,24 @@ async def update_email(
 async def update_password(
     current_password: str = Body(..., embed=True),
     new_password: str = Body(..., embed=True),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
-    """Update user password"""
+    """Update user password; the user's other sessions are signed out"""
     # Verify current password
-    if not pwd_context.verify(current_password, current_user.hashed_password):
+    if not await verify_password(current_password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Mevcut şifre yanlış")
     
     # Hash new password
-    hashed_new_password = pwd_context.hash(new_password)
+    hashed_new_password = await hash_password(new_password)
     
     # Update password
     await db.users.update_one(
         {"id": current_user.id},
         {"$set": {"hashed_password": hashed_new_password}}
     )
+    forget_user(current_user.id)
+    await revoke_sessions(current_user.id, keep=session_of(credentials))
     
     return {"message": "Şifre başarıyla güncellendi"}
 
@@ -396,6 +946,7 @@ async def update_phone(
         {"id": current_user.id},
         {"$set": {"phone_number": phone_number}}
     )
+    forget_user(current_user.id)
     
     return {"message": "Telefon numarası başarıyla güncellendi", "phone_number": phone_number}
 
@@ -449,7 +1000,7 @@ async def reset_password(
         raise HTTPException(status_code=400, detail="Geçersiz veya süresi dolmuş token")
     
     # Hash new password
-    hashed_password = pwd_context.hash(new_password)
+    hashed_password = await hash_password(new_password)
     
     # Update password and clear reset token
     await db.users.update_one(
@@ -462,62 +1013,761 @@ async def reset_password(
             "reset_token_expires": ""
         }}
     )
+    forget_user(user["id"])
+    await revoke_sessions(user["id"])
     
     return {"message": "Şifre başarıyla sıfırlandı"}
 
+# ============ PAGINATION HELPERS ============
+
+def encode_cursor(sort_value, last_id: str) -> str:
+    """Opaque cursor holding the sort key of the last item on a page"""
+    if isinstance(sort_value, datetime):
+        sort_value = {"$date": sort_value.isoformat()}
+    raw = json.dumps([sort_value, last_id], default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value["$date"])
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, last_id
+
+def keyset_filter(field: str, direction: int, sort_value, last_id: str) -> dict:
+    """Mongo filter for documents after (sort_value, last_id) in a (field, id) ordering.
+
+    MongoDB sorts null/missing before any value, so a null sort value needs its own branch.
+    """
+    after = "$gt" if direction == 1 else "$lt"
+    if sort_value is None:
+        same_value = {field: None, "id": {after: last_id}}
+        return {"$or": [same_value, {field: {"$ne": None}}]} if direction == 1 else same_value
+    branches = [{field: {after: sort_value}}, {field: sort_value, "id": {after: last_id}}]
+    if direction == -1:
+        branches.append({field: None})
+    return {"$or": branches}
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    direction: int = 1,
+    projection: Optional[dict] = None
+) -> dict:
+    """Fetch one page with an indexed range scan on (sort_field, id) instead of skip/offset"""
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        keyset = keyset_filter(sort_field, direction, sort_value, last_id)
+        query = {"$and": [query, keyset]} if query else keyset
+    
+    items = await collection.find(query, projection or {"_id": 0}).sort(
+        [(sort_field, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].get(sort_field), items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}
+
+def null_first_order(value, item_id: str):
+    """Ascending order matching MongoDB: missing/null values first, ties broken by id"""
+    return (value is not None, value if value is not None else 0, item_id)
+
+def relevance_order(score: float, item_id: str):
+    """Best search score first, ties broken by id"""
+    return (-score, item_id)
+
+def paginate_sorted(items: List[dict], limit: int, cursor: Optional[str], cursor_key, order) -> dict:
+    """Keyset pagination over an in-memory list.
+
+    cursor_key(item) returns the (sort_value, id) pair stored in the cursor and
+    order(sort_value, id) the comparable key the list is already sorted by.
+    """
+    start = 0
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        try:
+            start = bisect.bisect_right(items, order(sort_value, last_id), key=lambda item: order(*cursor_key(item)))
+        except TypeError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    page = items[start:start + limit]
+    next_cursor = None
+    if start + limit < len(items):
+        next_cursor = encode_cursor(*cursor_key(page[-1]))
+    return {"items": page, "next_cursor": next_cursor}
+
+# ============ PRODUCT SEARCH ============
+
+# Turkish letters folded to their ASCII base; done before lower() so "İ" does not become "i̇"
+_TURKISH_FOLD = str.maketrans({
+    "İ": "i", "I": "i", "ı": "i",
+    "Ş": "s", "ş": "s",
+    "Ğ": "g", "ğ": "g",
+    "Ç": "c", "ç": "c",
+    "Ö": "o", "ö": "o",
+    "Ü": "u", "ü": "u",
+})
+
+def normalize_search_text(text: str) -> str:
+    """Case and diacritic fold so "İSKELE", "iskele" and "ıskele" compare equal"""
+    text = unicodedata.normalize("NFKD", text.translate(_TURKISH_FOLD).lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+def tokenize_search_text(text: str) -> List[str]:
+    return re.findall(r"[^\W_]+", normalize_search_text(text))
+
+class ProductSearchIndex:
+    """Inverted index over product name, description, materials and colors.
+
+    Every query term is matched as a prefix (type-ahead), all terms must match,
+    and results are ranked by field weight x idf with whole-word hits scoring
+    above prefix-only hits. The catalog snapshot rebuilds it on load and keeps
+    it current with add/remove on every product write.
+    """
+
+    def __init__(self):
+        self._postings = {}  # term -> {product_id: weight}
+        self._doc_terms = {}  # product_id -> terms, for removal
+        self._vocabulary = []  # sorted terms, for prefix lookups
+
+    def rebuild(self, products: List[dict]):
+        self._postings = {}
+        self._doc_terms = {}
+        for product in products:
+            self._index(product)
+        self._vocabulary = sorted(self._postings)
+
+    def add(self, product: dict):
+        self.remove(product["id"])
+        for term in self._index(product):
+            if len(self._postings[term]) == 1:
+                bisect.insort(self._vocabulary, term)
+
+    def remove(self, product_id: str):
+        for term in self._doc_terms.pop(product_id, ()):
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+
+    def _index(self, product: dict) -> List[str]:
+        weights = {}
+        for field, field_weight in SEARCH_FIELD_WEIGHTS.items():
+            value = product.get(field)
+            if isinstance(value, str):
+                for term in tokenize_search_text(value):
+                    weights[term] = weights.get(term, 0.0) + field_weight
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[product["id"]] = weight
+        self._doc_terms[product["id"]] = list(weights)
+        return list(weights)
+
+    def _expand(self, prefix: str) -> List[str]:
+        # Every vocabulary term with this prefix, so a short query matches what the regex search did
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff", start)
+        return self._vocabulary[start:end]
+
+    def search(self, text: str) -> dict:
+        """Return {product_id: score} for products matching every term, best match first"""
+        document_count = len(self._doc_terms)
+        scores = None
+        for token in dict.fromkeys(tokenize_search_text(text)):
+            token_scores = {}
+            for term in self._expand(token):
+                postings = self._postings[term]
+                idf = math.log(1 + document_count / len(postings))
+                boost = 1.0 if term == token else 0.5
+                for product_id, weight in postings.items():
+                    score = weight * idf * boost
+                    if score > token_scores.get(product_id, 0.0):
+                        token_scores[product_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+            if not scores:
+                return {}
+        if scores is None:
+            return {}
+        return dict(sorted(scores.items(), key=lambda item: relevance_order(item[1], item[0])))
+
+product_search = ProductSearchIndex()
+
+class ProductSuggestIndex:
+    """Sorted-array prefix index for search-as-you-type.
+
+    Every word position of a product name is a key ("paris gumus sehpa",
+    "gumus sehpa", "sehpa"), so typing any word of the name finds it. The
+    best products per leading word are precomputed, so a one-word prefix is
+    answered by merging the lists of the few vocabulary words it expands to
+    (precomputed outright for very short prefixes). Multi-word prefixes scan
+    their slice of the sorted key array when it is narrow, and otherwise walk
+    the leading word's entries in rank order until enough products match.
+    """
+
+    def __init__(self):
+        self._entries = []  # sorted (key, rank, product_id)
+        self._entries_by_product = {}
+        self._payloads = {}  # product_id -> slim suggestion
+        self._vocabulary = []  # sorted leading words of the keys
+        self._word_entries = {}  # leading word -> [(rank, product_id, key)] best first
+        self._word_top = {}  # leading word -> [(rank, product_id)] best first
+        self._short_top = {}  # prefix up to SUGGEST_PRECOMPUTED_PREFIX_LENGTH -> [(rank, product_id)]
+        self._categories = []  # (normalized words, name)
+        self._category_counts = collections.Counter()  # name -> products in it
+        self._product_categories = {}  # product_id -> category name
+
+    @staticmethod
+    def _product_entries(product: dict) -> List[tuple]:
+        words = tokenize_search_text(product.get("product_name") or "")
+        popularity = -(product.get("sales_count") or 0)
+        entries = []
+        for position in range(len(words)):
+            # Matches at the start of the name first, then best sellers, then alphabetical
+            rank = (position > 0, popularity, " ".join(words))
+            entries.append((" ".join(words[position:]), rank, product["id"]))
+        return entries
+
+    @staticmethod
+    def _payload(product: dict) -> dict:
+        image_urls = product.get("image_urls") or [None]
+        return {"id": product["id"], "name": product.get("product_name"), "thumbnail": image_urls[0]}
+
+    @staticmethod
+    def _best(ranked) -> List[tuple]:
+        """Top (rank, product_id) pairs, one per product"""
+        best = {}
+        for rank, product_id in ranked:
+            if product_id not in best or rank < best[product_id]:
+                best[product_id] = rank
+        return heapq.nsmallest(SUGGEST_MAX_RESULTS, ((rank, pid) for pid, rank in best.items()))
+
+    def _range(self, prefix: str) -> tuple:
+        """(start, end) of the keys beginning with prefix"""
+        return (
+            bisect.bisect_left(self._entries, (prefix,)),
+            bisect.bisect_left(self._entries, (prefix + "\U0010ffff",))
+        )
+
+    def _phrase_best(self, prefix: str) -> List[tuple]:
+        start, end = self._range(prefix)
+        if end - start <= SUGGEST_RANGE_SCAN_LIMIT:
+            return self._best((rank, pid) for _, rank, pid in self._entries[start:end])
+        # A wide range means matches are dense among the leading word's entries, so a rank-order walk stops early
+        best = []
+        seen = set()
+        for rank, product_id, key in self._word_entries.get(prefix.split(" ", 1)[0], []):
+            if product_id not in seen and key.startswith(prefix):
+                seen.add(product_id)
+                best.append((rank, product_id))
+                if len(best) == SUGGEST_MAX_RESULTS:
+                    break
+        return best
+
+    def _words(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff")
+        return self._vocabulary[start:end]
+
+    def _merge_words(self, words: List[str]) -> List[tuple]:
+        return self._best(pair for word in words for pair in self._word_top[word])
+
+    def rebuild(self, products: List[dict]):
+        self._payloads = {p["id"]: self._payload(p) for p in products}
+        self._entries_by_product = {p["id"]: self._product_entries(p) for p in products}
+        self._entries = sorted(e for entries in self._entries_by_product.values() for e in entries)
+        # Keys sharing a leading word are contiguous in the sorted array (" " sorts before letters and digits)
+        self._word_entries = {
+            word: sorted((rank, pid, key) for key, rank, pid in group)
+            for word, group in itertools.groupby(self._entries, key=lambda e: e[0].split(" ", 1)[0])
+        }
+        self._word_top = {
+            word: self._best((rank, pid) for rank, pid, _ in entries)
+            for word, entries in self._word_entries.items()
+        }
+        self._vocabulary = sorted(self._word_top)
+        self._short_top = {}
+        for length in range(1, SUGGEST_PRECOMPUTED_PREFIX_LENGTH + 1):
+            for prefix, words in itertools.groupby(self._vocabulary, key=lambda w: w[:length]):
+                if len(prefix) == length:
+                    self._short_top[prefix] = self._merge_words(list(words))
+        self._product_categories = {p["id"]: p["category"] for p in products if p.get("category")}
+        self._category_counts = collections.Counter(self._product_categories.values())
+        self._categories = sorted((tuple(tokenize_search_text(name)), name) for name in self._category_counts)
+
+    def add(self, product: dict):
+        self.remove(product["id"])
+        entries = self._product_entries(product)
+        self._payloads[product["id"]] = self._payload(product)
+        self._entries_by_product[product["id"]] = entries
+        for entry in entries:
+            bisect.insort(self._entries, entry)
+            key, rank, product_id = entry
+            bisect.insort(self._word_entries.setdefault(key.split(" ", 1)[0], []), (rank, product_id, key))
+        self._refresh(entries)
+        if product.get("category"):
+            name = product["category"]
+            self._product_categories[product["id"]] = name
+            self._category_counts[name] += 1
+            if self._category_counts[name] == 1:
+                bisect.insort(self._categories, (tuple(tokenize_search_text(name)), name))
+
+    def remove(self, product_id: str):
+        entries = self._entries_by_product.pop(product_id, [])
+        self._payloads.pop(product_id, None)
+        for entry in entries:
+            del self._entries[bisect.bisect_left(self._entries, entry)]
+            key, rank, product_id = entry
+            word_entries = self._word_entries[key.split(" ", 1)[0]]
+            del word_entries[bisect.bisect_left(word_entries, (rank, product_id, key))]
+        self._refresh(entries)
+        name = self._product_categories.pop(product_id, None)
+        if name is not None:
+            self._category_counts[name] -= 1
+            if not self._category_counts[name]:
+                # The last product left the category
+                del self._category_counts[name]
+                category = (tuple(tokenize_search_text(name)), name)
+                del self._categories[bisect.bisect_left(self._categories, category)]
+
+    def _refresh(self, entries: List[tuple]):
+        """Recompute the precomputed lists touched by the given keys"""
+        words = {key.split(" ", 1)[0] for key, _, _ in entries}
+        for word in words:
+            best = self._best((rank, pid) for rank, pid, _ in self._word_entries.get(word, []))
+            if not best:
+                self._word_entries.pop(word, None)
+            position = bisect.bisect_left(self._vocabulary, word)
+            present = position < len(self._vocabulary) and self._vocabulary[position] == word
+            if best:
+                self._word_top[word] = best
+                if not present:
+                    self._vocabulary.insert(position, word)
+            else:
+                self._word_top.pop(word, None)
+                if present:
+                    del self._vocabulary[position]
+        prefixes = {word[:length] for word in words for length in range(1, SUGGEST_PRECOMPUTED_PREFIX_LENGTH + 1)}
+        for prefix in prefixes:
+            best = self._merge_words(self._words(prefix))
+            if best:
+                self._short_top[prefix] = best
+            else:
+                self._short_top.pop(prefix, None)
+
+    def suggest(self, text: str, limit: int) -> dict:
+        prefix = " ".join(tokenize_search_text(text))
+        if not prefix:
+            return {"products": [], "categories": []}
+        if " " in prefix:
+            best = self._phrase_best(prefix)
+        elif len(prefix) <= SUGGEST_PRECOMPUTED_PREFIX_LENGTH:
+            best = self._short_top.get(prefix, [])
+        else:
+            best = self._merge_words(self._words(prefix))
+        categories = [
+            name for category_words, name in self._categories
+            if any(" ".join(category_words[i:]).startswith(prefix) for i in range(len(category_words)))
+        ]
+        return {
+            "products": [self._payloads[product_id] for _, product_id in best[:limit]],
+            "categories": categories[:3]
+        }
+
+product_suggest = ProductSuggestIndex()
+
+# ============ PRODUCT CATALOG CACHE ============
+
+# Mongo expression equivalent of effective_price(), used to backfill existing documents
+EFFECTIVE_PRICE_EXPR = {
+    "$cond": [{"$gt": ["$discounted_price", 0]}, "$discounted_price", {"$ifNull": ["$price", 0]}]
+}
+
+def effective_price(product: dict) -> float:
+    """Price the storefront shows and filters on: the discounted price when set, the list price otherwise"""
+    return product.get('discounted_price') or product.get('price', 0)
+
+def _product_sort_key(field: str):
+    """Sort key matching MongoDB ascending order: missing/null values first, ties broken by id"""
+    def key(product: dict):
+        return null_first_order(product.get(field), product.get("id", ""))
+    return key
+
+def _compile_filter_pattern(pattern: str):
+    """Compile a user supplied filter the way MongoDB's case-insensitive $regex would"""
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(pattern), re.IGNORECASE)
+
+class ProductCatalog:
+    """In-memory snapshot of the products collection.
+
+    Public catalog reads are served from this snapshot. Admin write paths on this
+    worker call upsert/remove/invalidate so changes are visible immediately, then
+    publish() to bump the shared version in catalog_versions; every worker polls it
+    and reloads when another worker (or the import CLI) wrote. The TTL only bounds
+    staleness for writes that bypass the API, such as the seed scripts.
+    """
+
+    def __init__(self, ttl_seconds: int, sync_interval: float):
+        self.ttl_seconds = ttl_seconds
+        self.sync_interval = sync_interval
+        self.version = 0
+        self._by_id = {}
+        self._by_name = []
+        self._by_category = {}
+        self._loaded_at = None
+        self.shared_version = None  # catalog_versions value this worker's copy reflects, the same on every worker
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def ensure_loaded(self, check_version: bool = False):
+        """Load the snapshot if it is missing or expired; check_version also reloads it when another worker wrote"""
+        if check_version:
+            await self.sync()
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            # Read the version first: a write landing during the load moves it again and triggers another reload
+            self.shared_version = await self._stored_version()
+            products = await db.products.find({}, {"_id": 0}).to_list(None)
+            self._by_id = {p["id"]: p for p in products}
+            self._reindex()
+            product_search.rebuild(products)
+            product_suggest.rebuild(products)
+            self._loaded_at = time.monotonic()
+
+    def _reindex(self):
+        products = list(self._by_id.values())
+        for product in products:
+            # Documents written outside the API (seed scripts) may predate the materialized field
+            if product.get("effective_price") is None:
+                product["effective_price"] = effective_price(product)
+        self._by_name = sorted(products, key=_product_sort_key("product_name"))
+        by_category = {}
+        for product in products:
+            by_category.setdefault(product.get("category"), []).append(product)
+        order_key = _product_sort_key("category_order")
+        for items in by_category.values():
+            items.sort(key=order_key)
+        self._by_category = by_category
+        self.version += 1
+
+    def _place(self, product: dict):
+        """Insert a product into the sorted name and category lists"""
+        bisect.insort(self._by_name, product, key=_product_sort_key("product_name"))
+        bisect.insort(self._by_category.setdefault(product.get("category"), []), product, key=_product_sort_key("category_order"))
+
+    def _unplace(self, product: dict):
+        """Remove a product from the sorted lists, located by the sort keys it was placed with"""
+        for items, field in ((self._by_name, "product_name"), (self._by_category.get(product.get("category"), []), "category_order")):
+            key = _product_sort_key(field)
+            index = bisect.bisect_left(items, key(product), key=key)
+            if index < len(items) and items[index]["id"] == product["id"]:
+                del items[index]
+        if not self._by_category.get(product.get("category"), True):
+            del self._by_category[product.get("category")]
+
+    def upsert(self, product: dict):
+        """Apply a product write made by this worker"""
+        # Moves even without a snapshot: product_snapshots and cart views are tagged with it
+        self.version += 1
+        if self._loaded_at is None:
+            return
+        previous = self._by_id.get(product["id"])
+        if previous is not None:
+            self._unplace(previous)
+        if product.get("effective_price") is None:
+            product["effective_price"] = effective_price(product)
+        self._by_id[product["id"]] = product
+        self._place(product)
+        product_search.add(product)
+        product_suggest.add(product)
+
+    def remove(self, product_id: str):
+        self.version += 1
+        if self._loaded_at is None:
+            return
+        product = self._by_id.pop(product_id, None)
+        if product is not None:
+            self._unplace(product)
+            product_search.remove(product_id)
+            product_suggest.remove(product_id)
+
+    def invalidate(self):
+        """Drop the snapshot; the next read reloads it from MongoDB"""
+        self._loaded_at = None
+        self.version += 1
+
+    async def _stored_version(self) -> int:
+        doc = await db.catalog_versions.find_one({"_id": "products"})
+        return doc["version"] if doc else 0
+
+    async def publish(self):
+        """Tell the other workers that products changed; call after applying the write locally"""
+        doc = await db.catalog_versions.find_one_and_update(
+            {"_id": "products"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        # Our own write needs no reload unless another worker's write slipped in since we last looked
+        if self.shared_version is None or doc["version"] != self.shared_version + 1:
+            self.invalidate()
+        self.shared_version = doc["version"]
+
+    async def sync(self):
+        """Drop the snapshot, and the product snapshots tagged with its version, when the shared version moved"""
+        stored = await self._stored_version()
+        if stored != self.shared_version:
+            self.shared_version = stored
+            self.invalidate()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Syncing the product catalog version failed")
+            await asyncio.sleep(self.sync_interval)
+
+    def adjust_stock(self, product_id: str, delta: int):
+        """Mirror a stock reservation/release made by this worker; stock is not a sort key so no reindex"""
+        product = self._by_id.get(product_id)
+        if product is not None and product.get("stock_amount") is not None:
+            product["stock_amount"] += delta
+
+    def get(self, product_id: str) -> Optional[dict]:
+        return self._by_id.get(product_id)
+
+    def all(self) -> List[dict]:
+        return self._by_name
+
+    def query(
+        self,
+        category: Optional[str] = None,
+        ranked: Optional[dict] = None,
+        color: Optional[str] = None,
+        material: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> List[dict]:
+        """Filter the snapshot. `ranked` is a product_search result; when given, relevance order is kept."""
+        if ranked is not None:
+            products = [self._by_id[pid] for pid in ranked if pid in self._by_id]
+            if category:
+                products = [p for p in products if p.get("category") == category]
+        else:
+            # Same ordering as the old Mongo query: category_order within a category, product_name otherwise
+            products = self._by_category.get(category, []) if category else self._by_name
+
+        if min_price is not None or max_price is not None:
+            products = [
+                p for p in products
+                if (min_price is None or p["effective_price"] >= min_price)
+                and (max_price is None or p["effective_price"] <= max_price)
+            ]
+
+        patterns = [
+            (field, _compile_filter_pattern(value))
+            for field, value in (("colors", color), ("materials", material))
+            if value
+        ]
+        if not patterns:
+            return products
+
+        return [
+            p for p in products
+            if all(isinstance(p.get(field), str) and pattern.search(p[field]) for field, pattern in patterns)
+        ]
+
+product_catalog = ProductCatalog(PRODUCT_CACHE_TTL_SECONDS, PRODUCT_CATALOG_SYNC_SECONDS)
+
+PRODUCT_SNAPSHOT_PROJECTION = {
+    "_id": 0, "id": 1, "product_name": 1, "price": 1, "discounted_price": 1, "boz_plus_price": 1,
+    "image_urls": {"$slice": 1}
+}
+
+class ProductSnapshots:
+    """LRU of slim product snapshots (name, prices, first image) for cart and admin enrichment.
+
+    Entries are tagged with product_catalog.version, which moves on every product write made
+    through this worker, on every catalog reload and when another worker's write is synced,
+    and expire after the catalog TTL either way.
+    Missing products are remembered too, so a warm cache answers without touching MongoDB.
+    Checkout does not use this: it prices and reserves stock from fresh reads.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = collections.OrderedDict()
+
+    async def get_many(self, product_ids) -> dict:
+        """Snapshots keyed by id; ids of products that do not exist are left out"""
+        version = product_catalog.version
+        now = time.monotonic()
+        found, missing = {}, []
+        for product_id in set(product_ids):
+            entry = self._entries.get(product_id)
+            if entry is not None and entry[0] == version and entry[1] > now:
+                self._entries.move_to_end(product_id)
+                if entry[2] is not None:
+                    found[product_id] = entry[2]
+            else:
+                missing.append(product_id)
+        if not missing:
+            return found
+
+        loaded = {
+            product["id"]: {
+                "id": product["id"],
+                "product_name": product.get("product_name"),
+                "price": product.get("price"),
+                "discounted_price": product.get("discounted_price"),
+                "boz_plus_price": product.get("boz_plus_price"),
+                "image_url": (product.get("image_urls") or [None])[0]
+            }
+            for product in await db.products.find({"id": {"$in": missing}}, PRODUCT_SNAPSHOT_PROJECTION).to_list(None)
+        }
+        for product_id in missing:
+            self._entries[product_id] = (version, now + self.ttl_seconds, loaded.get(product_id))
+            self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        found.update(loaded)
+        return found
+
+product_snapshots = ProductSnapshots(PRODUCT_SNAPSHOT_CACHE_SIZE, PRODUCT_CACHE_TTL_SECONDS)
+
 # ============ PRODUCT ROUTES ============
 
-@api_router.get("/products", response_model=List[Product])
+@api_router.get("/products")
 async def get_products(
     category: Optional[str] = None,
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     color: Optional[str] = None,
-    material: Optional[str] = None
+    material: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
 ):
-    query = {}
-    
-    if category:
-        query["category"] = category
-    if search:
-        query["product_name"] = {"$regex": search, "$options": "i"}
-    if color:
-        query["colors"] = {"$regex": color, "$options": "i"}
-    if material:
-        query["materials"] = {"$regex": material, "$options": "i"}
-    
-    # Sort by category_order if category is specified, otherwise by product_name
+    """List products. Without `limit` the full list is returned; with it, a page plus next_cursor."""
+    # Search results are ranked by relevance; otherwise sort by category_order if category is specified, else product_name
     sort_field = "category_order" if category else "product_name"
-    products = await db.products.find(query, {"_id": 0}).sort(sort_field, 1).to_list(1000)
-    
-    # Price filter (after fetching)
-    if min_price is not None or max_price is not None:
-        filtered_products = []
-        for p in products:
-            price = p.get('discounted_price') or p.get('price', 0)
-            if min_price is not None and price < min_price:
-                continue
-            if max_price is not None and price > max_price:
-                continue
-            filtered_products.append(p)
-        products = filtered_products
+    ranked = None
+    if search:
+        # The search index lives next to the catalog snapshot; with the cache off it is checked against
+        # the shared catalog version first, so only writes that bypass the API can be missing from it
+        await product_catalog.ensure_loaded(check_version=not PRODUCT_CACHE_ENABLED)
+        ranked = product_search.search(search)
+    
+    def paginate(products: List[dict]) -> dict:
+        if ranked is not None:
+            page = paginate_sorted(products, limit, cursor, lambda p: (ranked[p["id"]], p["id"]), relevance_order)
+        else:
+            page = paginate_sorted(products, limit, cursor, lambda p: (p.get(sort_field), p["id"]), null_first_order)
+        page["items"] = [Product(**p) for p in page["items"]]
+        return page
     
-    return products
+    if not PRODUCT_CACHE_ENABLED:
+        query = {}
+        if category:
+            query["category"] = category
+        if ranked is not None:
+            query["id"] = {"$in": list(ranked)}
+        if color:
+            query["colors"] = {"$regex": color, "$options": "i"}
+        if material:
+            query["materials"] = {"$regex": material, "$options": "i"}
+        # Served by the (category, effective_price) / (effective_price) indexes
+        price_range = {}
+        if min_price is not None:
+            price_range["$gte"] = min_price
+        if max_price is not None:
+            price_range["$lte"] = max_price
+        if price_range:
+            query["effective_price"] = price_range
+        
+        if ranked is not None:
+            # Relevance order cannot be expressed in Mongo; matches are bounded by the index result
+            products = await db.products.find(query, {"_id": 0}).to_list(None)
+            products.sort(key=lambda p: relevance_order(ranked[p["id"]], p["id"]))
+            if limit:
+                return paginate(products)
+            return [Product(**p) for p in products]
+        if limit:
+            page = await fetch_page(db.products, query, sort_field, limit, cursor)
+            page["items"] = [Product(**p) for p in page["items"]]
+            return page
+        products = await db.products.find(query, {"_id": 0}).sort([(sort_field, 1), ("id", 1)]).to_list(1000)
+        return [Product(**p) for p in products]
+    
+    await product_catalog.ensure_loaded()
+    products = product_catalog.query(
+        category=category,
+        ranked=ranked,
+        color=color,
+        material=material,
+        min_price=min_price,
+        max_price=max_price
+    )
+    if limit:
+        return paginate(products)
+    return [Product(**p) for p in products]
+
+@api_router.get("/products/suggest")
+async def suggest_products(
+    q: str,
+    limit: int = Query(8, ge=1, le=SUGGEST_MAX_RESULTS)
+):
+    """Search-as-you-type suggestions: slim product entries (id, name, thumbnail) and matching categories"""
+    await product_catalog.ensure_loaded(check_version=not PRODUCT_CACHE_ENABLED)
+    return product_suggest.suggest(q, limit)
 
 @api_router.get("/products/best-sellers/list", response_model=List[Product])
 async def get_best_sellers():
     """Get best selling products - top 4"""
-    products = await db.products.find(
-        {"best_seller": True}, 
-        {"_id": 0}
-    ).sort("sales_count", -1).limit(4).to_list(4)
+    await product_catalog.ensure_loaded()
+    best_sellers = [p for p in product_catalog.all() if p.get("best_seller") is True]
+    best_sellers.sort(key=lambda p: p.get("sales_count") or 0, reverse=True)
     
-    return products
+    return best_sellers[:4]
 
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    await product_catalog.ensure_loaded()
+    product = product_catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return Product(**product)
@@ -537,50 +1787,185 @@ async def get_categories():
 # ============ CART ROUTES (OLD - REMOVED) ============
 # These routes have been replaced by the new cart implementation below
 
+# ============ PRICING HELPERS ============
+
+def is_boz_plus_active(user: User) -> bool:
+    """BOZ PLUS flag, treating an expired membership as inactive"""
+    if not user.is_boz_plus:
+        return False
+    if user.boz_plus_expiry_date:
+        expiry = datetime.fromisoformat(user.boz_plus_expiry_date)
+        if expiry < datetime.now(timezone.utc):
+            return False
+    return True
+
+def unit_price(product: dict, is_boz_plus: bool) -> float:
+    # Use BOZ PLUS price if user is BOZ PLUS member and product has BOZ PLUS price
+    if is_boz_plus and product.get('boz_plus_price'):
+        return product['boz_plus_price']
+    return effective_price(product)
+
+async def fetch_products_by_id(product_ids, projection: Optional[dict] = None) -> dict:
+    """Load many products with a single $in query, keyed by id"""
+    products = await db.products.find(
+        {"id": {"$in": list(set(product_ids))}},
+        projection or {"_id": 0}
+    ).to_list(None)
+    return {p["id"]: p for p in products}
+
+async def price_cart_items(items: List[dict], is_boz_plus: bool):
+    """Priced order lines for cart items, plus the products they were priced from.
+
+    Duplicate lines for a product are merged; items whose product no longer exists are skipped.
+    """
+    quantities = {}
+    for item in items:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    
+    products = await fetch_products_by_id(
+        quantities,
+        {"_id": 0, "id": 1, "product_name": 1, "price": 1, "discounted_price": 1, "boz_plus_price": 1, "stock_amount": 1}
+    )
+    lines = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product:
+            price = unit_price(product, is_boz_plus)
+            lines.append({
+                "product_id": product_id,
+                "quantity": quantity,
+                "product_name": product.get("product_name"),
+                "unit_price": price,
+                "subtotal": price * quantity
+            })
+    return lines, products
+
+def checkout_cart_update(lines: List[dict]) -> list:
+    """Update pipeline decrementing each cart line by its ordered quantity and dropping lines that reach 0"""
+    ordered = {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$$item.product_id", {"$literal": line["product_id"]}]}, "then": line["quantity"]}
+                for line in lines
+            ],
+            "default": 0
+        }
+    }
+    # Cart lines are {product_id, quantity} (see CART STORE), so each one is rebuilt rather than merged
+    remaining = {
+        "$map": {
+            "input": "$items",
+            "as": "item",
+            "in": {"product_id": "$$item.product_id", "quantity": {"$subtract": ["$$item.quantity", ordered]}}
+        }
+    }
+    return [
+        {"$set": {
+            "items": {"$filter": {"input": remaining, "as": "item", "cond": {"$gt": ["$$item.quantity", 0]}}},
+            "updated_at": {"$literal": datetime.now(timezone.utc)},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+            "checkout": None
+        }}
+    ]
+
+async def release_stock(lines: List[dict]):
+    """Give back stock taken by reserve_stock (compensation for a failed checkout)"""
+    await asyncio.gather(*(
+        db.products.update_one({"id": line["product_id"]}, {"$inc": {"stock_amount": line["quantity"]}})
+        for line in lines
+    ))
+    for line in lines:
+        product_catalog.adjust_stock(line["product_id"], line["quantity"])
+
+async def reserve_stock(lines: List[dict], products: dict) -> List[dict]:
+    """Take stock for every line, all or nothing.
+
+    Each decrement is a conditional $inc that only matches while stock_amount >= quantity,
+    so concurrent checkouts can never drive stock negative. If any line cannot be
+    reserved, the lines that were are released again. Products without a stock_amount
+    do not track stock and are not reserved.
+    """
+    tracked = [line for line in lines if products[line["product_id"]].get("stock_amount") is not None]
+    results = await asyncio.gather(*(
+        db.products.update_one(
+            {"id": line["product_id"], "stock_amount": {"$gte": line["quantity"]}},
+            {"$inc": {"stock_amount": -line["quantity"]}}
+        )
+        for line in tracked
+    ))
+    reserved = [line for line, result in zip(tracked, results) if result.modified_count]
+    for line in reserved:
+        product_catalog.adjust_stock(line["product_id"], -line["quantity"])
+    
+    if len(reserved) < len(tracked):
+        await release_stock(reserved)
+        unavailable = [line["product_name"] for line, result in zip(tracked, results) if not result.modified_count]
+        raise HTTPException(status_code=409, detail=f"Insufficient stock for: {', '.join(unavailable)}")
+    return reserved
+
 # ============ ORDER ROUTES ============
 
 @api_router.post("/orders")
 async def create_order(order_data: OrderCreate, current_user: User = Depends(get_current_user)):
-    cart = await db.carts.find_one({"user_id": current_user.id})
-    if not cart or not cart.get("items"):
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    # Get current user to check BOZ PLUS status
-    user = await db.users.find_one({"id": current_user.id})
-    is_boz_plus = user.get("is_boz_plus", False)
-    
-    # Check if BOZ PLUS is still valid
-    if is_boz_plus and user.get("boz_plus_expiry_date"):
-        expiry = datetime.fromisoformat(user["boz_plus_expiry_date"])
-        if expiry < datetime.now(timezone.utc):
-            is_boz_plus = False
+    """Place an order: claim the cart, reserve stock, insert the order, then clear the ordered lines.
+
+    Every step after the claim is compensated on failure, so a rejected checkout
+    leaves stock and cart as they were.
+    """
+    now = datetime.now(timezone.utc)
+    order_id = str(uuid.uuid4())
     
-    # Calculate total with BOZ PLUS prices if applicable
-    total = 0.0
-    for item in cart["items"]:
-        product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
-        if product:
-            # Use BOZ PLUS price if user is BOZ PLUS member and product has BOZ PLUS price
-            if is_boz_plus and product.get('boz_plus_price'):
-                price = product['boz_plus_price']
-            else:
-                price = product.get('discounted_price') or product.get('price', 0)
-            total += price * item["quantity"]
-    
-    order = Order(
-        user_id=current_user.id,
-        items=cart["items"],
-        total=total,
-        shipping_address=order_data.shipping_address
+    # Claim the cart so the same cart cannot be checked out twice concurrently (double click, two tabs)
+    stale_claim = now - timedelta(seconds=CHECKOUT_CLAIM_TIMEOUT_SECONDS)
+    cart = await db.carts.find_one_and_update(
+        {
+            "user_id": current_user.id,
+            "items.0": {"$exists": True},
+            "$or": [{"checkout": None}, {"checkout.started_at": {"$lt": stale_claim}}]
+        },
+        {"$set": {"checkout": {"order_id": order_id, "started_at": now}}},
+        projection={"_id": 0, "items": 1}
     )
+    if not cart:
+        existing = await db.carts.find_one({"user_id": current_user.id}, {"_id": 0, "items": 1, "checkout": 1})
+        if existing and existing.get("items") and existing.get("checkout"):
+            raise HTTPException(status_code=409, detail="Checkout already in progress")
+        raise HTTPException(status_code=400, detail="Cart is empty")
     
-    await db.orders.insert_one(order.model_dump())
+    try:
+        # Calculate line prices with BOZ PLUS prices if applicable, from the same principal the cart
+        # is rendered with; membership changes reach every worker within AUTH_CACHE_SYNC_SECONDS
+        lines, products = await price_cart_items(cart["items"], is_boz_plus_active(current_user))
+        if not lines:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        
+        reserved = await reserve_stock(lines, products)
+        order = Order(
+            id=order_id,
+            user_id=current_user.id,
+            items=lines,
+            total=sum(line["subtotal"] for line in lines),
+            shipping_address=order_data.shipping_address
+        )
+        try:
+            await db.orders.insert_one(order.model_dump())
+        except Exception:
+            await release_stock(reserved)
+            raise
+    except Exception:
+        # Release the claim so the user can retry
+        await db.carts.update_one(
+            {"user_id": current_user.id, "checkout.order_id": order_id},
+            {"$unset": {"checkout": ""}}
+        )
+        raise
     
-    # Clear cart
+    # Take the ordered quantities out of the cart; quantity added from another tab during checkout stays
     await db.carts.update_one(
-        {"user_id": current_user.id},
-        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"user_id": current_user.id, "checkout.order_id": order_id},
+        checkout_cart_update(lines)
     )
+    await record_order_placed(order)
     
     return order
 
@@ -594,11 +1979,27 @@ async def get_orders(current_user: User = Depends(get_current_user)):
 @api_router.post("/admin/auth/login", response_model=Token)
 async def admin_login(admin_data: AdminLogin):
     admin = await db.admins.find_one({"email": admin_data.email}, {"_id": 0})
-    if not admin or not verify_password(admin_data.password, admin["hashed_password"]):
+    if not admin or not await verify_password(admin_data.password, admin["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    access_token = create_access_token(data={"sub": admin["id"], "role": "admin"})
-    return Token(access_token=access_token, token_type="bearer")
+    return await issue_tokens(admin["id"], "admin")
+
+@api_router.post("/admin/auth/refresh", response_model=Token)
+async def admin_refresh_tokens(body: RefreshTokenRequest):
+    """Exchange an admin refresh token for a new access/refresh pair"""
+    return await rotate_refresh_token(body.refresh_token, "admin")
+
+@api_router.post("/admin/auth/logout")
+async def admin_logout(body: RefreshTokenRequest):
+    """End the admin session the refresh token belongs to"""
+    payload = decode_refresh_token(body.refresh_token, "admin", verify_exp=False)
+    await revoke_session(payload["sid"])
+    return {"message": "Logged out"}
+
+@api_router.get("/admin/auth/hashing")
+async def admin_password_hashing_stats(current_admin: Admin = Depends(get_current_admin)):
+    """Password hashing pool metrics: queue depth, in-flight and completed operations, wait times"""
+    return password_hasher.stats()
 
 @api_router.get("/admin/auth/me")
 async def get_admin_me(current_admin: Admin = Depends(get_current_admin)):
@@ -611,7 +2012,13 @@ async def get_admin_me(current_admin: Admin = Depends(get_current_admin)):
 # ============ ADMIN PRODUCT ROUTES ============
 
 @api_router.get("/admin/products")
-async def admin_get_products(current_admin: Admin = Depends(get_current_admin)):
+async def admin_get_products(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    if limit:
+        return await fetch_page(db.products, {}, "product_name", limit, cursor)
     products = await db.products.find({}, {"_id": 0}).to_list(1000)
     return products
 
@@ -621,7 +2028,10 @@ async def admin_create_product(
     current_admin: Admin = Depends(get_current_admin)
 ):
     product = Product(**product_data.model_dump())
+    product.effective_price = effective_price(product.model_dump())
     await db.products.insert_one(product.model_dump())
+    product_catalog.upsert(product.model_dump())
+    await product_catalog.publish()
     return product
 
 @api_router.put("/admin/products/{product_id}")
@@ -637,12 +2047,15 @@ async def admin_update_product(
     update_data = {k: v for k, v in product_data.model_dump().items() if v is not None}
     
     if update_data:
+        update_data["effective_price"] = effective_price({**existing_product, **update_data})
         await db.products.update_one(
             {"id": product_id},
             {"$set": update_data}
         )
     
     updated_product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product_catalog.upsert(updated_product)
+    await product_catalog.publish()
     return Product(**updated_product)
 
 @api_router.delete("/admin/products/{product_id}")
@@ -653,6 +2066,8 @@ async def admin_delete_product(
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_catalog.remove(product_id)
+    await product_catalog.publish()
     return {"message": "Product deleted successfully"}
 
 @api_router.post("/admin/upload-image")
@@ -721,34 +2136,494 @@ async def admin_upload_image(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Görsel işleme hatası: {str(e)}")
 
+# ============ PRODUCT IMPORT ============
+# Bulk product loading for POST /admin/products/import and import_products.py: rows are streamed
+# from a CSV, XLSX, JSON array or JSON Lines file, validated against ProductCreate in chunks and
+# upserted by barcode with one bulk_write per chunk. A barcode that several stored products carry, or
+# that the file repeats, is shared by variants (colors, sizes); those rows are matched on barcode +
+# product_name instead, and only a row whose barcode + product_name is itself on several stored
+# products is rejected rather than written to an arbitrary one of them.
+
+PRODUCT_IMPORT_FORMATS = {"csv": "csv", "xlsx": "xlsx", "json": "json", "jsonl": "json", "ndjson": "json"}
+
+# Spreadsheet cells that must stay strings even when Excel stores them as numbers (barcodes)
+PRODUCT_IMPORT_TEXT_FIELDS = {
+    "product_name", "category", "description", "dimensions", "materials", "colors", "barcode", "stock_status"
+}
+
+# Fields a product created by an import starts with, besides ProductCreate's own defaults
+PRODUCT_IMPORT_NEW_DEFAULTS = {"category_order": None, "best_seller": False, "sales_count": 0, "best_seller_rank": None}
+
+def product_import_format(filename: Optional[str]) -> str:
+    suffix = Path(filename or "").suffix.lower().lstrip(".")
+    if suffix not in PRODUCT_IMPORT_FORMATS:
+        raise ValueError("Desteklenen dosya türleri: .csv, .xlsx, .json, .jsonl")
+    return PRODUCT_IMPORT_FORMATS[suffix]
+
+def iter_product_rows(stream, fmt: str):
+    """(row number, row) pairs from a binary stream; a row that cannot be read is yielded as an error message.
+
+    Row numbers are sheet rows (header = 1) for CSV/XLSX, record positions for a JSON array
+    and line numbers for JSON Lines.
+    """
+    if fmt == "xlsx":
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("XLSX içe aktarma için openpyxl paketi gerekli")
+        try:
+            sheet = load_workbook(stream, read_only=True, data_only=True).active
+        except Exception as e:
+            raise ValueError(f"XLSX dosyası okunamadı: {e}")
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else None for cell in next(rows, ())]
+        for number, values in enumerate(rows, start=2):
+            if any(value is not None for value in values):
+                yield number, {key: value for key, value in zip(header, values) if key}
+        return
+    
+    undecodable = set()
+    lines = decode_import_lines(stream, undecodable)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        try:
+            reader.fieldnames
+        except csv.Error as e:
+            raise ValueError(f"CSV başlık satırı okunamadı: {e}")
+        if 1 in undecodable:
+            raise ValueError("Başlık satırı UTF-8 değil")
+        read_until = reader.line_num
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                row = f"CSV satırı okunamadı: {e}"
+            # A row may span several lines (quoted line breaks); line_num lags behind on a csv.Error
+            line_num = max(reader.line_num, read_until + 1)
+            if any(read_until < number <= line_num for number in undecodable):
+                row = "Satır UTF-8 olmayan karakterler içeriyor"
+            read_until = line_num
+            yield line_num, row
+    
+    # JSON: an array is parsed whole, anything else is read as one object per line
+    numbered = enumerate(lines, start=1)
+    for number, line in numbered:
+        if line.strip():
+            break
+    else:
+        return
+    if line.lstrip().startswith("["):
+        document = line + "".join(rest for _, rest in numbered)
+        if undecodable:
+            raise ValueError(f"JSON dosyası UTF-8 değil (satır {min(undecodable)})")
+        for position, row in enumerate(json.loads(document), start=1):
+            yield position, row
+        return
+    for number, line in itertools.chain([(number, line)], numbered):
+        if number in undecodable:
+            yield number, "Satır UTF-8 olmayan karakterler içeriyor"
+        elif line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, "Geçersiz JSON satırı"
+
+def decode_import_lines(stream, undecodable: set):
+    """Lines of a binary stream decoded one at a time, so a bad byte only spoils its own line.
+
+    An undecodable line is still yielded (with replacement characters) to keep the line
+    numbers after it, and its number is added to `undecodable`.
+    """
+    for number, raw in enumerate(stream, start=1):
+        if number == 1 and raw.startswith(b"\xef\xbb\xbf"):
+            raw = raw[3:]
+        try:
+            yield raw.decode("utf-8")
+        except UnicodeDecodeError:
+            undecodable.add(number)
+            yield raw.decode("utf-8", errors="replace")
+
+def normalize_import_row(row: dict) -> dict:
+    """Map a raw row onto ProductCreate fields: header case, blank cells, numeric barcodes, image URL lists"""
+    product = {}
+    for key, value in row.items():
+        field = str(key).strip().lower() if key is not None else None
+        if field not in ProductCreate.model_fields:
+            continue
+        if isinstance(value, str):
+            value = value.strip() or None
+        if isinstance(value, float) and value.is_integer() and (field in PRODUCT_IMPORT_TEXT_FIELDS or field == "stock_amount"):
+            value = int(value)
+        if field in PRODUCT_IMPORT_TEXT_FIELDS and isinstance(value, (int, float)):
+            value = str(value)
+        if field == "image_urls" and isinstance(value, str):
+            if value.startswith("["):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            else:
+                value = [url for url in re.split(r"[\s|,]+", value) if url]
+        # A blank cell for a field with a default (stock status, images) means "use the default"
+        if value is None and ProductCreate.model_fields[field].default is not None:
+            continue
+        product[field] = value
+    return product
+
+def product_upsert(product: ProductCreate, by_name: bool = False) -> UpdateOne:
+    """Upsert by barcode (by barcode + product_name for variants sharing one): columns present in
+    the file overwrite, everything else keeps its value or gets a default"""
+    fields = product.model_dump(exclude_unset=True)
+    defaults = {
+        "id": str(uuid.uuid4()),
+        **{name: info.default for name, info in ProductCreate.model_fields.items() if name not in fields},
+        **PRODUCT_IMPORT_NEW_DEFAULTS
+    }
+    # $literal keeps values such as "$..." from being read as field paths inside the pipeline
+    stage = {name: {"$literal": value} for name, value in fields.items()}
+    stage.update({name: {"$ifNull": [f"${name}", {"$literal": value}]} for name, value in defaults.items()})
+    match = {"barcode": product.barcode, "product_name": product.product_name} if by_name else {"barcode": product.barcode}
+    return UpdateOne(
+        match,
+        [{"$set": stage}, {"$set": {"effective_price": EFFECTIVE_PRICE_EXPR}}],
+        upsert=True
+    )
+
+def read_import_chunk(rows, size: int):
+    """Up to `size` rows, plus the error that stopped the file from being read further (if any)"""
+    chunk = []
+    try:
+        for row in itertools.islice(rows, size):
+            chunk.append(row)
+    except (ValueError, csv.Error) as e:
+        return chunk, e
+    return chunk, None
+
+def validate_import_chunk(chunk: list, seen_barcodes: dict):
+    """(row number, product) for the valid rows of a chunk, and per-row errors.
+
+    seen_barcodes maps each barcode of the file to {product_name: row number}; a barcode with
+    more than one name there is repeated by the file.
+    """
+    valid, errors = [], []
+    for number, row in chunk:
+        if not isinstance(row, dict):
+            errors.append({"row": number, "errors": [row if isinstance(row, str) else "Satır bir nesne olmalı"]})
+            continue
+        try:
+            product = ProductCreate.model_validate(normalize_import_row(row))
+        except ValidationError as e:
+            errors.append({
+                "row": number,
+                "barcode": row.get("barcode"),
+                "errors": [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+            })
+            continue
+        if not product.barcode:
+            errors.append({"row": number, "errors": ["barcode: içe aktarma için barkod gerekli"]})
+            continue
+        names = seen_barcodes.setdefault(product.barcode, {})
+        if product.product_name in names:
+            errors.append({
+                "row": number,
+                "barcode": product.barcode,
+                "errors": [f"barcode + product_name: {names[product.product_name]}. satırda zaten kullanıldı"]
+            })
+            continue
+        names[product.product_name] = number
+        valid.append((number, product))
+    return valid, errors
+
+async def shared_barcodes(barcodes: List[str]) -> dict:
+    """Barcodes among `barcodes` that several stored products carry, with how many carry each product_name"""
+    rows = await db.products.aggregate([
+        {"$match": {"barcode": {"$in": barcodes}}},
+        {"$group": {"_id": "$barcode", "names": {"$push": "$product_name"}}},
+        {"$match": {"names.1": {"$exists": True}}}
+    ]).to_list(None)
+    return {row["_id"]: collections.Counter(row["names"]) for row in rows}
+
+async def import_products(stream, fmt: str, dry_run: bool = False) -> dict:
+    """Stream, validate and upsert products; returns counts and the rejected rows.
+
+    Parsing and validation run in a worker thread one chunk at a time, so a large file
+    neither blocks the event loop nor has to fit in memory (except JSON arrays).
+    """
+    rows = iter_product_rows(stream, fmt)
+    seen_barcodes = {}
+    last_row = 0
+    report = {
+        "rows": 0, "valid": 0, "created": 0, "updated": 0, "failed": 0,
+        "dry_run": dry_run, "aborted": False, "errors": []
+    }
+    
+    def record_errors(errors: list):
+        report["failed"] += len(errors)
+        room = PRODUCT_IMPORT_MAX_REPORTED_ERRORS - len(report["errors"])
+        report["errors"].extend(errors[:max(room, 0)])
+    
+    async def import_chunk(chunk: list):
+        valid, errors = await asyncio.to_thread(validate_import_chunk, chunk, seen_barcodes)
+        report["rows"] += len(chunk)
+        stored = await shared_barcodes(list({product.barcode for _, product in valid})) if valid else {}
+        operations, operation_rows = [], []
+        for number, product in valid:
+            names = stored.get(product.barcode)
+            if names and names[product.product_name] > 1:
+                errors.append({
+                    "row": number,
+                    "barcode": product.barcode,
+                    "errors": ["barcode + product_name: birden fazla üründe kullanılıyor, hangisinin güncelleneceği belirsiz"]
+                })
+                continue
+            # Variants sharing the barcode (in the store or the file) are told apart by name
+            by_name = names is not None or len(seen_barcodes[product.barcode]) > 1
+            operations.append(product_upsert(product, by_name))
+            operation_rows.append((number, product.barcode))
+        record_errors(sorted(errors, key=lambda error: error["row"]))
+        report["valid"] += len(operations)
+        if not operations or dry_run:
+            return
+        try:
+            result = (await db.products.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+            record_errors([
+                {"row": operation_rows[error["index"]][0], "errors": [f"database: {error.get('errmsg', 'write failed')}"]}
+                for error in result.get("writeErrors", [])
+            ])
+        report["created"] += result.get("nUpserted", 0)
+        report["updated"] += result.get("nMatched", 0)
+    
+    while True:
+        chunk, failure = await asyncio.to_thread(read_import_chunk, rows, PRODUCT_IMPORT_CHUNK_SIZE)
+        if failure is not None and not chunk and last_row == 0:
+            # Unreadable from the start: nothing has been written, reject the file as a whole
+            raise failure
+        if chunk:
+            last_row = chunk[-1][0]
+            await import_chunk(chunk)
+        if failure is not None:
+            # Earlier chunks are already written; report where reading stopped instead of failing the request
+            report["aborted"] = True
+            record_errors([{"row": last_row + 1, "errors": [f"Dosya bu satırdan itibaren okunamadı, içe aktarma durdu: {failure}"]}])
+            break
+        if not chunk:
+            break
+    
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    if report["created"] or report["updated"]:
+        product_catalog.invalidate()
+        await product_catalog.publish()
+    return report
+
+@api_router.post("/admin/products/import")
+async def admin_import_products(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Bulk import products from CSV, XLSX or JSON, upserting by barcode; returns counts and a per-row error report.
+
+    With dry_run=true rows are only validated. Variants sharing a barcode are matched by barcode +
+    product_name. Lines that are not UTF-8 are reported as rejected rows; a file that becomes
+    unreadable partway is reported with aborted=true and the counts of the rows imported before that point.
+    """
+    try:
+        return await import_products(file.file, product_import_format(file.filename), dry_run)
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ============ PRODUCT BULK UPDATES ============
+# PATCH /admin/products:bulk: many per-product changes in one bulk_write, or one operation applied
+# to every product matching a filter with a single update_many. Both recompute effective_price
+# in the update pipeline, so no product is read back.
+
+def bulk_item_update(item: ProductBulkItem) -> Optional[UpdateOne]:
+    # Like PUT /admin/products/{id}: fields left out or null are not changed
+    fields = {k: v for k, v in item.model_dump(exclude={"id"}).items() if v is not None}
+    if not fields:
+        return None
+    return UpdateOne(
+        {"id": item.id},
+        [{"$set": {name: {"$literal": value} for name, value in fields.items()}}, {"$set": {"effective_price": EFFECTIVE_PRICE_EXPR}}]
+    )
+
+def bulk_filter_query(product_filter: ProductBulkFilter) -> dict:
+    query = {}
+    if product_filter.ids is not None:
+        query["id"] = {"$in": product_filter.ids}
+    if product_filter.category is not None:
+        query["category"] = product_filter.category
+    if product_filter.stock_status is not None:
+        query["stock_status"] = product_filter.stock_status
+    if not query and not product_filter.all_products:
+        raise ValueError("An empty filter matches every product; set all_products to confirm")
+    return query
+
+def bulk_operation_update(operation: ProductBulkOperation, query: dict):
+    """The (query, update pipeline) pair applying an operation to the products a filter matches"""
+    field = operation.field
+    arithmetic = operation.source is not None or operation.multiply != 1 or operation.add != 0
+    if "value" in operation.model_fields_set:
+        if arithmetic:
+            raise ValueError("Use either value or source/multiply/add, not both")
+        value = operation.value
+        if field == "stock_status" and not isinstance(value, str):
+            raise ValueError("stock_status must be set to a string")
+        if field != "stock_status" and isinstance(value, str):
+            raise ValueError(f"{field} must be set to a number or null")
+        if field == "price" and value is None:
+            raise ValueError("price cannot be cleared")
+        if field == "stock_amount" and value is not None:
+            if value != int(value):
+                raise ValueError("stock_amount must be a whole number")
+            value = int(value)
+        expression = {"$literal": value}
+    else:
+        if field == "stock_status":
+            raise ValueError("stock_status can only be set to a value")
+        source = operation.source or field
+        # Products without a numeric source (e.g. no discounted price yet) are left alone
+        query = {**query, source: {"$type": "number"}}
+        computed = {"$max": [{"$add": [{"$multiply": [f"${source}", operation.multiply]}, operation.add]}, 0]}
+        if field == "stock_amount":
+            expression = {"$toInt": {"$round": [computed, 0]}}
+        else:
+            expression = {"$round": [computed, 2]}
+    return query, [{"$set": {field: expression}}, {"$set": {"effective_price": EFFECTIVE_PRICE_EXPR}}]
+
+async def bulk_update_products(request: ProductBulkUpdate) -> dict:
+    if (request.updates is None) == (request.operation is None):
+        raise ValueError("Send either updates, or a filter with an operation")
+    
+    if request.operation is not None:
+        if request.filter is None:
+            raise ValueError("An operation needs a filter")
+        query, pipeline = bulk_operation_update(request.operation, bulk_filter_query(request.filter))
+        result = await db.products.update_many(query, pipeline)
+        summary = {"matched": result.matched_count, "modified": result.modified_count}
+    else:
+        if request.filter is not None:
+            raise ValueError("A filter only applies to an operation")
+        if len(request.updates) > PRODUCT_BULK_MAX_UPDATES:
+            raise ValueError(f"At most {PRODUCT_BULK_MAX_UPDATES} updates per request")
+        ids = [item.id for item in request.updates]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Each product may appear only once in updates")
+        operations = [op for op in map(bulk_item_update, request.updates) if op is not None]
+        summary = {"matched": 0, "modified": 0}
+        if operations:
+            result = await db.products.bulk_write(operations, ordered=False)
+            summary = {"matched": result.matched_count, "modified": result.modified_count}
+        found = set(await db.products.distinct("id", {"id": {"$in": ids}})) if ids else set()
+        summary["not_found"] = [product_id for product_id in ids if product_id not in found]
+    
+    if summary["modified"]:
+        product_catalog.invalidate()
+        await product_catalog.publish()
+    return summary
+
+@api_router.patch("/admin/products:bulk")
+async def admin_bulk_update_products(
+    request: ProductBulkUpdate,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Update many products in one request; returns matched/modified counts (and unknown ids for per-product updates).
+
+    {"updates": [{"id": "...", "price": 1200}, ...]} or
+    {"filter": {"category": "..."}, "operation": {"field": "discounted_price", "source": "price", "multiply": 0.9}}
+    """
+    try:
+        return await bulk_update_products(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ============ ADMIN ORDER ROUTES ============
+# $lookup stages project inside the lookup (MongoDB 5.0+ localField + pipeline form), so password
+# hashes, reset tokens and other user fields never enter the aggregation.
+
+ORDER_USER_LOOKUP = {"$lookup": {
+    "from": "users", "localField": "user_id", "foreignField": "id",
+    "pipeline": [{"$project": {"_id": 0, "email": 1, "full_name": 1}}],
+    "as": "user"
+}}
+# The user as {email, full_name}, or no field when the account was deleted
+ORDER_USER_FIRST = {"$set": {"user": {"$arrayElemAt": ["$user", 0]}}}
+
+# Product fields shown next to each order line in the admin order list
+ORDER_PRODUCT_PROJECTION = {
+    "_id": 0, "id": 1, "product_name": 1, "category": 1, "price": 1, "image_urls": {"$slice": ["$image_urls", 1]}
+}
 
 @api_router.get("/admin/orders")
-async def admin_get_orders(current_admin: Admin = Depends(get_current_admin)):
-    orders = await db.orders.find({}, {"_id": 0}).to_list(1000)
-    
-    # Enrich orders with user and product information
+async def admin_get_orders(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Orders newest first, enriched with user and product info in a single aggregation.
+
+    Optional filters: status, date_from (inclusive) and date_to (exclusive). With `limit`
+    a page plus next_cursor is returned, otherwise a plain list of up to 1000 orders.
+    """
+    match = {}
+    if status:
+        match["status"] = status
+    created_range = {}
+    if date_from:
+        created_range["$gte"] = date_from if date_from.tzinfo else date_from.replace(tzinfo=timezone.utc)
+    if date_to:
+        created_range["$lt"] = date_to if date_to.tzinfo else date_to.replace(tzinfo=timezone.utc)
+    if created_range:
+        match["created_at"] = created_range
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        keyset = keyset_filter("created_at", -1, sort_value, last_id)
+        match = {"$and": [match, keyset]} if match else keyset
+    
+    page_size = limit + 1 if limit else 1000
+    orders = await db.orders.aggregate([
+        {"$match": match},
+        {"$sort": {"created_at": -1, "id": -1}},
+        {"$limit": page_size},
+        ORDER_USER_LOOKUP,
+        {"$lookup": {
+            "from": "products", "localField": "items.product_id", "foreignField": "id",
+            "pipeline": [{"$project": ORDER_PRODUCT_PROJECTION}],
+            "as": "products"
+        }},
+        ORDER_USER_FIRST,
+        {"$project": {"_id": 0}}
+    ]).to_list(page_size)
+    
+    next_cursor = None
+    if limit and len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1].get("created_at"), orders[-1]["id"])
+    
+    # Attach the looked-up product to each item; items whose product was deleted are dropped
     enriched_orders = []
     for order in orders:
-        # Get user info
-        user = await db.users.find_one({"id": order["user_id"]}, {"_id": 0, "email": 1, "full_name": 1})
-        
-        # Get product info for each item
-        items_with_products = []
-        for item in order.get("items", []):
-            product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
-            if product:
-                items_with_products.append({
-                    **item,
-                    "product": product
-                })
-        
+        products = {p["id"]: p for p in order.pop("products", [])}
+        items_with_products = [
+            {**item, "product": products[item["product_id"]]}
+            for item in order.get("items", [])
+            if item["product_id"] in products
+        ]
         enriched_orders.append({
             **order,
-            "user": user,
+            "user": order.get("user"),
             "items": items_with_products
         })
     
+    if limit:
+        return {"items": enriched_orders, "next_cursor": next_cursor}
     return enriched_orders
 
 @api_router.put("/admin/orders/{order_id}/status")
@@ -758,20 +2633,22 @@ async def admin_update_order_status(
     current_admin: Admin = Depends(get_current_admin)
 ):
     # Validate status
-    valid_statuses = ["pending", "preparing", "shipped", "in_transit", "delivered"]
-    if status_data.status not in valid_statuses:
+    if status_data.status not in ORDER_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    result = await db.orders.update_one(
+    # The pre-update document tells us which status counter to move the order out of
+    previous = await db.orders.find_one_and_update(
         {"id": order_id},
-        {"$set": {"status": status_data.status}}
+        {"$set": {"status": status_data.status}},
+        projection={"_id": 0}
     )
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    updated_order = await db.orders.find_one({"id": order_id}, {"_id": 0})
-    return updated_order
+    if previous.get("status") != status_data.status:
+        await bump_store_counters({f"status.{previous.get('status')}": -1, f"status.{status_data.status}": 1})
+    return {**previous, "status": status_data.status}
 
 # ============ ADMIN USER ROUTES ============
 
@@ -792,45 +2669,167 @@ async def admin_get_users(current_admin: Admin = Depends(get_current_admin)):
 
 # ============ ADMIN STATS ROUTES ============
 
+async def compute_store_stats(recent_days: int = 7) -> dict:
+    """Store-wide figures recomputed from the raw collections: one aggregation per collection, run concurrently.
+
+    Used until the store counters have been built (see reconcile_stats.py) and by the reconciliation itself.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=recent_days)
+    
+    orders_pipeline = [{"$facet": {
+        "totals": [{"$group": {"_id": None, "count": {"$sum": 1}, "sales": {"$sum": "$total"}}}],
+        "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+        "recent": [
+            {"$match": {"created_at": {"$gt": since}}},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "sales": {"$sum": "$total"}}}
+        ],
+        "customers": [{"$group": {"_id": "$user_id"}}, {"$count": "count"}],
+        "top_products": [
+            {"$unwind": "$items"},
+            {"$group": {"_id": "$items.product_id", "total_sold": {"$sum": {"$ifNull": ["$items.quantity", 1]}}}},
+            {"$sort": {"total_sold": -1, "_id": 1}},
+            {"$limit": 5},
+            {"$lookup": {
+                "from": "products", "localField": "_id", "foreignField": "id",
+                "pipeline": [{"$project": {"_id": 0, "product_name": 1, "image_urls": {"$slice": ["$image_urls", 1]}, "price": 1}}],
+                "as": "product"
+            }},
+            {"$unwind": "$product"},
+            {"$project": {
+                "_id": 0,
+                "product_id": "$_id",
+                "product_name": "$product.product_name",
+                "image_url": {"$arrayElemAt": ["$product.image_urls", 0]},
+                "total_sold": 1,
+                "revenue": {"$multiply": ["$total_sold", {"$ifNull": ["$product.price", 0]}]}
+            }}
+        ],
+        "recent_orders": [
+            {"$sort": {"created_at": -1}},
+            {"$limit": 5},
+            ORDER_USER_LOOKUP,
+            ORDER_USER_FIRST,
+            {"$project": {"_id": 0}}
+        ]
+    }}]
+    users_pipeline = [{"$facet": {
+        "totals": [{"$group": {"_id": None, "count": {"$sum": 1}}}],
+        "boz_plus": [{"$match": {"is_boz_plus": True}}, {"$count": "count"}]
+    }}]
+    products_pipeline = [{"$facet": {
+        "totals": [{"$group": {"_id": None, "count": {"$sum": 1}}}],
+        "out_of_stock": [{"$match": {"stock_amount": 0}}, {"$count": "count"}],
+        "low_stock": [{"$match": {"stock_amount": {"$lte": 5, "$gt": 0}}}, {"$count": "count"}]
+    }}]
+    
+    orders_facets, users_facets, products_facets, carts, total_categories = await asyncio.gather(
+        db.orders.aggregate(orders_pipeline).to_list(1),
+        db.users.aggregate(users_pipeline).to_list(1),
+        db.products.aggregate(products_pipeline).to_list(1),
+        db.carts.aggregate(CART_TOTALS_PIPELINE).to_list(1),
+        db.categories.count_documents({})
+    )
+    orders_facets, users_facets, products_facets = orders_facets[0], users_facets[0], products_facets[0]
+    
+    def first(facet: list, field: str = "count"):
+        return facet[0][field] if facet else 0
+    
+    by_status = {row["_id"]: row["count"] for row in orders_facets["by_status"]}
+    for order in orders_facets["recent_orders"]:
+        order.setdefault("user", None)
+    return {
+        "total_orders": first(orders_facets["totals"]),
+        "total_sales": first(orders_facets["totals"], "sales"),
+        "order_status_breakdown": {s: by_status.get(s, 0) for s in ORDER_STATUSES},
+        "orders_recent": first(orders_facets["recent"]),
+        "sales_recent": first(orders_facets["recent"], "sales"),
+        "users_with_orders": first(orders_facets["customers"]),
+        "top_products": orders_facets["top_products"],
+        "recent_orders": orders_facets["recent_orders"],
+        "total_users": first(users_facets["totals"]),
+        "boz_plus_members": first(users_facets["boz_plus"]),
+        "users_with_cart": first(carts, "users"),
+        "total_items_in_carts": first(carts, "items"),
+        "total_products": first(products_facets["totals"]),
+        "out_of_stock": first(products_facets["out_of_stock"]),
+        "low_stock": first(products_facets["low_stock"]),
+        "total_categories": total_categories
+    }
+
+async def read_store_stats(recent_days: int = 7) -> Optional[dict]:
+    """The same figures as compute_store_stats, read from the store counters in a fixed number of small queries.
+
+    The recent window is counted in whole UTC days, today included. Returns None when
+    the counters have not been built yet.
+    """
+    first_day = stats_day(datetime.now(timezone.utc) - timedelta(days=recent_days - 1))
+    counters, days, top_sellers, recent_orders, carts, total_categories, _ = await asyncio.gather(
+        db.stats_counters.find_one({"_id": STORE_COUNTERS_ID}),
+        db.stats_daily.find({"_id": {"$gte": first_day}}).to_list(recent_days),
+        db.stats_product_sales.find({"sold": {"$gt": 0}}).sort([("sold", -1), ("_id", 1)]).limit(5).to_list(5),
+        db.orders.find({}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5),
+        db.carts.aggregate(CART_TOTALS_PIPELINE).to_list(1),
+        db.categories.count_documents({}),
+        product_catalog.ensure_loaded()
+    )
+    if counters is None:
+        return None
+    
+    customers = await db.users.find(
+        {"id": {"$in": list({order["user_id"] for order in recent_orders})}},
+        {"_id": 0, "id": 1, "email": 1, "full_name": 1}
+    ).to_list(None)
+    customers = {user.pop("id"): user for user in customers}
+    for order in recent_orders:
+        order["user"] = customers.get(order["user_id"])
+    
+    top_products = []
+    for row in top_sellers:
+        product = product_catalog.get(row["_id"])
+        if product:
+            top_products.append({
+                "product_id": row["_id"],
+                "product_name": product.get("product_name"),
+                "image_url": (product.get("image_urls") or [None])[0],
+                "total_sold": row["sold"],
+                "revenue": row["sold"] * product.get("price", 0)
+            })
+    
+    products = product_catalog.all()
+    status_counts = counters.get("status", {})
+    return {
+        "total_orders": counters.get("orders", 0),
+        "total_sales": counters.get("sales", 0),
+        "order_status_breakdown": {s: status_counts.get(s, 0) for s in ORDER_STATUSES},
+        "orders_recent": sum(day.get("orders", 0) for day in days),
+        "sales_recent": sum(day.get("sales", 0) for day in days),
+        "users_with_orders": counters.get("customers", 0),
+        "top_products": top_products,
+        "recent_orders": recent_orders,
+        "total_users": counters.get("users", 0),
+        "boz_plus_members": counters.get("boz_plus_members", 0),
+        "users_with_cart": carts[0]["users"] if carts else 0,
+        "total_items_in_carts": carts[0]["items"] if carts else 0,
+        "total_products": len(products),
+        "out_of_stock": sum(1 for p in products if p.get("stock_amount") == 0),
+        "low_stock": sum(1 for p in products if p.get("stock_amount") is not None and 0 < p["stock_amount"] <= 5),
+        "total_categories": total_categories
+    }
+
+async def get_store_stats(recent_days: int = 7) -> dict:
+    return await read_store_stats(recent_days) or await compute_store_stats(recent_days)
+
 @api_router.get("/admin/stats")
 async def admin_get_stats(current_admin: Admin = Depends(get_current_admin)):
-    # Count documents
-    total_users = await db.users.count_documents({})
-    total_products = await db.products.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    
-    # Calculate total sales
-    orders = await db.orders.find({}, {"_id": 0, "total": 1}).to_list(10000)
-    total_sales = sum(order.get("total", 0) for order in orders)
-    
-    # Get order status breakdown
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    preparing_orders = await db.orders.count_documents({"status": "preparing"})
-    shipped_orders = await db.orders.count_documents({"status": "shipped"})
-    in_transit_orders = await db.orders.count_documents({"status": "in_transit"})
-    delivered_orders = await db.orders.count_documents({"status": "delivered"})
-    
-    # Get recent orders
-    recent_orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
-    
-    # Enrich recent orders with user info
-    for order in recent_orders:
-        user = await db.users.find_one({"id": order["user_id"]}, {"_id": 0, "email": 1, "full_name": 1})
-        order["user"] = user
+    stats = await get_store_stats()
     
     return {
-        "total_users": total_users,
-        "total_products": total_products,
-        "total_orders": total_orders,
-        "total_sales": total_sales,
-        "order_status_breakdown": {
-            "pending": pending_orders,
-            "preparing": preparing_orders,
-            "shipped": shipped_orders,
-            "in_transit": in_transit_orders,
-            "delivered": delivered_orders
-        },
-        "recent_orders": recent_orders
+        "total_users": stats["total_users"],
+        "total_products": stats["total_products"],
+        "total_orders": stats["total_orders"],
+        "total_sales": stats["total_sales"],
+        "order_status_breakdown": stats["order_status_breakdown"],
+        "recent_orders": stats["recent_orders"]
     }
 
 # ============ ADMIN CATEGORY ROUTES ============
@@ -948,225 +2947,1217 @@ async def admin_reorder_category_products(
             {"id": product["id"], "category": category_name},
             {"$set": {"category_order": product["category_order"]}}
         )
+    product_catalog.invalidate()
+    await product_catalog.publish()
     
     return {"message": f"Products in {category_name} reordered successfully"}
 
+# ============ CART STORE ============
+# One document per user in `carts`: {user_id, items: [{product_id, quantity}], version, updated_at, checkout}.
+# Every mutation is a single atomic update on that document, so concurrent tabs never overwrite each other,
+# and bumps `version`, which GET /cart uses as its ETag.
+
+# Users with a non-empty cart and the number of lines across them
+CART_TOTALS_PIPELINE = [
+    {"$match": {"items.0": {"$exists": True}}},
+    {"$group": {"_id": None, "users": {"$sum": 1}, "items": {"$sum": {"$size": "$items"}}}}
+]
+
+CART_ITEMS_PROJECTION = {"_id": 0, "items": 1, "version": 1}
+
+async def add_cart_item(user_id: str, product_id: str, quantity: int) -> dict:
+    """Add quantity to the product's line, creating the line (and the cart) if needed; returns the cart"""
+    for _ in range(3):
+        now = datetime.now(timezone.utc)
+        cart = await db.carts.find_one_and_update(
+            {"user_id": user_id, "items.product_id": product_id},
+            {"$inc": {"items.$.quantity": quantity, "version": 1}, "$set": {"updated_at": now}},
+            projection=CART_ITEMS_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if cart is not None:
+            return cart
+        try:
+            return await db.carts.find_one_and_update(
+                {"user_id": user_id, "items.product_id": {"$ne": product_id}},
+                {
+                    "$push": {"items": {"product_id": product_id, "quantity": quantity}},
+                    "$set": {"updated_at": now},
+                    "$inc": {"version": 1},
+                    "$setOnInsert": {"checkout": None}
+                },
+                projection=CART_ITEMS_PROJECTION,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another request created the cart or the line in between: increment that instead
+            continue
+    raise HTTPException(status_code=409, detail="Cart is being updated, please retry")
+
+async def set_cart_item_quantity(user_id: str, product_id: str, quantity: int) -> Optional[dict]:
+    """Set a line's quantity (removing it at zero); None if the product is not in the cart"""
+    if quantity <= 0:
+        update = {"$pull": {"items": {"product_id": product_id}}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    else:
+        update = {"$set": {"items.$.quantity": quantity, "updated_at": datetime.now(timezone.utc)}}
+    update["$inc"] = {"version": 1}
+    return await db.carts.find_one_and_update(
+        {"user_id": user_id, "items.product_id": product_id},
+        update,
+        projection=CART_ITEMS_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+
+async def remove_cart_item(user_id: str, product_id: str) -> dict:
+    """Drop the product's line; returns the cart (empty if the user has none)"""
+    cart = await db.carts.find_one_and_update(
+        {"user_id": user_id},
+        {
+            "$pull": {"items": {"product_id": product_id}},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+            "$inc": {"version": 1}
+        },
+        projection=CART_ITEMS_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    return cart or {"items": [], "version": 0}
+
+async def clear_cart_items(user_id: str) -> dict:
+    cart = await db.carts.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+        projection=CART_ITEMS_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    return cart or {"items": [], "version": 0}
+
+# ============ CART VIEWS ============
+
+def cart_etag(version: int, is_boz_plus: bool) -> str:
+    # Same on every worker: cart contents, pricing tier and the shared catalog version, which every
+    # product write through the API moves (writes that bypass the API, like the seed scripts, do not)
+    return f'"{version}.{int(is_boz_plus)}.{product_catalog.shared_version or 0}"'
+
+def cart_line(product: dict, quantity: int, is_boz_plus: bool) -> dict:
+    # Determine price based on user's BOZ PLUS status
+    if is_boz_plus and product.get("boz_plus_price"):
+        price = product["boz_plus_price"]
+    elif product.get("discounted_price"):
+        price = product["discounted_price"]
+    else:
+        price = product["price"]
+    
+    return {
+        "product_id": product["id"],
+        "product_name": product["product_name"],
+        "price": product["price"],
+        "discounted_price": product.get("discounted_price"),
+        "boz_plus_price": product.get("boz_plus_price"),
+        "image_url": product["image_url"],
+        "quantity": quantity,
+        "subtotal": price * quantity
+    }
+
+class CartViews:
+    """Rendered carts (lines, total, version) per user.
+
+    When the previous rendering of a cart is exactly one version behind, was priced the
+    same way and against the same product snapshot, a mutation only re-prices the line
+    it touched and adjusts the total; otherwise the cart is rendered from scratch.
+    """
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._views = collections.OrderedDict()
+    
+    async def render(self, user: User, cart: Optional[dict], changed: Optional[str] = None) -> dict:
+        items = cart.get("items", []) if cart else []
+        version = cart.get("version", 0) if cart else 0
+        is_boz_plus = is_boz_plus_active(user)
+        pricing = (is_boz_plus, product_catalog.version)
+        
+        cached = self._views.get(user.id)
+        if changed is not None and cached is not None and cached[0] == version - 1 and cached[1] == pricing:
+            view = await self._apply(cached[2], items, changed, is_boz_plus)
+        else:
+            products = await product_snapshots.get_many(item["product_id"] for item in items)
+            lines = [
+                cart_line(products[item["product_id"]], item["quantity"], is_boz_plus)
+                for item in items if item["product_id"] in products
+            ]
+            view = {"cart": lines, "total": round(sum(line["subtotal"] for line in lines), 2)}
+        view["version"] = version
+        
+        # A slower concurrent mutation must not replace a newer rendering
+        if cached is None or cached[0] <= version:
+            self._views[user.id] = (version, pricing, view)
+            self._views.move_to_end(user.id)
+            while len(self._views) > self.max_entries:
+                self._views.popitem(last=False)
+        return view
+    
+    async def _apply(self, previous: dict, items: List[dict], product_id: str, is_boz_plus: bool) -> dict:
+        lines = list(previous["cart"])
+        index = next((i for i, line in enumerate(lines) if line["product_id"] == product_id), None)
+        total = previous["total"]
+        if index is not None:
+            total -= lines[index]["subtotal"]
+        
+        quantity = next((item["quantity"] for item in items if item["product_id"] == product_id), None)
+        product = (await product_snapshots.get_many([product_id])).get(product_id) if quantity is not None else None
+        if product is None:
+            if index is not None:
+                del lines[index]
+        else:
+            line = cart_line(product, quantity, is_boz_plus)
+            total += line["subtotal"]
+            if index is None:
+                lines.append(line)
+            else:
+                lines[index] = line
+        return {"cart": lines, "total": round(total, 2)}
+
+cart_views = CartViews(CART_VIEW_CACHE_SIZE)
+
 # ============ CART ROUTES ============
 
 @api_router.get("/cart")
-async def get_cart(current_user: User = Depends(get_current_user)):
-    """Get user's cart"""
-    user_data = await db.users.find_one({"id": current_user.id}, {"_id": 0})
-    cart_items = user_data.get("cart", [])
-    
-    # Fetch product details for each cart item
-    cart_response = []
-    for item in cart_items:
-        product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
-        if product:
-            # Determine price based on user's BOZ PLUS status
-            if user_data.get("is_boz_plus") and product.get("boz_plus_price"):
-                price = product["boz_plus_price"]
-            elif product.get("discounted_price"):
-                price = product["discounted_price"]
-            else:
-                price = product["price"]
-            
-            cart_response.append({
-                "product_id": product["id"],
-                "product_name": product["product_name"],
-                "price": product["price"],
-                "discounted_price": product.get("discounted_price"),
-                "boz_plus_price": product.get("boz_plus_price"),
-                "image_url": product.get("image_urls", [None])[0],
-                "quantity": item["quantity"],
-                "subtotal": price * item["quantity"]
-            })
-    
-    return {"cart": cart_response, "total": sum(item["subtotal"] for item in cart_response)}
+async def get_cart(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    """Get user's cart; answers 304 when If-None-Match carries the current ETag"""
+    cart = await db.carts.find_one({"user_id": current_user.id}, CART_ITEMS_PROJECTION)
+    etag = cart_etag(cart.get("version", 0) if cart else 0, is_boz_plus_active(current_user))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return await cart_views.render(current_user, cart)
 
 @api_router.post("/cart/add")
 async def add_to_cart(cart_item: CartItem, current_user: User = Depends(get_current_user)):
-    """Add item to cart"""
+    """Add item to cart; returns the updated cart"""
     # Check if product exists
-    product = await db.products.find_one({"id": cart_item.product_id}, {"_id": 0})
-    if not product:
+    await product_catalog.ensure_loaded()
+    if product_catalog.get(cart_item.product_id) is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Get user's current cart
-    user_data = await db.users.find_one({"id": current_user.id}, {"_id": 0})
-    cart = user_data.get("cart", [])
-    
-    # Check if product already in cart
-    existing_item = next((item for item in cart if item["product_id"] == cart_item.product_id), None)
-    
-    if existing_item:
-        # Update quantity
-        existing_item["quantity"] += cart_item.quantity
-    else:
-        # Add new item
-        cart.append({"product_id": cart_item.product_id, "quantity": cart_item.quantity})
-    
-    # Update user's cart
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"cart": cart}}
-    )
+    cart = await add_cart_item(current_user.id, cart_item.product_id, cart_item.quantity)
+    view = await cart_views.render(current_user, cart, cart_item.product_id)
     
-    return {"message": "Product added to cart", "cart_count": len(cart)}
+    return {"message": "Product added to cart", "cart_count": len(cart["items"]), **view}
 
 @api_router.put("/cart/update")
 async def update_cart_item(cart_item: CartItem, current_user: User = Depends(get_current_user)):
-    """Update cart item quantity"""
-    user_data = await db.users.find_one({"id": current_user.id}, {"_id": 0})
-    cart = user_data.get("cart", [])
-    
-    # Find and update item
-    item = next((item for item in cart if item["product_id"] == cart_item.product_id), None)
-    if item:
-        if cart_item.quantity <= 0:
-            cart.remove(item)
-        else:
-            item["quantity"] = cart_item.quantity
-        
-        await db.users.update_one(
-            {"id": current_user.id},
-            {"$set": {"cart": cart}}
-        )
-        return {"message": "Cart updated"}
+    """Update cart item quantity; returns the updated cart"""
+    cart = await set_cart_item_quantity(current_user.id, cart_item.product_id, cart_item.quantity)
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Item not found in cart")
+    view = await cart_views.render(current_user, cart, cart_item.product_id)
     
-    raise HTTPException(status_code=404, detail="Item not found in cart")
+    return {"message": "Cart updated", "cart_count": len(cart["items"]), **view}
 
 @api_router.delete("/cart/remove/{product_id}")
 async def remove_from_cart(product_id: str, current_user: User = Depends(get_current_user)):
-    """Remove item from cart"""
-    user_data = await db.users.find_one({"id": current_user.id}, {"_id": 0})
-    cart = user_data.get("cart", [])
-    
-    # Remove item
-    cart = [item for item in cart if item["product_id"] != product_id]
-    
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"cart": cart}}
-    )
+    """Remove item from cart; returns the updated cart"""
+    cart = await remove_cart_item(current_user.id, product_id)
+    view = await cart_views.render(current_user, cart, product_id)
     
-    return {"message": "Item removed from cart", "cart_count": len(cart)}
+    return {"message": "Item removed from cart", "cart_count": len(cart["items"]), **view}
 
 @api_router.delete("/cart/clear")
 async def clear_cart(current_user: User = Depends(get_current_user)):
     """Clear all items from cart"""
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"cart": []}}
-    )
+    cart = await clear_cart_items(current_user.id)
+    view = await cart_views.render(current_user, cart)
+    
+    return {"message": "Cart cleared", "cart_count": 0, **view}
+
+# ============ ANALYTICS INGEST ============
+
+class AnalyticsIngestBuffer:
+    """In-process write buffer for analytics events.
+
+    Requests only append to the buffer; a background task writes it out with
+    insert_many(ordered=False) once a batch fills up or the flush interval passes,
+    whichever comes first. The buffer is bounded: while it is full new events are
+    dropped and counted rather than slowing the request path down. Events still
+    buffered when the process exits cleanly are flushed by the shutdown hook.
+    """
+    
+    def __init__(self, collection: str, batch_size: int, flush_interval: float, max_events: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self._buffer = collections.deque()
+        self._batch_ready = None
+        self._task = None
+        self._stopping = False
+        self.metrics = {"accepted": 0, "dropped": 0, "written": 0, "failed": 0, "flushes": 0, "last_flush_ms": 0.0}
+    
+    def offer(self, document: dict) -> bool:
+        """Queue one event document; False if it was dropped because the buffer is full"""
+        if self._task is None:
+            self.start()
+        if len(self._buffer) >= self.max_events:
+            self.metrics["dropped"] += 1
+            return False
+        self._buffer.append(document)
+        self.metrics["accepted"] += 1
+        if len(self._buffer) >= self.batch_size and self._batch_ready is not None:
+            self._batch_ready.set()
+        return True
+    
+    def offer_many(self, documents: List[dict]) -> int:
+        """Queue several event documents at once; returns how many fit in the buffer"""
+        if self._task is None:
+            self.start()
+        accepted = documents[:max(0, self.max_events - len(self._buffer))]
+        self._buffer.extend(accepted)
+        self.metrics["accepted"] += len(accepted)
+        self.metrics["dropped"] += len(documents) - len(accepted)
+        if len(self._buffer) >= self.batch_size and self._batch_ready is not None:
+            self._batch_ready.set()
+        return len(accepted)
+    
+    def start(self):
+        if self._task is None:
+            self._batch_ready = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background flusher and write out whatever is still buffered"""
+        if self._task is not None:
+            # Let an in-flight write finish rather than cancelling it halfway through a batch
+            self._stopping = True
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final analytics flush failed; %d events lost", len(self._buffer))
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Analytics flush failed")
+    
+    async def flush(self):
+        """Write the buffered events in batches of at most batch_size"""
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            started = time.perf_counter()
+            try:
+                await db[self.collection].insert_many(batch, ordered=False)
+                self.metrics["written"] += len(batch)
+            except BulkWriteError as e:
+                # ordered=False: everything except the reported documents was written
+                failed = len(e.details.get("writeErrors", []))
+                self.metrics["written"] += len(batch) - failed
+                self.metrics["failed"] += failed
+            except Exception:
+                # Database unreachable: put the batch back for the next flush, within the buffer cap
+                room = max(0, self.max_events - len(self._buffer))
+                self._buffer.extendleft(reversed(batch[:room]))
+                self.metrics["dropped"] += len(batch) - min(room, len(batch))
+                raise
+            finally:
+                self.metrics["flushes"] += 1
+                self.metrics["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            try:
+                await mark_late_rollup_hours(batch)
+            except Exception:
+                logger.exception("Failed to flag late analytics hours for recompaction")
+    
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "buffered": len(self._buffer),
+            "max_events": self.max_events,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval
+        }
+
+analytics_ingest = AnalyticsIngestBuffer(
+    "analytics_events",
+    batch_size=ANALYTICS_FLUSH_BATCH_SIZE,
+    flush_interval=ANALYTICS_FLUSH_INTERVAL_SECONDS,
+    max_events=ANALYTICS_BUFFER_MAX_EVENTS
+)
+
+# ============ ANALYTICS ROLLUPS ============
+# analytics_rollups holds event counts per closed hour and per closed day, broken down by
+#   dim "all"       per event type
+#   dim "product"   per event_data.product_id (with the first product_name / category seen)
+#   dim "category"  per event_data.category
+#   dim "page"      per event_data.page, page views only
+# A background compactor aggregates raw events one closed hour at a time and, once a day's
+# last hour is done, folds that day's hours into a day rollup. analytics_rollup_state keeps
+# the watermark: every hour before it has been compacted. Readers combine rollups before the
+# watermark with raw events after it, so only the current partial hour is scanned raw.
+# Events written after their hour closed (buffer retries after a database outage, a backlog
+# flushed at shutdown) flag that hour in analytics_rollup_dirty, and the compactor recomputes
+# it and its day. One worker at a time compacts, holding a lease in analytics_rollup_state.
+
+ROLLUP_DIMENSIONS = ("all", "product", "category", "page")
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def ceil_hour(moment: datetime) -> datetime:
+    floor = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return floor if floor == moment else floor + timedelta(hours=1)
+
+def ceil_day(moment: datetime) -> datetime:
+    floor = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return floor if floor == moment else floor + timedelta(days=1)
+
+def rollup_facets(dims: tuple, by_day: bool) -> dict:
+    """$facet stages grouping raw events by event type and dimension key (and UTC day if by_day)"""
+    def group(key, extra=None):
+        group_id = {"event_type": "$event_type", "key": key}
+        if by_day:
+            group_id["day"] = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+        return {"$group": {
+            "_id": group_id,
+            "count": {"$sum": 1},
+            "last_at": {"$max": "$created_at"},
+            **(extra or {})
+        }}
+    
+    product_info = {
+        "name": {"$first": "$event_data.product_name"},
+        "category": {"$first": "$event_data.category"}
+    }
+    facets = {
+        "all": [group(None)],
+        "product": [
+            {"$match": {"event_data.product_id": {"$nin": [None, ""]}}},
+            group("$event_data.product_id", product_info)
+        ],
+        "category": [
+            {"$match": {"event_data.category": {"$nin": [None, ""]}}},
+            group("$event_data.category")
+        ],
+        "page": [
+            {"$match": {"event_type": "page_view"}},
+            group({"$ifNull": ["$event_data.page", "Unknown"]})
+        ]
+    }
+    return {dim: facets[dim] for dim in dims}
+
+def flatten_facets(facets: dict) -> List[dict]:
+    rows = []
+    for dim, groups in facets.items():
+        for row in groups:
+            rows.append({**row.pop("_id"), "dim": dim, **row})
+    return rows
+
+async def raw_event_counts(start: Optional[datetime], end: Optional[datetime], dims: tuple, by_day: bool = False) -> List[dict]:
+    created_at = {}
+    if start:
+        created_at["$gte"] = start
+    if end:
+        created_at["$lt"] = end
+    result = await db.analytics_events.aggregate([
+        {"$match": {"created_at": created_at} if created_at else {}},
+        {"$facet": rollup_facets(dims, by_day)}
+    ]).to_list(1)
+    return flatten_facets(result[0]) if result else []
+
+async def mark_late_rollup_hours(documents: List[dict]):
+    """Flag closed hours that just received events so the compactor recomputes them.
+
+    Called after the events are written: an hour that was still open at that point is
+    compacted later anyway and sees them.
+    """
+    closed_until = floor_hour(datetime.now(timezone.utc) - timedelta(seconds=ANALYTICS_ROLLUP_GRACE_SECONDS))
+    hours = {floor_hour(doc["created_at"]) for doc in documents if doc["created_at"] < closed_until}
+    if hours:
+        await db.analytics_rollup_dirty.bulk_write(
+            [
+                UpdateOne({"_id": hour.isoformat()}, {"$inc": {"marks": 1}, "$setOnInsert": {"hour": hour}}, upsert=True)
+                for hour in sorted(hours)
+            ],
+            ordered=False
+        )
+
+class AnalyticsRollupCompactor:
+    """Background task folding closed hours of raw analytics events into analytics_rollups.
+
+    Each hour is recomputed from the raw events and written with $set, so a pass that is
+    interrupted, or that overlaps another worker's after a lease changes hands, leaves the
+    same result.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.worker_id = uuid.uuid4().hex
+        self._task = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Let another worker take over without waiting for the lease to run out
+            await db.analytics_rollup_state.update_one(
+                {"_id": "lease", "holder": self.worker_id},
+                {"$set": {"expires_at": datetime.now(timezone.utc)}}
+            )
+    
+    async def acquire_lease(self) -> bool:
+        """Take or renew the compactor lease; False while another worker holds it"""
+        now = datetime.now(timezone.utc)
+        try:
+            await db.analytics_rollup_state.update_one(
+                {"_id": "lease", "$or": [{"holder": self.worker_id}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.worker_id, "expires_at": now + timedelta(seconds=ANALYTICS_ROLLUP_LEASE_SECONDS)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+    
+    async def _run(self):
+        while True:
+            try:
+                if await self.acquire_lease():
+                    while await self.run_once() and await self.acquire_lease():
+                        pass
+                    await self.recompact_late()
+                    await self.archive_expiring()
+                    await self.delete_expired()
+            except Exception:
+                logger.exception("Analytics rollup compaction failed")
+            await asyncio.sleep(self.interval)
+    
+    async def watermark(self) -> Optional[datetime]:
+        state = await db.analytics_rollup_state.find_one({"_id": "watermark"})
+        return state["closed_until"] if state else None
+    
+    async def run_once(self, now: Optional[datetime] = None) -> bool:
+        """Compact up to ANALYTICS_ROLLUP_MAX_HOURS_PER_PASS closed hours; True if more are waiting"""
+        now = now or datetime.now(timezone.utc)
+        closed_until = floor_hour(now - timedelta(seconds=ANALYTICS_ROLLUP_GRACE_SECONDS))
+        
+        hour = await self.watermark()
+        if hour is None:
+            first = await db.analytics_events.find_one({}, {"_id": 0, "created_at": 1}, sort=[("created_at", 1)])
+            if first is None:
+                return False
+            hour = floor_hour(first["created_at"])
+        
+        for _ in range(ANALYTICS_ROLLUP_MAX_HOURS_PER_PASS):
+            if hour >= closed_until:
+                return False
+            next_hour = hour + timedelta(hours=1)
+            await self._compact_hour(hour, next_hour)
+            if next_hour.hour == 0:
+                await self._compact_day(hour.replace(hour=0))
+            await db.analytics_rollup_state.update_one(
+                {"_id": "watermark"},
+                {"$max": {"closed_until": next_hour}},
+                upsert=True
+            )
+            hour = next_hour
+        return hour < closed_until
+    
+    async def recompact_late(self) -> int:
+        """Recompute flagged hours before the watermark, and their days once closed; returns hours handled"""
+        watermark = await self.watermark()
+        if watermark is None:
+            return 0
+        marks = await db.analytics_rollup_dirty.find({}).sort("_id", 1).to_list(ANALYTICS_ROLLUP_MAX_HOURS_PER_PASS)
+        days = set()
+        for mark in marks:
+            hour = mark["hour"]
+            # Hours at or past the watermark are compacted normally, after their events were written
+            if hour < watermark:
+                await self._compact_hour(hour, hour + timedelta(hours=1))
+                if hour.replace(hour=0) + timedelta(days=1) <= watermark:
+                    days.add(hour.replace(hour=0))
+        for day in sorted(days):
+            await self._compact_day(day)
+        for mark in marks:
+            # An hour flagged again meanwhile keeps its mark for the next pass
+            await db.analytics_rollup_dirty.delete_one({"_id": mark["_id"], "marks": mark["marks"]})
+        return len(marks)
+    
+    async def archive_expiring(self, now: Optional[datetime] = None) -> int:
+        """Archive each day of raw events that is due for deletion within a day; returns days archived.
+
+        A day is only archived once its day rollup exists, so trends for expired days stay
+        queryable from the rollups. With ANALYTICS_ARCHIVE_DIR set, the day's raw events are
+        also written to <dir>/analytics-YYYY-MM-DD.jsonl.gz. delete_expired never deletes past
+        the last archived day, so a backlog (e.g. history older than the retention on the first
+        deploy) is kept until the compactor has caught up with it.
+        """
+        if ANALYTICS_RETENTION_DAYS <= 0:
+            return 0
+        now = now or datetime.now(timezone.utc)
+        watermark = await self.watermark()
+        state = await db.analytics_rollup_state.find_one({"_id": "archive"})
+        if watermark is None:
+            return 0
+        if state:
+            day = state["archived_until"]
+        else:
+            first = await db.analytics_events.find_one({}, {"_id": 0, "created_at": 1}, sort=[("created_at", 1)])
+            if first is None:
+                return 0
+            day = floor_hour(first["created_at"]).replace(hour=0)
+        
+        # A day starting at or before this instant is deleted within the next day
+        expiring = now - timedelta(days=ANALYTICS_RETENTION_DAYS - 1)
+        archived = 0
+        while day <= expiring and day + timedelta(days=1) <= watermark:
+            next_day = day + timedelta(days=1)
+            if ANALYTICS_ARCHIVE_DIR:
+                await self._archive_to_file(day, next_day)
+            await db.analytics_rollup_state.update_one(
+                {"_id": "archive"},
+                {"$max": {"archived_until": next_day}},
+                upsert=True
+            )
+            day = next_day
+            archived += 1
+        return archived
+    
+    async def delete_expired(self, now: Optional[datetime] = None) -> int:
+        """Delete raw events older than the retention, up to the last archived day; returns events deleted"""
+        if ANALYTICS_RETENTION_DAYS <= 0:
+            return 0
+        now = now or datetime.now(timezone.utc)
+        state = await db.analytics_rollup_state.find_one({"_id": "archive"})
+        if not state:
+            return 0
+        cutoff = min(now - timedelta(days=ANALYTICS_RETENTION_DAYS), state["archived_until"])
+        result = await db.analytics_events.delete_many({"created_at": {"$lt": cutoff}})
+        return result.deleted_count
+    
+    async def _archive_to_file(self, day: datetime, next_day: datetime):
+        directory = Path(ANALYTICS_ARCHIVE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"analytics-{day.strftime('%Y-%m-%d')}.jsonl.gz"
+        partial = directory / f".{target.name}.{os.getpid()}.tmp"
+        
+        cursor = db.analytics_events.find(
+            {"created_at": {"$gte": day, "$lt": next_day}},
+            {"_id": 0}
+        ).sort("created_at", 1)
+        encode = lambda value: value.isoformat() if isinstance(value, datetime) else str(value)
+        with gzip.open(partial, "wt", encoding="utf-8") as archive:
+            lines = []
+            async for event in cursor:
+                lines.append(json.dumps(event, default=encode) + "\n")
+                if len(lines) == 1000:
+                    await asyncio.to_thread(archive.writelines, lines)
+                    lines = []
+            await asyncio.to_thread(archive.writelines, lines)
+        partial.replace(target)
+    
+    async def _write(self, granularity: str, start: datetime, rows: List[dict]):
+        writes = []
+        for row in rows:
+            doc = {
+                "granularity": granularity,
+                "start": start,
+                "event_type": row["event_type"],
+                "dim": row["dim"],
+                "key": row["key"],
+                "count": row["count"],
+                "last_at": row["last_at"]
+            }
+            if row["dim"] == "product":
+                doc["name"] = row.get("name")
+                doc["category"] = row.get("category")
+            doc_id = "|".join([granularity, start.isoformat(), str(row["event_type"]), row["dim"], str(row["key"])])
+            writes.append(UpdateOne({"_id": doc_id}, {"$set": doc}, upsert=True))
+        if writes:
+            await db.analytics_rollups.bulk_write(writes, ordered=False)
+    
+    async def _compact_hour(self, hour: datetime, next_hour: datetime):
+        rows = await raw_event_counts(hour, next_hour, ROLLUP_DIMENSIONS)
+        await self._write("hour", hour, rows)
+    
+    async def _compact_day(self, day: datetime):
+        rows = await rollup_counts(
+            [{"granularity": "hour", "start": {"$gte": day, "$lt": day + timedelta(days=1)}}],
+            ROLLUP_DIMENSIONS
+        )
+        await self._write("day", day, rows)
+
+analytics_rollups = AnalyticsRollupCompactor(ANALYTICS_ROLLUP_INTERVAL_SECONDS)
+
+async def rollup_counts(periods: List[dict], dims: tuple, by_day: bool = False) -> List[dict]:
+    """Rollup documents matching any of `periods`, summed per event type and dimension key"""
+    if not periods:
+        return []
+    group_id = {"event_type": "$event_type", "dim": "$dim", "key": "$key"}
+    if by_day:
+        group_id["day"] = {"$dateToString": {"format": "%Y-%m-%d", "date": "$start"}}
+    rows = await db.analytics_rollups.aggregate([
+        {"$match": {"$or": periods, "dim": {"$in": list(dims)}}},
+        {"$sort": {"start": 1}},
+        {"$group": {
+            "_id": group_id,
+            "count": {"$sum": "$count"},
+            "last_at": {"$max": "$last_at"},
+            "name": {"$first": "$name"},
+            "category": {"$first": "$category"}
+        }}
+    ]).to_list(None)
+    return [{**row.pop("_id"), **row} for row in rows]
+
+async def analytics_counts(since: Optional[datetime], dims: tuple, by_day: bool = False) -> List[dict]:
+    """Event counts since `since` (None for all time) per event type and dimension key.
+
+    Compacted periods come from the day and hour rollups; the stretch before the first
+    whole hour and everything after the watermark come from raw events. Rows from the
+    different sources are merged, so each (event type, dim, key[, day]) appears once.
+    """
+    watermark = await analytics_rollups.watermark()
+    if watermark is None or (since and since >= watermark):
+        return await raw_event_counts(since, None, dims, by_day)
+    
+    sources = []
+    periods = []
+    first_hour = min(ceil_hour(since), watermark) if since else None
+    if since and since < first_hour:
+        sources.append(raw_event_counts(since, first_hour, dims, by_day))
+    
+    first_day = ceil_day(first_hour) if first_hour else None
+    last_day = watermark.replace(hour=0)
+    if first_day is None or first_day < last_day:
+        day_range = {"$lt": last_day}
+        if first_day:
+            day_range["$gte"] = first_day
+            periods.append({"granularity": "hour", "start": {"$gte": first_hour, "$lt": first_day}})
+        periods.append({"granularity": "day", "start": day_range})
+        periods.append({"granularity": "hour", "start": {"$gte": last_day, "$lt": watermark}})
+    else:
+        periods.append({"granularity": "hour", "start": {"$gte": first_hour, "$lt": watermark}})
+    sources.append(rollup_counts(periods, dims, by_day))
+    sources.append(raw_event_counts(watermark, None, dims, by_day))
+    
+    merged = {}
+    for rows in await asyncio.gather(*sources):
+        for row in rows:
+            key = (row["event_type"], row["dim"], row["key"], row.get("day"))
+            current = merged.get(key)
+            if current is None:
+                merged[key] = dict(row)
+                continue
+            current["count"] += row["count"]
+            current["last_at"] = max(current["last_at"], row["last_at"])
+            for field in ("name", "category"):
+                if current.get(field) is None:
+                    current[field] = row.get(field)
+    return list(merged.values())
+
+# ============ ANALYTICS SKETCHES ============
+# Fixed-size streaming summaries per UTC day, updated as events are accepted:
+#   HyperLogLog       unique session_id / user_id          relative standard error 1.04 / sqrt(2^precision)
+#   Count-Min Sketch  clicks per product / category        never undercounts; overcounts by at most
+#                                                          eps * (clicks that day) with probability 1 - delta
+#   top-K candidates  the keys with the highest Count-Min estimates seen so far
+# Each worker keeps its own sketches and persists them under a slot number it leases in
+# analytics_sketch_slots, so merging the persisted copies of every slot (HLL: register max,
+# Count-Min: sum) gives the full picture. A restarted worker takes over a free slot and
+# continues its stored sketches, so the documents per day stay bounded by the worker count.
+
+_HLL_INVERSE_POWERS = [2.0 ** -rank for rank in range(65)]
+
+def sketch_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+class HyperLogLog:
+    def __init__(self, precision: int = ANALYTICS_HLL_PRECISION, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+    
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.size)
+    
+    def add(self, value: str):
+        x = sketch_hash(value)
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+    
+    def estimate(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(map(_HLL_INVERSE_POWERS.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction: linear counting
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+class CountMinSketch:
+    def __init__(self, width: int, depth: int, table: Optional[bytes] = None):
+        self.width = width
+        self.depth = depth
+        self.table = array.array("I")
+        if table:
+            self.table.frombytes(table)
+        else:
+            self.table.extend([0] * (width * depth))
+        self.total = 0
+    
+    @classmethod
+    def for_error(cls, epsilon: float, delta: float) -> "CountMinSketch":
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+    
+    def _cells(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+    
+    def add(self, key: str, count: int = 1) -> int:
+        """Count `key` and return its new estimate"""
+        self.total += count
+        estimate = None
+        for cell in self._cells(key):
+            self.table[cell] += count
+            value = self.table[cell]
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate
+    
+    def estimate(self, key: str) -> int:
+        return min(self.table[cell] for cell in self._cells(key))
+    
+    def merge(self, other: "CountMinSketch"):
+        self.table = array.array("I", map(operator.add, self.table, other.table))
+        self.total += other.total
+
+class TopK:
+    """Keys with the highest Count-Min estimates, capped at `capacity` candidates"""
+    
+    def __init__(self, capacity: int, candidates: Optional[dict] = None):
+        self.capacity = capacity
+        self.candidates = dict(candidates or {})
+    
+    def offer(self, key: str, estimate: int):
+        if key in self.candidates or len(self.candidates) < self.capacity:
+            self.candidates[key] = estimate
+            return
+        weakest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[weakest]:
+            del self.candidates[weakest]
+            self.candidates[key] = estimate
+
+class DaySketch:
+    """All sketches for one UTC day"""
+    
+    def __init__(self, doc: Optional[dict] = None):
+        doc = doc or {}
+        self.sessions = HyperLogLog(registers=doc.get("sessions"))
+        self.users = HyperLogLog(registers=doc.get("users"))
+        self.products = self._cms(doc.get("products"))
+        self.categories = self._cms(doc.get("categories"))
+        self.top_products = TopK(ANALYTICS_TOPK_CAPACITY, dict(doc.get("top_products", [])))
+        self.top_categories = TopK(ANALYTICS_TOPK_CAPACITY, dict(doc.get("top_categories", [])))
+        self.events = doc.get("events", 0)
+    
+    @staticmethod
+    def _cms(stored: Optional[dict]) -> CountMinSketch:
+        if not stored:
+            return CountMinSketch.for_error(ANALYTICS_CMS_EPSILON, ANALYTICS_CMS_DELTA)
+        sketch = CountMinSketch(stored["width"], stored["depth"], stored["table"])
+        sketch.total = stored["total"]
+        return sketch
+    
+    def observe(self, event: dict):
+        self.events += 1
+        if event.get("session_id"):
+            self.sessions.add(event["session_id"])
+        if event.get("user_id"):
+            self.users.add(event["user_id"])
+        data = event.get("event_data") or {}
+        if event.get("event_type") == "product_click" and data.get("product_id"):
+            key = str(data["product_id"])
+            self.top_products.offer(key, self.products.add(key))
+        if event.get("event_type") == "category_click" and data.get("category"):
+            key = str(data["category"])
+            self.top_categories.offer(key, self.categories.add(key))
+    
+    def merge(self, other: "DaySketch"):
+        self.sessions.merge(other.sessions)
+        self.users.merge(other.users)
+        self.products.merge(other.products)
+        self.categories.merge(other.categories)
+        self.top_products.candidates.update(other.top_products.candidates)
+        self.top_categories.candidates.update(other.top_categories.candidates)
+        self.events += other.events
+    
+    def to_doc(self) -> dict:
+        def cms(sketch):
+            return {"width": sketch.width, "depth": sketch.depth, "total": sketch.total, "table": Binary(sketch.table.tobytes())}
+        return {
+            "sessions": Binary(bytes(self.sessions.registers)),
+            "users": Binary(bytes(self.users.registers)),
+            "products": cms(self.products),
+            "categories": cms(self.categories),
+            "top_products": list(self.top_products.candidates.items()),
+            "top_categories": list(self.top_categories.candidates.items()),
+            "events": self.events
+        }
+
+class AnalyticsSketches:
+    """This worker's day sketches, persisted to analytics_sketches every ANALYTICS_SKETCH_PERSIST_SECONDS.
+
+    `days` mirrors what is stored under this worker's slot; events observed since the last
+    persist are kept apart in `pending`. When the slot is lost, `days` is reloaded from the new
+    slot and only `pending` is added to it, so counts already persisted under the old slot
+    are not counted a second time.
+    """
+    
+    def __init__(self, persist_interval: float):
+        self.persist_interval = persist_interval
+        self.worker_id = str(uuid.uuid4())
+        self.slot = None
+        self.days = {}
+        self.pending = {}
+        self._task = None
+    
+    def observe(self, event: dict):
+        day = stats_day(event.get("created_at"))
+        sketch = self.pending.get(day)
+        if sketch is None:
+            sketch = self.pending[day] = DaySketch()
+        sketch.observe(event)
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.persist()
+        if self.slot is not None:
+            # Free the slot for the next process right away
+            await db.analytics_sketch_slots.update_one(
+                {"_id": self.slot, "holder": self.worker_id},
+                {"$set": {"expires_at": datetime.now(timezone.utc)}}
+            )
+            self.slot = None
     
-    return {"message": "Cart cleared"}
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            try:
+                await self.persist()
+            except Exception:
+                logger.exception("Persisting analytics sketches failed")
+    
+    async def _lease(self, slot: int) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await db.analytics_sketch_slots.update_one(
+                {"_id": slot, "$or": [{"holder": self.worker_id}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.worker_id, "expires_at": now + timedelta(seconds=ANALYTICS_SKETCH_SLOT_LEASE_SECONDS)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+    
+    async def _hold_slot(self, oldest: str):
+        """Renew this worker's slot, or take over the lowest free one and continue its stored sketches"""
+        if self.slot is not None and await self._lease(self.slot):
+            return
+        slot = 0
+        while not await self._lease(slot):
+            slot += 1
+        self.slot = slot
+        # What this worker persisted under its previous slot stays there
+        self.days = {
+            doc["day"]: DaySketch(doc)
+            async for doc in db.analytics_sketches.find({"slot": slot, "day": {"$gte": oldest}})
+        }
+    
+    async def persist(self):
+        oldest = stats_day(datetime.now(timezone.utc) - timedelta(days=ANALYTICS_SKETCH_DAYS - 1))
+        for day in [day for day in self.days if day < oldest]:
+            del self.days[day]
+        await self._hold_slot(oldest)
+        pending, self.pending = self.pending, {}
+        updated = {}
+        for day, sketch in pending.items():
+            if day >= oldest:
+                combined = updated[day] = DaySketch()
+                combined.merge(self.days.get(day) or DaySketch())
+                combined.merge(sketch)
+        try:
+            if updated:
+                await db.analytics_sketches.bulk_write([
+                    UpdateOne({"_id": f"{day}|{self.slot}"}, {"$set": {"day": day, "slot": self.slot, **sketch.to_doc()}}, upsert=True)
+                    for day, sketch in updated.items()
+                ], ordered=False)
+        except Exception:
+            # Keep the events for the next attempt
+            for day, sketch in pending.items():
+                self.pending.setdefault(day, DaySketch()).merge(sketch)
+            raise
+        self.days.update(updated)
+        await db.analytics_sketches.delete_many({"day": {"$lt": oldest}})
+    
+    async def merged(self, days: int) -> List[tuple]:
+        """(day, DaySketch) for the last `days` UTC days, combining every worker's sketches"""
+        first = stats_day(datetime.now(timezone.utc) - timedelta(days=days - 1))
+        merged = {}
+        query = {"day": {"$gte": first}}
+        if self.slot is not None:
+            # This worker's own slot is already in self.days
+            query["slot"] = {"$ne": self.slot}
+        stored = db.analytics_sketches.find(query)
+        async for doc in stored:
+            sketch = DaySketch(doc)
+            if doc["day"] in merged:
+                merged[doc["day"]].merge(sketch)
+            else:
+                merged[doc["day"]] = sketch
+        for local in (self.days, self.pending):
+            for day, sketch in local.items():
+                if day >= first:
+                    merged.setdefault(day, DaySketch()).merge(sketch)
+        return sorted(merged.items())
+
+analytics_sketches = AnalyticsSketches(ANALYTICS_SKETCH_PERSIST_SECONDS)
 
 # ============ ANALYTICS ROUTES ============
 
 @api_router.post("/analytics/event")
 async def track_event(event: AnalyticsEventCreate):
     """Track analytics event (public endpoint)"""
-    analytics_event = AnalyticsEvent(**event.model_dump())
-    await db.analytics_events.insert_one(analytics_event.model_dump())
+    analytics_event = AnalyticsEvent(**event.model_dump()).model_dump()
+    if analytics_ingest.offer(analytics_event):
+        analytics_sketches.observe(analytics_event)
     return {"message": "Event tracked"}
 
+_analytics_event_list = TypeAdapter(List[AnalyticsEventCreate])
+
+async def read_limited_body(request: Request, max_bytes: int) -> bytes:
+    """The request body, gunzipped when Content-Encoding is gzip.
+
+    Rejected with 413 from Content-Length when declared too large, otherwise as soon as
+    the bytes received or the bytes decompressed pass max_bytes, so an oversized
+    upload is never buffered whole.
+    """
+    too_large = HTTPException(status_code=413, detail="Request body too large")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise too_large
+    
+    decompressor = None
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = size = 0
+    parts = []
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise too_large
+        if decompressor is not None:
+            try:
+                chunk = decompressor.decompress(chunk, max_bytes + 1 - size)
+            except zlib.error:
+                raise HTTPException(status_code=400, detail="Invalid gzip body")
+            if decompressor.unconsumed_tail:
+                raise too_large
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        parts.append(chunk)
+    return b"".join(parts)
+
+@api_router.post("/analytics/events:batch")
+async def track_events_batch(request: Request):
+    """Track many analytics events in one request (public endpoint).
+
+    The body is a JSON array of events, optionally gzip-compressed (Content-Encoding: gzip).
+    Events that fail validation are skipped and reported by index; the rest are queued together.
+    """
+    body = await read_limited_body(request, ANALYTICS_BATCH_MAX_BYTES)
+    
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=422, detail="Expected a JSON array of events")
+    if len(payload) > ANALYTICS_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {ANALYTICS_BATCH_MAX_EVENTS} events per batch")
+    
+    # Validate the whole array in one pass; only on failure fall back to picking out the valid events
+    rejected = []
+    try:
+        events = _analytics_event_list.validate_python(payload)
+    except ValidationError as e:
+        rejected = sorted({error["loc"][0] for error in e.errors() if error["loc"]})
+        skip = set(rejected)
+        events = [AnalyticsEventCreate.model_validate(item) for i, item in enumerate(payload) if i not in skip]
+    
+    documents = [AnalyticsEvent(**event.model_dump()).model_dump() for event in events]
+    accepted = analytics_ingest.offer_many(documents)
+    for document in documents[:accepted]:
+        analytics_sketches.observe(document)
+    return {"accepted": accepted, "rejected": rejected, "dropped": len(events) - accepted}
+
+@api_router.get("/admin/analytics/ingest")
+async def admin_analytics_ingest_stats(current_admin: Admin = Depends(get_current_admin)):
+    """Analytics write buffer metrics: accepted, dropped, written and currently buffered events"""
+    return analytics_ingest.stats()
+
+def sketch_days(days: int) -> int:
+    if not 1 <= days <= ANALYTICS_SKETCH_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {ANALYTICS_SKETCH_DAYS}")
+    return days
+
+@api_router.get("/admin/analytics/unique-visitors")
+async def admin_analytics_unique_visitors(
+    days: int = 7,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Approximate unique sessions and users per day and over the whole window (HyperLogLog)"""
+    sketches = await analytics_sketches.merged(sketch_days(days))
+    
+    window = DaySketch()
+    timeline = []
+    for day, sketch in sketches:
+        window.merge(sketch)
+        timeline.append({
+            "date": day,
+            "sessions": sketch.sessions.estimate(),
+            "users": sketch.users.estimate(),
+            "events": sketch.events
+        })
+    
+    return {
+        "days": days,
+        "sessions": window.sessions.estimate(),
+        "users": window.users.estimate(),
+        "timeline": timeline,
+        "error": {
+            "relative_standard_error": round(window.sessions.relative_error, 5),
+            "note": "About 95% of estimates fall within two standard errors of the true count"
+        }
+    }
+
+async def top_from_sketches(days: int, limit: int, cms_field: str, top_field: str) -> dict:
+    sketches = await analytics_sketches.merged(sketch_days(days))
+    window = DaySketch()
+    for _, sketch in sketches:
+        window.merge(sketch)
+    
+    counts = getattr(window, cms_field)
+    candidates = getattr(window, top_field).candidates
+    ranked = heapq.nlargest(limit, ((counts.estimate(key), key) for key in candidates))
+    return {
+        "days": days,
+        "items": [{"key": key, "count": count} for count, key in ranked],
+        "total": counts.total,
+        "error": {
+            # Count-Min estimates never undercount
+            "max_overcount": math.ceil(ANALYTICS_CMS_EPSILON * counts.total),
+            "confidence": 1 - ANALYTICS_CMS_DELTA
+        }
+    }
+
+@api_router.get("/admin/analytics/top-products")
+async def admin_analytics_top_products(
+    days: int = 7,
+    limit: int = Query(10, ge=1, le=ANALYTICS_TOPK_CAPACITY),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Approximate most clicked products (Count-Min Sketch + top-K), with product details from the catalog"""
+    result = await top_from_sketches(days, limit, "products", "top_products")
+    await product_catalog.ensure_loaded()
+    for item in result["items"]:
+        product = product_catalog.get(item["key"]) or {}
+        item["product_id"] = item.pop("key")
+        item["product_name"] = product.get("product_name", "Unknown")
+        item["category"] = product.get("category", "Unknown")
+    return result
+
+@api_router.get("/admin/analytics/top-categories")
+async def admin_analytics_top_categories(
+    days: int = 7,
+    limit: int = Query(10, ge=1, le=ANALYTICS_TOPK_CAPACITY),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Approximate most clicked categories (Count-Min Sketch + top-K)"""
+    result = await top_from_sketches(days, limit, "categories", "top_categories")
+    for item in result["items"]:
+        item["category"] = item.pop("key")
+    return result
+
 @api_router.get("/admin/analytics/summary")
 async def admin_analytics_summary(
     days: Optional[int] = None,
     current_admin: Admin = Depends(get_current_admin)
 ):
     """Get analytics summary with optional time filter"""
-    
-    # Build time filter
-    query = {}
-    if days:
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-        query["created_at"] = {"$gte": cutoff_date.isoformat()}
-    
-    # Total events
-    total_events = await db.analytics_events.count_documents(query)
-    
-    # Page views
-    page_view_query = {**query, "event_type": "page_view"}
-    total_page_views = await db.analytics_events.count_documents(page_view_query)
-    
-    # Product clicks
-    product_click_query = {**query, "event_type": "product_click"}
-    total_product_clicks = await db.analytics_events.count_documents(product_click_query)
-    
-    # Category clicks
-    category_click_query = {**query, "event_type": "category_click"}
-    total_category_clicks = await db.analytics_events.count_documents(category_click_query)
-    
-    # Add to cart
-    add_to_cart_query = {**query, "event_type": "add_to_cart"}
-    total_add_to_cart = await db.analytics_events.count_documents(add_to_cart_query)
-    
-    # Most clicked products
-    product_clicks = await db.analytics_events.find(product_click_query).to_list(10000)
-    product_click_counts = {}
-    for event in product_clicks:
-        product_id = event.get("event_data", {}).get("product_id")
-        if product_id:
-            if product_id not in product_click_counts:
-                product_click_counts[product_id] = {
-                    "product_id": product_id,
-                    "product_name": event.get("event_data", {}).get("product_name", "Unknown"),
-                    "category": event.get("event_data", {}).get("category", "Unknown"),
-                    "count": 0,
-                    "last_clicked": event.get("created_at")
-                }
-            product_click_counts[product_id]["count"] += 1
-            if event.get("created_at") > product_click_counts[product_id]["last_clicked"]:
-                product_click_counts[product_id]["last_clicked"] = event.get("created_at")
-    
-    top_products = sorted(product_click_counts.values(), key=lambda x: x["count"], reverse=True)[:10]
-    
-    # Most clicked categories
-    category_clicks = await db.analytics_events.find(category_click_query).to_list(10000)
-    category_click_counts = {}
-    for event in category_clicks:
-        category = event.get("event_data", {}).get("category")
-        if category:
-            if category not in category_click_counts:
-                category_click_counts[category] = {
-                    "category": category,
-                    "count": 0,
-                    "last_clicked": event.get("created_at")
-                }
-            category_click_counts[category]["count"] += 1
-            if event.get("created_at") > category_click_counts[category]["last_clicked"]:
-                category_click_counts[category]["last_clicked"] = event.get("created_at")
-    
-    top_categories = sorted(category_click_counts.values(), key=lambda x: x["count"], reverse=True)[:10]
-    
-    # Most added to cart products
-    cart_events = await db.analytics_events.find(add_to_cart_query).to_list(10000)
-    cart_counts = {}
-    for event in cart_events:
-        product_id = event.get("event_data", {}).get("product_id")
-        if product_id:
-            if product_id not in cart_counts:
-                cart_counts[product_id] = {
-                    "product_id": product_id,
-                    "product_name": event.get("event_data", {}).get("product_name", "Unknown"),
-                    "count": 0,
-                    "last_added": event.get("created_at")
-                }
-            cart_counts[product_id]["count"] += 1
-            if event.get("created_at") > cart_counts[product_id]["last_added"]:
-                cart_counts[product_id]["last_added"] = event.get("created_at")
-    
-    top_cart_products = sorted(cart_counts.values(), key=lambda x: x["count"], reverse=True)[:10]
-    
-    # Page views breakdown
-    page_views = await db.analytics_events.find(page_view_query).to_list(10000)
-    page_counts = {}
-    for event in page_views:
-        page = event.get("event_data", {}).get("page", "Unknown")
-        page_counts[page] = page_counts.get(page, 0) + 1
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    rows = await analytics_counts(cutoff_date if days else None, ROLLUP_DIMENSIONS)
+    
+    def top_by(event_type: str, dim: str, key: str, extra: tuple, last_field: str) -> list:
+        matching = [row for row in rows if row["event_type"] == event_type and row["dim"] == dim]
+        matching.sort(key=lambda row: (-row["count"], row["key"]))
+        return [
+            {
+                key: row["key"],
+                **{name: row.get(field) or "Unknown" for name, field in extra},
+                "count": row["count"],
+                last_field: row["last_at"]
+            }
+            for row in matching[:10]
+        ]
+    
+    by_type = {row["event_type"]: row["count"] for row in rows if row["dim"] == "all"}
+    total_events = sum(by_type.values())
+    total_page_views = by_type.get("page_view", 0)
+    total_product_clicks = by_type.get("product_click", 0)
+    total_category_clicks = by_type.get("category_click", 0)
+    total_add_to_cart = by_type.get("add_to_cart", 0)
+    top_products = top_by("product_click", "product", "product_id", (("product_name", "name"), ("category", "category")), "last_clicked")
+    top_categories = top_by("category_click", "category", "category", (), "last_clicked")
+    top_cart_products = top_by("add_to_cart", "product", "product_id", (("product_name", "name"),), "last_added")
+    page_views = sorted((row for row in rows if row["dim"] == "page"), key=lambda row: -row["count"])
+    page_counts = {row["key"]: row["count"] for row in page_views}
     
     return {
         "summary": {
@@ -1191,16 +4182,13 @@ async def admin_analytics_timeline(
     """Get analytics timeline for charts"""
     
     cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-    query = {"created_at": {"$gte": cutoff_date.isoformat()}}
-    
-    events = await db.analytics_events.find(query).to_list(10000)
+    rows = await analytics_counts(cutoff_date, ("all",), by_day=True)
     
     # Group by day and event type
     timeline = {}
-    for event in events:
-        created_at = datetime.fromisoformat(event["created_at"])
-        day_key = created_at.strftime("%Y-%m-%d")
-        event_type = event["event_type"]
+    for row in rows:
+        day_key = row["day"]
+        event_type = row["event_type"]
         
         if day_key not in timeline:
             timeline[day_key] = {
@@ -1211,7 +4199,7 @@ async def admin_analytics_timeline(
                 "add_to_cart": 0
             }
         
-        timeline[day_key][event_type] = timeline[day_key].get(event_type, 0) + 1
+        timeline[day_key][event_type] = timeline[day_key].get(event_type, 0) + row["count"]
     
     # Sort by date
     sorted_timeline = sorted(timeline.values(), key=lambda x: x["date"])
@@ -1241,13 +4229,14 @@ async def request_boz_plus(current_user: User = Depends(get_current_user)):
         {"id": current_user.id},
         {"$set": {"boz_plus_requested": True}}
     )
+    forget_user(current_user.id)
     
     return {"message": "BOZ PLUS membership request submitted. Admin will review shortly."}
 
 @api_router.get("/boz-plus/status")
 async def get_boz_plus_status(current_user: User = Depends(get_current_user)):
     """Get current user's BOZ PLUS status"""
-    user = await db.users.find_one({"id": current_user.id}, {"_id": 0})
+    user = current_user.model_dump()
     
     is_active = False
     days_remaining = 0
@@ -1261,10 +4250,7 @@ async def get_boz_plus_status(current_user: User = Depends(get_current_user)):
             days_remaining = (expiry - now).days
         else:
             # Expired, deactivate
-            await db.users.update_one(
-                {"id": current_user.id},
-                {"$set": {"is_boz_plus": False, "boz_plus_expiry_date": None}}
-            )
+            await set_boz_plus_fields(current_user.id, {"is_boz_plus": False, "boz_plus_expiry_date": None})
     
     return {
         "is_boz_plus": is_active,
@@ -1297,23 +4283,16 @@ async def admin_approve_boz_plus(
     current_admin: Admin = Depends(get_current_admin)
 ):
     """Approve BOZ PLUS membership for a user"""
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     # Set expiry date to 30 days from now
     expiry_date = datetime.now(timezone.utc) + timedelta(days=30)
     
-    await db.users.update_one(
-        {"id": user_id},
-        {
-            "$set": {
-                "is_boz_plus": True,
-                "boz_plus_expiry_date": expiry_date.isoformat(),
-                "boz_plus_requested": False
-            }
-        }
-    )
+    user = await set_boz_plus_fields(user_id, {
+        "is_boz_plus": True,
+        "boz_plus_expiry_date": expiry_date.isoformat(),
+        "boz_plus_requested": False
+    })
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     
     return {"message": "BOZ PLUS membership approved", "expiry_date": expiry_date.isoformat()}
 
@@ -1327,6 +4306,7 @@ async def admin_reject_boz_plus(
         {"id": user_id},
         {"$set": {"boz_plus_requested": False}}
     )
+    forget_user(user_id)
     
     return {"message": "BOZ PLUS membership request rejected"}
 
@@ -1350,10 +4330,7 @@ async def admin_get_boz_plus_members(current_admin: Admin = Depends(get_current_
                 active_members.append(user)
             else:
                 # Auto-expire
-                await db.users.update_one(
-                    {"id": user["id"]},
-                    {"$set": {"is_boz_plus": False, "boz_plus_expiry_date": None}}
-                )
+                await set_boz_plus_fields(user["id"], {"is_boz_plus": False, "boz_plus_expiry_date": None})
     
     return active_members
 
@@ -1379,15 +4356,10 @@ async def admin_extend_boz_plus(
     else:
         new_expiry = datetime.now(timezone.utc) + timedelta(days=days)
     
-    await db.users.update_one(
-        {"id": user_id},
-        {
-            "$set": {
-                "is_boz_plus": True,
-                "boz_plus_expiry_date": new_expiry.isoformat()
-            }
-        }
-    )
+    await set_boz_plus_fields(user_id, {
+        "is_boz_plus": True,
+        "boz_plus_expiry_date": new_expiry.isoformat()
+    })
     
     return {"message": f"BOZ PLUS membership extended by {days} days", "new_expiry_date": new_expiry.isoformat()}
 
@@ -1397,16 +4369,11 @@ async def admin_revoke_boz_plus(
     current_admin: Admin = Depends(get_current_admin)
 ):
     """Revoke BOZ PLUS membership"""
-    await db.users.update_one(
-        {"id": user_id},
-        {
-            "$set": {
-                "is_boz_plus": False,
-                "boz_plus_expiry_date": None,
-                "boz_plus_requested": False
-            }
-        }
-    )
+    await set_boz_plus_fields(user_id, {
+        "is_boz_plus": False,
+        "boz_plus_expiry_date": None,
+        "boz_plus_requested": False
+    })
     
     return {"message": "BOZ PLUS membership revoked"}
 
@@ -1416,8 +4383,16 @@ async def admin_revoke_boz_plus(
 async def admin_get_cart_analytics(current_admin: Admin = Depends(get_current_admin)):
     """Get cart analytics - which products are in how many carts"""
     
-    # Get all users with their carts
-    users = await db.users.find({}, {"_id": 0, "id": 1, "email": 1, "full_name": 1, "cart": 1}).to_list(10000)
+    # Get all non-empty carts with their owners
+    carts = await db.carts.find({"items.0": {"$exists": True}}, {"_id": 0, "user_id": 1, "items": 1}).to_list(10000)
+    owners = {
+        user["id"]: user
+        for user in await db.users.find(
+            {"id": {"$in": [cart["user_id"] for cart in carts]}},
+            {"_id": 0, "id": 1, "email": 1, "full_name": 1}
+        ).to_list(None)
+    }
+    users = [{**owners[cart["user_id"]], "cart": cart["items"]} for cart in carts if cart["user_id"] in owners]
     
     # Count products in carts
     product_cart_counts = {}
@@ -1449,15 +4424,16 @@ async def admin_get_cart_analytics(current_admin: Admin = Depends(get_current_ad
                     })
     
     # Enrich with product details
+    products = await product_snapshots.get_many(product_cart_counts)
     enriched_products = []
     for product_id, data in product_cart_counts.items():
-        product = await db.products.find_one({"id": product_id}, {"_id": 0})
+        product = products.get(product_id)
         if product:
             enriched_products.append({
                 "product_id": product_id,
                 "product_name": product.get("product_name"),
                 "price": product.get("price"),
-                "image_url": product.get("image_urls", [None])[0],
+                "image_url": product["image_url"],
                 "cart_count": data["count"],
                 "users": data["users"]
             })
@@ -1476,39 +4452,56 @@ async def admin_get_cart_analytics(current_admin: Admin = Depends(get_current_ad
 async def admin_get_users_detailed(current_admin: Admin = Depends(get_current_admin)):
     """Get detailed user information including password hash, phone, cart, orders"""
     
-    users = await db.users.find({}, {"_id": 0}).to_list(10000)
+    users = await db.users.find({}, {"_id": 0, "cart": 0}).to_list(10000)
+    carts = {
+        cart["user_id"]: cart["items"]
+        for cart in await db.carts.find({"items.0": {"$exists": True}}, {"_id": 0, "user_id": 1, "items": 1}).to_list(None)
+    }
+    # Order count, total spent and latest order per user in one pass
+    order_totals = {
+        row["_id"]: row
+        for row in await db.orders.aggregate([
+            {"$group": {
+                "_id": "$user_id",
+                "count": {"$sum": 1},
+                "total": {"$sum": "$total"},
+                "last": {"$max": "$created_at"}
+            }}
+        ]).to_list(None)
+    }
+    products = await product_snapshots.get_many(
+        item.get("product_id") for cart in carts.values() for item in cart
+    )
     
     enriched_users = []
     for user in users:
-        # Get order count and total spent
-        orders = await db.orders.find({"user_id": user["id"]}, {"_id": 0, "total": 1, "created_at": 1, "status": 1}).to_list(1000)
-        order_count = len(orders)
-        total_spent = sum(order.get("total", 0) for order in orders)
+        orders = order_totals.get(user["id"], {})
         
         # Get cart info
-        cart = user.get("cart", [])
+        cart = carts.get(user["id"], [])
         cart_items_count = len(cart)
         
         # Enrich cart with product details
         enriched_cart = []
         for item in cart:
-            product = await db.products.find_one({"id": item.get("product_id")}, {"_id": 0, "product_name": 1, "price": 1, "image_urls": 1})
+            product = products.get(item.get("product_id"))
             if product:
                 enriched_cart.append({
                     "product_id": item.get("product_id"),
                     "product_name": product.get("product_name"),
                     "price": product.get("price"),
                     "quantity": item.get("quantity", 1),
-                    "image_url": product.get("image_urls", [None])[0]
+                    "image_url": product["image_url"]
                 })
         
         enriched_users.append({
             **user,
-            "order_count": order_count,
-            "total_spent": round(total_spent, 2),
+            "cart": cart,
+            "order_count": orders.get("count", 0),
+            "total_spent": round(orders.get("total", 0), 2),
             "cart_items_count": cart_items_count,
             "cart_details": enriched_cart,
-            "last_order_date": orders[0].get("created_at") if orders else None
+            "last_order_date": orders.get("last")
         })
     
     # Sort by total spent
@@ -1519,87 +4512,45 @@ async def admin_get_users_detailed(current_admin: Admin = Depends(get_current_ad
 @api_router.get("/admin/dashboard/stats")
 async def admin_get_dashboard_stats(current_admin: Admin = Depends(get_current_admin)):
     """Get comprehensive dashboard statistics"""
+    stats = await get_store_stats(recent_days=7)
     
-    # Basic counts
-    total_users = await db.users.count_documents({})
-    total_products = await db.products.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    total_categories = await db.categories.count_documents({})
-    
-    # Sales statistics
-    orders = await db.orders.find({}, {"_id": 0, "total": 1, "created_at": 1}).to_list(10000)
-    total_sales = sum(order.get("total", 0) for order in orders)
+    total_users = stats["total_users"]
+    total_orders = stats["total_orders"]
+    total_products = stats["total_products"]
+    total_sales = stats["total_sales"]
+    users_with_cart = stats["users_with_cart"]
     avg_order_value = total_sales / total_orders if total_orders > 0 else 0
-    
-    # Recent sales (last 7 days)
-    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    recent_orders = [o for o in orders if o.get("created_at", "") > seven_days_ago]
-    recent_sales = sum(order.get("total", 0) for order in recent_orders)
-    
-    # User statistics
-    boz_plus_users = await db.users.count_documents({"is_boz_plus": True})
-    users_with_orders = await db.orders.distinct("user_id")
-    conversion_rate = (len(users_with_orders) / total_users * 100) if total_users > 0 else 0
-    
-    # Product statistics
-    out_of_stock = await db.products.count_documents({"stock_amount": 0})
-    low_stock = await db.products.count_documents({"stock_amount": {"$lte": 5, "$gt": 0}})
-    
-    # Cart statistics
-    users_with_cart = await db.users.find({"cart": {"$exists": True, "$ne": []}}, {"_id": 0, "cart": 1}).to_list(10000)
-    total_items_in_carts = sum(len(user.get("cart", [])) for user in users_with_cart)
-    
-    # Top selling products
-    all_orders = await db.orders.find({}, {"_id": 0, "items": 1}).to_list(10000)
-    product_sales = {}
-    for order in all_orders:
-        for item in order.get("items", []):
-            pid = item.get("product_id")
-            if pid:
-                product_sales[pid] = product_sales.get(pid, 0) + item.get("quantity", 1)
-    
-    # Get top 5 products
-    top_products = []
-    for pid, qty in sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:5]:
-        product = await db.products.find_one({"id": pid}, {"_id": 0, "product_name": 1, "price": 1, "image_urls": 1})
-        if product:
-            top_products.append({
-                "product_id": pid,
-                "product_name": product.get("product_name"),
-                "image_url": product.get("image_urls", [None])[0],
-                "total_sold": qty,
-                "revenue": qty * product.get("price", 0)
-            })
+    conversion_rate = (stats["users_with_orders"] / total_users * 100) if total_users > 0 else 0
     
     return {
         "overview": {
             "total_users": total_users,
             "total_products": total_products,
             "total_orders": total_orders,
-            "total_categories": total_categories,
+            "total_categories": stats["total_categories"],
             "total_sales": round(total_sales, 2),
             "avg_order_value": round(avg_order_value, 2)
         },
         "recent_activity": {
-            "sales_last_7_days": round(recent_sales, 2),
-            "orders_last_7_days": len(recent_orders)
+            "sales_last_7_days": round(stats["sales_recent"], 2),
+            "orders_last_7_days": stats["orders_recent"]
         },
         "users": {
-            "boz_plus_members": boz_plus_users,
+            "boz_plus_members": stats["boz_plus_members"],
             "conversion_rate": round(conversion_rate, 2),
-            "users_with_orders": len(users_with_orders)
+            "users_with_orders": stats["users_with_orders"]
         },
         "inventory": {
-            "out_of_stock": out_of_stock,
-            "low_stock": low_stock,
-            "in_stock": total_products - out_of_stock - low_stock
+            "out_of_stock": stats["out_of_stock"],
+            "low_stock": stats["low_stock"],
+            "in_stock": total_products - stats["out_of_stock"] - stats["low_stock"]
         },
         "cart_analytics": {
-            "users_with_items": len(users_with_cart),
-            "total_items_in_carts": total_items_in_carts,
-            "avg_cart_size": round(total_items_in_carts / len(users_with_cart), 2) if users_with_cart else 0
+            "users_with_items": users_with_cart,
+            "total_items_in_carts": stats["total_items_in_carts"],
+            "avg_cart_size": round(stats["total_items_in_carts"] / users_with_cart, 2) if users_with_cart else 0
         },
-        "top_products": top_products
+        "top_products": stats["top_products"]
     }
 
 # ============ PREORDER PRODUCTS ROUTES ============
@@ -1720,6 +4671,78 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_analytics_retention():
+    """Index on analytics_events.created_at, without expiry.
+
+    Raw events are deleted by the rollup compactor once their day is rolled up and archived
+    (see delete_expired), not by a TTL index that cannot wait for either. A TTL index left on
+    created_at by an earlier version is dropped and rebuilt as a plain index.
+    """
+    indexes = await db.analytics_events.index_information()
+    for name, info in indexes.items():
+        if info["key"] == [("created_at", 1)] and "expireAfterSeconds" in info:
+            try:
+                await db.analytics_events.drop_index(name)
+            except OperationFailure as e:
+                # Another worker starting at the same time dropped it first
+                if e.code != 27:
+                    raise
+    await db.analytics_events.create_index("created_at")
+
+@app.on_event("startup")
+async def create_indexes():
+    await db.products.create_index([("category", 1), ("effective_price", 1)])
+    await db.products.create_index("effective_price")
+    # Keyset pagination: (sort key, id)
+    await db.products.create_index([("category", 1), ("category_order", 1), ("id", 1)])
+    await db.products.create_index([("product_name", 1), ("id", 1)])
+    await db.orders.create_index([("created_at", -1), ("id", -1)])
+    await db.orders.create_index([("status", 1), ("created_at", -1), ("id", -1)])
+    # $lookup / $in targets
+    await db.users.create_index("id")
+    await db.carts.create_index("user_id", unique=True)
+    await db.products.create_index("id")
+    # Bulk import upserts by barcode (not unique: older seed data reuses some barcodes)
+    await db.products.create_index("barcode")
+    # Analytics: raw tail reads and rollup reads
+    await ensure_analytics_retention()
+    await db.analytics_events.create_index([("event_type", 1), ("created_at", 1)])
+    await db.users.create_index("created_at")
+    await db.analytics_sketches.create_index("day")
+    await db.analytics_rollups.create_index([("dim", 1), ("granularity", 1), ("start", 1)])
+    # Auth: refresh tokens and revocations expire on their own
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.refresh_tokens.create_index([("sub", 1), ("role", 1)])
+    await db.refresh_tokens.create_index("sid")
+    await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.revoked_tokens.create_index("revoked_at")
+    await db.principal_changes.create_index("expires_at", expireAfterSeconds=0)
+    await db.principal_changes.create_index("changed_at")
+    # Store counters: top sellers
+    await db.stats_product_sales.create_index([("sold", -1), ("_id", 1)])
+    
+    # Backfill effective_price for products written before the field existed or by the seed scripts
+    await db.products.update_many(
+        {"$expr": {"$ne": ["$effective_price", EFFECTIVE_PRICE_EXPR]}},
+        [{"$set": {"effective_price": EFFECTIVE_PRICE_EXPR}}]
+    )
+
+@app.on_event("startup")
+async def start_analytics_ingest():
+    analytics_ingest.start()
+    analytics_rollups.start()
+    analytics_sketches.start()
+    token_denylist.start()
+    principal_cache.start()
+    product_catalog.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await analytics_rollups.stop()
+    await analytics_ingest.stop()
+    await analytics_sketches.stop()
+    await token_denylist.stop()
+    await principal_cache.stop()
+    await product_catalog.stop()
+    password_hasher.shutdown()
     client.close()
\ No newline at end of file
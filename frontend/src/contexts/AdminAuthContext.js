@@ -1,5 +1,8 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
 import axios from 'axios';
+import { installTokenRefresh, storeTokens, clearTokens, endSession } from '../utils/authTokens';
+
+installTokenRefresh();
 
 const AdminAuthContext = createContext();
 
@@ -30,7 +33,7 @@ export const AdminAuthProvider = ({ children }) => {
         });
         setAdmin(response.data);
       } catch (error) {
-        localStorage.removeItem('adminToken');
+        clearTokens('admin');
         setAdmin(null);
       }
     }
@@ -45,7 +48,7 @@ export const AdminAuthProvider = ({ children }) => {
       });
       
       const { access_token } = response.data;
-      localStorage.setItem('adminToken', access_token);
+      storeTokens('admin', response.data);
       
       // Get admin info
       const adminResponse = await axios.get(`${API_URL}/api/admin/auth/me`, {
@@ -63,7 +66,7 @@ export const AdminAuthProvider = ({ children }) => {
   };
 
   const logout = () => {
-    localStorage.removeItem('adminToken');
+    endSession('admin');
     setAdmin(null);
   };
 
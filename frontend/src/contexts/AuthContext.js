@@ -1,5 +1,8 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import axios from 'axios';
+import { installTokenRefresh, storeTokens, endSession, onTokenChange } from '../utils/authTokens';
+
+installTokenRefresh();
 
 const AuthContext = createContext(null);
 
@@ -18,6 +21,9 @@ export const AuthProvider = ({ children }) => {
   const [loading, setLoading] = useState(true);
   const [token, setToken] = useState(localStorage.getItem('token'));
 
+  // Refreshed or cleared tokens (from any request) flow back into state
+  useEffect(() => onTokenChange('user', setToken), []);
+
   useEffect(() => {
     if (token) {
       fetchUser();
@@ -42,9 +48,7 @@ export const AuthProvider = ({ children }) => {
 
   const login = async (email, password) => {
     const response = await axios.post(`${API_URL}/auth/login`, { email, password });
-    const { access_token } = response.data;
-    localStorage.setItem('token', access_token);
-    setToken(access_token);
+    storeTokens('user', response.data);
     return response.data;
   };
 
@@ -55,15 +59,12 @@ export const AuthProvider = ({ children }) => {
       password,
       phone_number
     });
-    const { access_token } = response.data;
-    localStorage.setItem('token', access_token);
-    setToken(access_token);
+    storeTokens('user', response.data);
     return response.data;
   };
 
   const logout = () => {
-    localStorage.removeItem('token');
-    setToken(null);
+    endSession('user');
     setUser(null);
   };
 
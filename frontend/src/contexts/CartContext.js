@@ -16,6 +16,7 @@ export const useCart = () => {
 export const CartProvider = ({ children }) => {
   const [cart, setCart] = useState([]);
   const [cartCount, setCartCount] = useState(0);
+  const [cartTotal, setCartTotal] = useState(0);
   const [loading, setLoading] = useState(false);
   const { user, token } = useAuth();
 
@@ -25,18 +26,24 @@ export const CartProvider = ({ children }) => {
     if (user && token) {
       fetchCart();
     } else {
-      setCart([]);
-      setCartCount(0);
+      applyCart({ cart: [], total: 0 });
     }
   }, [user, token]);
 
+  // GET /cart and every cart mutation answer with the whole cart (lines plus total)
+  const applyCart = (data) => {
+    setCart(data.cart || []);
+    setCartCount(data.cart?.length || 0);
+    setCartTotal(data.total || 0);
+  };
+
   const fetchCart = async () => {
     try {
+      // The server sends an ETag; the browser revalidates with If-None-Match and reuses the cached body on 304
       const response = await axios.get(`${API_URL}/api/cart`, {
         headers: { Authorization: `Bearer ${token}` }
       });
-      setCart(response.data.cart || []);
-      setCartCount(response.data.cart?.length || 0);
+      applyCart(response.data);
     } catch (error) {
       console.error('Failed to fetch cart:', error);
     }
@@ -56,7 +63,7 @@ export const CartProvider = ({ children }) => {
         { headers: { Authorization: `Bearer ${token}` } }
       );
       
-      await fetchCart();
+      applyCart(response.data);
       toast.success('Ürün sepete eklendi!');
       return response.data;
     } catch (error) {
@@ -70,13 +77,13 @@ export const CartProvider = ({ children }) => {
   const updateCartItem = async (productId, quantity) => {
     setLoading(true);
     try {
-      await axios.put(
+      const response = await axios.put(
         `${API_URL}/api/cart/update`,
         { product_id: productId, quantity },
         { headers: { Authorization: `Bearer ${token}` } }
       );
       
-      await fetchCart();
+      applyCart(response.data);
       toast.success('Sepet güncellendi');
     } catch (error) {
       toast.error('Güncelleme başarısız');
@@ -89,11 +96,11 @@ export const CartProvider = ({ children }) => {
   const removeFromCart = async (productId) => {
     setLoading(true);
     try {
-      await axios.delete(`${API_URL}/api/cart/remove/${productId}`, {
+      const response = await axios.delete(`${API_URL}/api/cart/remove/${productId}`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       
-      await fetchCart();
+      applyCart(response.data);
       toast.success('Ürün sepetten çıkarıldı');
     } catch (error) {
       toast.error('Silme başarısız');
@@ -106,12 +113,11 @@ export const CartProvider = ({ children }) => {
   const clearCart = async () => {
     setLoading(true);
     try {
-      await axios.delete(`${API_URL}/api/cart/clear`, {
+      const response = await axios.delete(`${API_URL}/api/cart/clear`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       
-      setCart([]);
-      setCartCount(0);
+      applyCart(response.data);
       toast.success('Sepet temizlendi');
     } catch (error) {
       toast.error('Temizleme başarısız');
@@ -122,7 +128,7 @@ export const CartProvider = ({ children }) => {
   };
 
   const getCartTotal = () => {
-    return cart.reduce((total, item) => total + item.subtotal, 0);
+    return cartTotal;
   };
 
   return (
@@ -26,20 +26,64 @@ const getUserId = () => {
   return null;
 };
 
-export const trackEvent = async (eventType, eventData) => {
+// Events are queued and sent together to the batch endpoint
+const BATCH_URL = `${API_URL}/api/analytics/events:batch`;
+const FLUSH_INTERVAL_MS = 2000;
+const MAX_BATCH_SIZE = 20;
+
+let queue = [];
+let flushTimer = null;
+
+const flushEvents = async () => {
+  clearTimeout(flushTimer);
+  flushTimer = null;
+  if (queue.length === 0) return;
+
+  const events = queue;
+  queue = [];
   try {
-    await axios.post(`${API_URL}/api/analytics/event`, {
-      event_type: eventType,
-      event_data: eventData,
-      user_id: getUserId(),
-      session_id: getSessionId()
-    });
+    await axios.post(BATCH_URL, events);
   } catch (error) {
     // Silently fail - don't disrupt user experience
     console.error('Analytics tracking error:', error);
   }
 };
 
+// The page may be going away: hand whatever is queued to the browser so it is still delivered
+const flushOnExit = () => {
+  if (queue.length === 0) return;
+  const events = queue;
+  queue = [];
+  // text/plain keeps the beacon a simple CORS request; the endpoint parses the body as JSON either way
+  const body = new Blob([JSON.stringify(events)], { type: 'text/plain' });
+  if (!(navigator.sendBeacon && navigator.sendBeacon(BATCH_URL, body))) {
+    queue = events;
+    flushEvents();
+  }
+};
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', flushOnExit);
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushOnExit();
+  });
+}
+
+export const trackEvent = async (eventType, eventData) => {
+  queue.push({
+    event_type: eventType,
+    event_data: eventData,
+    user_id: getUserId(),
+    session_id: getSessionId()
+  });
+
+  if (queue.length >= MAX_BATCH_SIZE) {
+    await flushEvents();
+  } else if (!flushTimer) {
+    flushTimer = setTimeout(flushEvents, FLUSH_INTERVAL_MS);
+  }
+};
+
 // Convenience functions
 export const trackPageView = (pageName, additionalData = {}) => {
   trackEvent('page_view', {
@@ -0,0 +1,121 @@
+import axios from 'axios';
+
+const API_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
+
+// Where each kind of session keeps its tokens and where it refreshes them
+const SESSIONS = {
+  user: { access: 'token', refresh: 'refreshToken', path: '/api/auth' },
+  admin: { access: 'adminToken', refresh: 'adminRefreshToken', path: '/api/admin/auth' }
+};
+
+const listeners = { user: new Set(), admin: new Set() };
+const replaced = {};
+const pending = {};
+
+const notify = (kind, accessToken) => {
+  listeners[kind].forEach((listener) => listener(accessToken));
+};
+
+export const onTokenChange = (kind, listener) => {
+  listeners[kind].add(listener);
+  return () => listeners[kind].delete(listener);
+};
+
+export const storeTokens = (kind, { access_token, refresh_token }) => {
+  const { access, refresh } = SESSIONS[kind];
+  replaced[kind] = localStorage.getItem(access);
+  localStorage.setItem(access, access_token);
+  if (refresh_token) {
+    localStorage.setItem(refresh, refresh_token);
+  }
+  notify(kind, access_token);
+};
+
+export const clearTokens = (kind) => {
+  const { access, refresh } = SESSIONS[kind];
+  localStorage.removeItem(access);
+  localStorage.removeItem(refresh);
+  notify(kind, null);
+};
+
+// Sign out locally right away, then tell the backend to end the session
+export const endSession = async (kind) => {
+  const { refresh, path } = SESSIONS[kind];
+  const refreshToken = localStorage.getItem(refresh);
+  clearTokens(kind);
+  if (refreshToken) {
+    try {
+      await axios.post(`${API_URL}${path}/logout`, { refresh_token: refreshToken }, { skipAuthRefresh: true });
+    } catch (error) {
+      // The session expires on its own anyway
+    }
+  }
+};
+
+const requestRefresh = async (kind) => {
+  const { access, refresh, path } = SESSIONS[kind];
+  const refreshToken = localStorage.getItem(refresh);
+  if (!refreshToken) return null;
+  try {
+    const response = await axios.post(`${API_URL}${path}/refresh`, { refresh_token: refreshToken }, { skipAuthRefresh: true });
+    storeTokens(kind, response.data);
+    return response.data.access_token;
+  } catch (error) {
+    // Another tab may have rotated the refresh token meanwhile; use its tokens instead of signing out
+    if (localStorage.getItem(refresh) !== refreshToken) {
+      return localStorage.getItem(access);
+    }
+    if (error.response?.status === 401) {
+      clearTokens(kind);
+    }
+    return null;
+  }
+};
+
+// Concurrent 401s share one refresh per session kind
+export const refreshTokens = (kind) => {
+  if (!pending[kind]) {
+    pending[kind] = requestRefresh(kind).finally(() => {
+      delete pending[kind];
+    });
+  }
+  return pending[kind];
+};
+
+const sentToken = (config) => {
+  const header = config.headers?.Authorization || config.headers?.authorization;
+  return typeof header === 'string' ? header.replace(/^Bearer /, '') : null;
+};
+
+let installed = false;
+
+// Retry requests rejected with 401 once, after refreshing the access token they were sent with
+export const installTokenRefresh = () => {
+  if (installed) return;
+  installed = true;
+
+  axios.interceptors.response.use(undefined, async (error) => {
+    const config = error.config;
+    if (error.response?.status !== 401 || !config || config.skipAuthRefresh || config._authRetried) {
+      return Promise.reject(error);
+    }
+    const token = sentToken(config);
+    const kind = token && Object.keys(SESSIONS).find(
+      (name) => token === localStorage.getItem(SESSIONS[name].access) || token === replaced[name]
+    );
+    if (!kind) {
+      return Promise.reject(error);
+    }
+
+    // A request sent with the token that was just replaced only needs the new one
+    const accessToken = token === localStorage.getItem(SESSIONS[kind].access)
+      ? await refreshTokens(kind)
+      : localStorage.getItem(SESSIONS[kind].access);
+    if (!accessToken) {
+      return Promise.reject(error);
+    }
+    config._authRetried = true;
+    config.headers.Authorization = `Bearer ${accessToken}`;
+    return axios(config);
+  });
+};
@@ -0,0 +1,38 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+# server.py reads these at import time; no connection is made until a test uses the database
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bozconcept_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    """A throwaway database patched into server.db.
+
+    Set TEST_MONGO_URL to run against a real MongoDB; otherwise mongomock-motor is used.
+    """
+    url = os.environ.get("TEST_MONGO_URL")
+    if url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(url, tz_aware=True)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient(tz_aware=True)
+    database = client[f"test_{uuid.uuid4().hex[:12]}"]
+    monkeypatch.setattr(server, "db", database)
+    yield database
+    await client.drop_database(database.name)
+    client.close()
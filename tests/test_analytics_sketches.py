@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def click(number: int) -> dict:
+    return {
+        "event_type": "product_click",
+        "event_data": {"product_id": "p1"},
+        "session_id": f"s{number}",
+        "created_at": datetime.now(timezone.utc)
+    }
+
+
+async def test_worker_that_loses_its_slot_does_not_count_persisted_events_again(db):
+    stalled = server.AnalyticsSketches(60)
+    for number in range(10):
+        stalled.observe(click(number))
+    await stalled.persist()
+
+    # The stalled worker's lease lapses and another worker takes its slot over
+    await db.analytics_sketch_slots.update_one(
+        {"_id": stalled.slot}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+    successor = server.AnalyticsSketches(60)
+    for number in range(10, 17):
+        successor.observe(click(number))
+    await successor.persist()
+
+    for number in range(17, 22):
+        stalled.observe(click(number))
+    await stalled.persist()
+
+    assert stalled.slot != successor.slot
+    (_, sketch), = await server.AnalyticsSketches(60).merged(1)
+    assert sketch.events == 22
+    assert sketch.products.estimate("p1") == 22
+
+
+async def test_unpersisted_events_are_included_once(db):
+    sketches = server.AnalyticsSketches(60)
+    for number in range(4):
+        sketches.observe(click(number))
+    await sketches.persist()
+    sketches.observe(click(4))
+
+    (_, sketch), = await sketches.merged(1)
+    assert sketch.events == 5
+
+    await sketches.persist()
+    await sketches.persist()
+    (_, sketch), = await server.AnalyticsSketches(60).merged(1)
+    assert sketch.events == 5
@@ -0,0 +1,53 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    """Fresh per-worker catalog, product snapshot and cart view caches"""
+    monkeypatch.setattr(server, "product_catalog", server.ProductCatalog(300, 5))
+    monkeypatch.setattr(server, "product_snapshots", server.ProductSnapshots(100, 300))
+    monkeypatch.setattr(server, "cart_views", server.CartViews(100))
+
+
+async def render(user):
+    cart = await server.db.carts.find_one({"user_id": user.id}, server.CART_ITEMS_PROJECTION)
+    return server.cart_etag(cart["version"], False), await server.cart_views.render(user, cart)
+
+
+async def test_repricing_on_another_worker_changes_the_cart_etag_and_total(db, caches):
+    user = server.User(email="buyer@example.com", full_name="Buyer", hashed_password="x")
+    await db.products.insert_one({"id": "p1", "product_name": "Sehpa", "price": 100.0, "image_urls": ["a.jpg"]})
+    await db.carts.insert_one({"user_id": user.id, "items": [{"product_id": "p1", "quantity": 2}], "version": 1})
+    await server.product_catalog.sync()
+
+    etag, view = await render(user)
+    assert view["total"] == 200.0
+    assert (await render(user))[0] == etag
+
+    other_worker = server.ProductCatalog(300, 5)
+    await db.products.update_one({"id": "p1"}, {"$set": {"price": 80.0}})
+    await other_worker.publish()
+    await server.product_catalog.sync()
+
+    repriced_etag, view = await render(user)
+    assert repriced_etag != etag
+    assert view["total"] == 160.0
+
+
+async def test_local_product_write_reprices_cached_carts(db, caches):
+    user = server.User(email="buyer@example.com", full_name="Buyer", hashed_password="x")
+    await db.products.insert_one({"id": "p1", "product_name": "Sehpa", "price": 100.0, "image_urls": ["a.jpg"]})
+    await db.carts.insert_one({"user_id": user.id, "items": [{"product_id": "p1", "quantity": 1}], "version": 1})
+    etag, _ = await render(user)
+
+    await db.products.update_one({"id": "p1"}, {"$set": {"price": 90.0}})
+    server.product_catalog.upsert(await db.products.find_one({"id": "p1"}, {"_id": 0}))
+    await server.product_catalog.publish()
+
+    repriced_etag, view = await render(user)
+    assert repriced_etag != etag
+    assert view["total"] == 90.0
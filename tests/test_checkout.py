@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def make_user(**fields) -> server.User:
+    return server.User(email="buyer@example.com", full_name="Buyer", hashed_password="x", **fields)
+
+
+async def seed(db, user, items, checkout=None, products=None):
+    await db.users.insert_one(user.model_dump())
+    await db.products.insert_many(products or [
+        {"id": "p1", "product_name": "Sehpa", "price": 100.0, "stock_amount": 5},
+        {"id": "p2", "product_name": "Lamba", "price": 40.0, "stock_amount": 1},
+    ])
+    await db.carts.insert_one({"user_id": user.id, "items": items, "version": 1, "checkout": checkout})
+
+
+async def stock(db, product_id):
+    return (await db.products.find_one({"id": product_id}))["stock_amount"]
+
+
+async def test_reserve_stock_releases_reserved_lines_when_one_line_is_short(db):
+    await seed(db, make_user(), [])
+    lines, products = await server.price_cart_items(
+        [{"product_id": "p1", "quantity": 2}, {"product_id": "p2", "quantity": 3}], False
+    )
+
+    with pytest.raises(HTTPException) as error:
+        await server.reserve_stock(lines, products)
+
+    assert error.value.status_code == 409
+    assert "Lamba" in error.value.detail
+    assert await stock(db, "p1") == 5
+    assert await stock(db, "p2") == 1
+
+
+async def test_reserve_stock_never_oversells(db):
+    await seed(db, make_user(), [])
+    lines, products = await server.price_cart_items([{"product_id": "p1", "quantity": 3}], False)
+
+    await server.reserve_stock(lines, products)
+    with pytest.raises(HTTPException):
+        await server.reserve_stock(lines, products)
+
+    assert await stock(db, "p1") == 2
+
+
+async def test_release_stock_gives_back_reserved_quantities(db):
+    await seed(db, make_user(), [])
+    lines, products = await server.price_cart_items([{"product_id": "p1", "quantity": 4}], False)
+
+    reserved = await server.reserve_stock(lines, products)
+    await server.release_stock(reserved)
+
+    assert await stock(db, "p1") == 5
+
+
+async def test_failed_order_insert_releases_stock_and_the_cart_claim(db):
+    user = make_user()
+    await seed(db, user, [{"product_id": "p1", "quantity": 2}])
+    # Make the order insert fail after stock has been reserved
+    await db.orders.create_index("user_id", unique=True)
+    await db.orders.insert_one({"id": "earlier", "user_id": user.id})
+
+    with pytest.raises(DuplicateKeyError):
+        await server.create_order(server.OrderCreate(shipping_address="Adres"), user)
+
+    assert await stock(db, "p1") == 5
+    cart = await db.carts.find_one({"user_id": user.id})
+    assert cart.get("checkout") is None
+    assert cart["items"] == [{"product_id": "p1", "quantity": 2}]
+
+
+async def test_cart_claimed_by_a_running_checkout_is_refused(db):
+    user = make_user()
+    claim = {"order_id": "other", "started_at": datetime.now(timezone.utc) - timedelta(seconds=10)}
+    await seed(db, user, [{"product_id": "p1", "quantity": 1}], checkout=claim)
+
+    with pytest.raises(HTTPException) as error:
+        await server.create_order(server.OrderCreate(shipping_address="Adres"), user)
+
+    assert error.value.status_code == 409
+    assert await stock(db, "p1") == 5
+
+
+async def test_claim_older_than_the_timeout_can_be_taken_over(db):
+    user = make_user()
+    started_at = datetime.now(timezone.utc) - timedelta(seconds=server.CHECKOUT_CLAIM_TIMEOUT_SECONDS + 1)
+    await seed(db, user, [{"product_id": "p1", "quantity": 1}], checkout={"order_id": "crashed", "started_at": started_at})
+
+    order = await server.create_order(server.OrderCreate(shipping_address="Adres"), user)
+
+    assert order.total == 100.0
+    assert await stock(db, "p1") == 4
+    cart = await db.carts.find_one({"user_id": user.id})
+    assert cart["items"] == []
+    assert cart["checkout"] is None
+
+
+async def test_checkout_keeps_quantity_added_while_it_ran(db, monkeypatch):
+    user = make_user()
+    await seed(db, user, [{"product_id": "p1", "quantity": 2}, {"product_id": "p2", "quantity": 1}])
+    reserve_stock = server.reserve_stock
+
+    async def reserve_while_another_tab_adds(lines, products):
+        reserved = await reserve_stock(lines, products)
+        await db.carts.update_one(
+            {"user_id": user.id, "items.product_id": "p1"},
+            {"$inc": {"items.$.quantity": 3, "version": 1}}
+        )
+        await db.carts.update_one(
+            {"user_id": user.id},
+            {"$push": {"items": {"product_id": "p3", "quantity": 1}}, "$inc": {"version": 1}}
+        )
+        return reserved
+    monkeypatch.setattr(server, "reserve_stock", reserve_while_another_tab_adds)
+
+    order = await server.create_order(server.OrderCreate(shipping_address="Adres"), user)
+
+    assert {(item.product_id, item.quantity) for item in order.items} == {("p1", 2), ("p2", 1)}
+    cart = await db.carts.find_one({"user_id": user.id})
+    assert cart["items"] == [{"product_id": "p1", "quantity": 3}, {"product_id": "p3", "quantity": 1}]
+    assert cart["version"] == 4
+    assert cart["checkout"] is None
+
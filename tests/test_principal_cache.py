@@ -0,0 +1,51 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def this_worker(monkeypatch):
+    cache = server.PrincipalCache(300, 100, 5)
+    monkeypatch.setattr(server, "principal_cache", cache)
+    return cache
+
+
+async def load_user(user_id: str) -> server.User:
+    return server.User(**await server.load_principal("user", "users", user_id))
+
+
+async def test_membership_revoked_on_another_worker_reaches_cart_and_checkout_pricing(db, this_worker, monkeypatch):
+    user = server.User(email="member@example.com", full_name="Member", hashed_password="x", is_boz_plus=True)
+    await db.users.insert_one(user.model_dump())
+    await db.products.insert_one({"id": "p1", "product_name": "Sehpa", "price": 100.0, "boz_plus_price": 70.0, "stock_amount": 5})
+    await db.carts.insert_one({"user_id": user.id, "items": [{"product_id": "p1", "quantity": 1}], "version": 1})
+    await this_worker.sync()
+    assert server.is_boz_plus_active(await load_user(user.id))
+
+    # The admin revokes on another worker; this worker's cached copy still says member
+    monkeypatch.setattr(server, "principal_cache", server.PrincipalCache(300, 100, 5))
+    await server.set_boz_plus_fields(user.id, {"is_boz_plus": False, "boz_plus_expiry_date": None})
+    monkeypatch.setattr(server, "principal_cache", this_worker)
+    assert server.is_boz_plus_active(await load_user(user.id))
+
+    await this_worker.sync()
+    current_user = await load_user(user.id)
+    assert not server.is_boz_plus_active(current_user)
+    order = await server.create_order(server.OrderCreate(shipping_address="Adres"), current_user)
+    assert order.total == 100.0
+
+
+async def test_a_read_racing_a_published_change_is_not_cached(db, this_worker):
+    user = server.User(email="member@example.com", full_name="Member", hashed_password="x")
+    await db.users.insert_one(user.model_dump())
+    key = ("user", user.id)
+    generation = this_worker.generation(key)
+    stale = await db.users.find_one({"id": user.id}, server.PRINCIPAL_PROJECTION)
+
+    await server.PrincipalCache(300, 100, 5).publish(key)
+    await this_worker.sync()
+    this_worker.put(key, stale, generation)
+
+    assert this_worker.get(key) is None
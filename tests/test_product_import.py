@@ -0,0 +1,114 @@
+import csv
+import io
+from pathlib import Path
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+PRODUCTS_DATA = Path(server.ROOT_DIR) / "products_data.json"
+
+
+def csv_file(*lines: bytes) -> io.BytesIO:
+    return io.BytesIO(b"product_name,category,price,barcode\n" + b"".join(lines))
+
+
+async def test_rows_around_an_undecodable_line_are_imported_and_it_is_reported_by_row(db):
+    good = [f"P{i},Raf,1,bc-{i}\n".encode() for i in range(1000)]
+    stream = csv_file(*good, b"Bozuk \xff\xfe,Raf,1,bc-bad\n", b"Q,Raf,1,bc-q\n")
+
+    report = await server.import_products(stream, "csv")
+
+    assert report["created"] == 1001
+    assert not report["aborted"]
+    assert [error["row"] for error in report["errors"]] == [1002]
+    assert await db.products.count_documents({"barcode": "bc-999"}) == 1
+    assert await db.products.count_documents({"barcode": "bc-q"}) == 1
+
+
+async def test_json_lines_with_an_undecodable_line(db):
+    stream = io.BytesIO(
+        b'{"product_name": "A", "category": "c", "price": 1, "barcode": "a"}\n'
+        b'{"product_name": "\xff", "category": "c", "price": 1, "barcode": "b"}\n'
+        b'{"product_name": "C", "category": "c", "price": 1, "barcode": "c"}\n'
+    )
+
+    report = await server.import_products(stream, "json")
+
+    assert report["created"] == 2
+    assert [error["row"] for error in report["errors"]] == [2]
+
+
+async def test_file_that_is_not_utf8_from_the_header_is_rejected(db):
+    with pytest.raises(ValueError):
+        await server.import_products(io.BytesIO(b"\xff\xfe\xfa,x\n"), "csv")
+
+
+async def test_every_row_of_products_data_imports_including_barcode_variants(db):
+    with open(PRODUCTS_DATA, "rb") as stream:
+        report = await server.import_products(stream, "json")
+    assert report["failed"] == 0
+    assert report["created"] == report["rows"]
+
+    variants = await db.products.find({"barcode": "1509202502004"}, {"_id": 0, "product_name": 1, "colors": 1}).to_list(None)
+    assert sorted((p["product_name"], p["colors"]) for p in variants) == [
+        ("YANSEHPA00COLOR TOKYO", "Boz Lacivert"),
+        ("YANSEHPA00COLOR VİYANA", "Boz Yeşil"),
+    ]
+
+    with open(PRODUCTS_DATA, "rb") as stream:
+        again = await server.import_products(stream, "json")
+    assert again["failed"] == 0
+    assert again["updated"] == again["rows"]
+    assert await db.products.count_documents({}) == report["rows"]
+
+
+async def test_a_unique_barcode_still_renames_its_product(db):
+    await db.products.insert_one({"id": "p1", "product_name": "Eski", "category": "Raf", "price": 1.0, "barcode": "x1"})
+
+    report = await server.import_products(csv_file(b"Yeni,Raf,2,x1\n"), "csv")
+
+    assert report["updated"] == 1
+    product = await db.products.find_one({"barcode": "x1"})
+    assert (product["id"], product["product_name"], product["price"]) == ("p1", "Yeni", 2.0)
+
+
+async def test_variant_rows_match_their_own_stored_product(db):
+    await db.products.insert_many([
+        {"id": "black", "product_name": "Raf Siyah", "category": "Raf", "price": 1.0, "barcode": "v1"},
+        {"id": "white", "product_name": "Raf Beyaz", "category": "Raf", "price": 1.0, "barcode": "v1"},
+    ])
+
+    report = await server.import_products(csv_file(b"Raf Beyaz,Raf,5,v1\nRaf Gri,Raf,6,v1\n"), "csv")
+
+    assert (report["updated"], report["created"], report["failed"]) == (1, 1, 0)
+    prices = {p["product_name"]: (p["id"], p["price"]) async for p in db.products.find({"barcode": "v1"})}
+    assert prices["Raf Siyah"] == ("black", 1.0)
+    assert prices["Raf Beyaz"] == ("white", 5.0)
+    assert prices["Raf Gri"][1] == 6.0
+
+
+async def test_rows_matching_several_stored_products_by_barcode_and_name_are_rejected(db):
+    await db.products.insert_many([
+        {"id": "one", "product_name": "Aynı", "category": "Raf", "price": 1.0, "barcode": "d1"},
+        {"id": "two", "product_name": "Aynı", "category": "Raf", "price": 1.0, "barcode": "d1"},
+    ])
+
+    report = await server.import_products(csv_file(b"Ayn\xc4\xb1,Raf,9,d1\n"), "csv")
+
+    assert report["failed"] == 1
+    assert report["errors"][0]["row"] == 2
+    assert await db.products.count_documents({"price": 9.0}) == 0
+
+
+async def test_csv_row_that_cannot_be_parsed_is_reported_and_reading_continues(db):
+    limit = csv.field_size_limit(50)
+    try:
+        report = await server.import_products(csv_file(b"A,Raf,1,a\n", b"B" * 100 + b",Raf,1,b\n", b"C,Raf,1,c\n"), "csv")
+    finally:
+        csv.field_size_limit(limit)
+
+    assert report["created"] == 2
+    assert [error["row"] for error in report["errors"]] == [3]